@@ -0,0 +1,340 @@
+"""
+Game Bet Archive
+Cold tier for game_bets: day-partitioned Parquet files under BET_ARCHIVE_DIR, sorted by
+wallet, currency and time so each row group's min/max statistics cover a narrow range of
+wallets and a wallet filter skips every other row group
+
+    {BET_ARCHIVE_DIR}/game_bets/date=YYYY-MM-DD/part-0.parquet
+    {BET_ARCHIVE_DIR}/game_bets/_horizon.json    {"horizon": iso datetime}
+
+The horizon splits the tiers: bets before it are read from Parquet, bets at or after it
+from MongoDB. Bets already archived may linger in MongoDB until the tiering job deletes
+them, so hot queries must go through hot_query() to stay disjoint from the cold tier
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from services.amounts import precision
+
+logger = logging.getLogger(__name__)
+
+BET_SCHEMA = pa.schema([
+    ("_id", pa.string()),
+    ("game_id", pa.string()),
+    ("wallet_address", pa.string()),
+    ("game_type", pa.string()),
+    ("currency", pa.string()),
+    ("network", pa.string()),
+    ("bet_amount", pa.float64()),
+    ("bet_amount_minor", pa.int64()),
+    ("payout", pa.float64()),
+    ("payout_minor", pa.int64()),
+    ("result", pa.string()),
+    ("status", pa.string()),
+    ("timestamp", pa.timestamp("us")),
+    ("running_total", pa.float64()),
+])
+
+SORT_KEYS = [("wallet_address", "ascending"), ("currency", "ascending"), ("timestamp", "ascending")]
+PARTITIONING = ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+
+def day_key(day: datetime) -> str:
+    return day.strftime("%Y-%m-%d")
+
+class BetArchive:
+    """Writes day partitions and answers wallet reads over them"""
+
+    def __init__(self, root: str = None, horizon_ttl: float = None, row_group_size: int = None):
+        self.root = Path(root or os.getenv("BET_ARCHIVE_DIR", "/app/data/archive")) / "game_bets"
+        self.horizon_ttl = horizon_ttl if horizon_ttl is not None else float(os.getenv("BET_ARCHIVE_HORIZON_TTL", "30"))
+        self.row_group_size = row_group_size or int(os.getenv("BET_ARCHIVE_ROW_GROUP_SIZE", "16384"))
+
+        self._horizon: Optional[datetime] = None
+        self._horizon_checked = 0.0
+        self._dataset: Optional[ds.Dataset] = None
+        self._dataset_horizon: Optional[datetime] = None
+        self._dates_visible: List[str] = []
+
+        self.cold_scans = 0
+        self.cold_rows = 0
+
+    # Horizon
+
+    def horizon(self) -> Optional[datetime]:
+        """Start of the hot tier; None until something is archived. Re-read at most every horizon_ttl seconds"""
+        if time.monotonic() - self._horizon_checked > self.horizon_ttl:
+            self._horizon = self._read_horizon()
+            self._horizon_checked = time.monotonic()
+        return self._horizon
+
+    def hot_query(self, query: Dict[str, Any]) -> Dict[str, Any]:
+        """Restrict a game_bets filter to the hot tier; query must not filter on timestamp at top level"""
+        horizon = self.horizon()
+        return {**query, "timestamp": {"$gte": horizon}} if horizon else query
+
+    def set_horizon(self, horizon: datetime):
+        """Advance the horizon; only the tiering job calls this, after the day files are durable"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._replace(self.root / "_horizon.json", json.dumps({"horizon": horizon.isoformat()}).encode())
+        self._horizon, self._horizon_checked = horizon, time.monotonic()
+
+    # Writing
+
+    def write_day(self, day: datetime, rows: List[Dict[str, Any]]) -> int:
+        """Write (or rewrite) one day's partition from bet documents; returns rows written"""
+        table = pa.Table.from_pylist([self._archive_row(row) for row in rows], schema=BET_SCHEMA)
+        table = table.sort_by(SORT_KEYS)
+
+        partition = self.root / f"date={day_key(day)}"
+        partition.mkdir(parents=True, exist_ok=True)
+        temp = partition / "part-0.parquet.tmp"
+        pq.write_table(
+            table, temp,
+            row_group_size=self.row_group_size,
+            compression="zstd",
+            write_statistics=True,
+            use_dictionary=["wallet_address", "game_type", "currency", "network", "result", "status"]
+        )
+        with open(temp, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(temp, partition / "part-0.parquet")
+        return table.num_rows
+
+    # Reading
+
+    async def history(self, wallet_address: str, limit: int, columns: List[str],
+                      before: Tuple[datetime, str] = None) -> List[Dict[str, Any]]:
+        """Up to limit archived bets for a wallet, newest first, strictly before (timestamp, _id) when given"""
+        return await asyncio.to_thread(self._history, wallet_address, limit, columns, before)
+
+    async def iter_history(self, wallet_address: str, columns: List[str]) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Every archived bet for a wallet, newest first, one day partition at a time"""
+        for date in reversed(await asyncio.to_thread(self._dates)):
+            rows = await asyncio.to_thread(self._scan_day, wallet_address, date, columns, None)
+            if rows:
+                yield rows
+
+    async def summary(self, wallet_address: str, recent_losses: int = 0) -> Dict[str, Any]:
+        """
+        Per-currency totals of a wallet's archived bets plus its most recent archived losses
+            {"by_currency": {currency: {games, wins, losses, won, lost}}, "recent_losses": [...]}
+        """
+        return await asyncio.to_thread(self._summary, wallet_address, recent_losses)
+
+    async def recent_losses(self, wallet_address: str, limit: int) -> List[Dict[str, Any]]:
+        """A wallet's most recent archived losses, newest first"""
+        return await asyncio.to_thread(self._recent_losses, wallet_address, limit)
+
+    async def iter_hourly_rollups(self) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Bet rollups per (wallet, game_type, currency, hour) for every archived day, a day at a time"""
+        for date in await asyncio.to_thread(self._dates):
+            rows = await asyncio.to_thread(self._hourly_rollups, date)
+            if rows:
+                yield rows
+
+    async def loss_totals(self, wallets: List[str]) -> Dict[Tuple[str, str], float]:
+        """Archived loss totals per (wallet, currency)"""
+        return await asyncio.to_thread(self._loss_totals, wallets)
+
+    def status(self) -> Dict[str, Any]:
+        horizon = self.horizon()
+        return {
+            "root": str(self.root),
+            "horizon": horizon.isoformat() if horizon else None,
+            "cold_scans": self.cold_scans,
+            "cold_rows": self.cold_rows
+        }
+
+    def _history(self, wallet_address, limit, columns, before):
+        rows: List[Dict[str, Any]] = []
+        before_day = day_key(before[0]) if before else None
+        for date in reversed(self._dates()):
+            if before_day and date > before_day:
+                continue
+            rows.extend(self._scan_day(wallet_address, date, columns, before))
+            if len(rows) >= limit:
+                break
+        return rows[:limit]
+
+    def _scan_day(self, wallet_address, date, columns, before):
+        """One day's bets for a wallet, newest first; the wallet predicate is pushed down to row-group stats"""
+        predicate = (ds.field("date") == date) & (ds.field("wallet_address") == wallet_address)
+        if before:
+            timestamp, last_id = before
+            predicate &= (ds.field("timestamp") < timestamp) | (
+                (ds.field("timestamp") == timestamp) & (ds.field("_id") < last_id))
+        table = self._scan(predicate, list(dict.fromkeys(["_id", "timestamp", *columns])))
+        if table is None:
+            return []
+        table = table.sort_by([("timestamp", "descending"), ("_id", "descending")])
+        return self._rows(table.select(list(dict.fromkeys(["_id", *columns]))))
+
+    def _summary(self, wallet_address, recent_losses):
+        summary = {"by_currency": {}, "recent_losses": []}
+        table = self._scan(ds.field("wallet_address") == wallet_address,
+                           ["currency", "result", "bet_amount", "payout"])
+        if table is None:
+            return summary
+
+        is_win = pc.equal(table["result"], "win")
+        is_loss = pc.equal(table["result"], "loss")
+        table = table.append_column("win", pc.cast(is_win, pa.int64()))
+        table = table.append_column("loss", pc.cast(is_loss, pa.int64()))
+        table = table.append_column("won", pc.if_else(is_win, table["payout"], 0.0))
+        table = table.append_column("lost", pc.if_else(is_loss, table["bet_amount"], 0.0))
+        grouped = table.group_by("currency").aggregate([
+            ("win", "count"), ("win", "sum"), ("loss", "sum"), ("won", "sum"), ("lost", "sum")
+        ])
+        for row in grouped.to_pylist():
+            summary["by_currency"][row["currency"]] = {
+                "games": row["win_count"],
+                "wins": row["win_sum"],
+                "losses": row["loss_sum"],
+                "won": row["won_sum"],
+                "lost": row["lost_sum"]
+            }
+
+        summary["recent_losses"] = self._recent_losses(wallet_address, recent_losses)
+        return summary
+
+    def _recent_losses(self, wallet_address, limit):
+        losses: List[Dict[str, Any]] = []
+        if limit <= 0:
+            return losses
+        columns = ["_id", "timestamp", "game_type", "currency", "bet_amount", "game_id", "running_total"]
+        for date in reversed(self._dates()):
+            day = self._scan((ds.field("date") == date) & (ds.field("wallet_address") == wallet_address)
+                             & (ds.field("result") == "loss"), columns)
+            if day is not None:
+                losses.extend(self._rows(day.sort_by([("timestamp", "descending")])))
+            if len(losses) >= limit:
+                break
+        return losses[:limit]
+
+    def _hourly_rollups(self, date):
+        table = self._scan(ds.field("date") == date, [
+            "wallet_address", "game_type", "currency", "result", "timestamp",
+            "bet_amount", "bet_amount_minor", "payout", "payout_minor"
+        ])
+        if table is None:
+            return []
+        won = pc.equal(table["result"], "win")
+        wagered = self._minor_column(table, "bet_amount")
+        table = pa.table({
+            "wallet_address": table["wallet_address"],
+            "game_type": table["game_type"],
+            "currency": table["currency"],
+            "hour": pc.floor_temporal(table["timestamp"], unit="hour"),
+            "win": pc.cast(won, pa.int64()),
+            "loss": pc.cast(pc.invert(won), pa.int64()),
+            "wagered": wagered,
+            "payout": self._minor_column(table, "payout"),
+            "lost": pc.if_else(won, 0, wagered)
+        })
+        grouped = table.group_by(["wallet_address", "game_type", "currency", "hour"]).aggregate([
+            ("win", "count"), ("win", "sum"), ("loss", "sum"), ("wagered", "sum"), ("payout", "sum"), ("lost", "sum")
+        ])
+        return [{
+            "wallet_address": row["wallet_address"],
+            "game_type": row["game_type"],
+            "currency": row["currency"],
+            "hour": row["hour"],
+            "bets": row["win_count"],
+            "wins": row["win_sum"],
+            "losses": row["loss_sum"],
+            "wagered_minor": row["wagered_sum"],
+            "payout_minor": row["payout_sum"],
+            "lost_minor": row["lost_sum"]
+        } for row in grouped.to_pylist()]
+
+    @staticmethod
+    def _minor_column(table: pa.Table, field: str) -> pa.ChunkedArray:
+        """The stored minor units, filled in from the decimal amount for bets archived without them"""
+        minor = table[f"{field}_minor"]
+        if minor.null_count == 0:
+            return minor
+        scale = pa.array([10 ** precision(currency) for currency in table["currency"].to_pylist()], pa.float64())
+        amount = pc.fill_null(table[field], 0.0)
+        derived = pc.cast(pc.round(pc.multiply(amount, scale), ndigits=0, round_mode="half_to_even"), pa.int64())
+        return pc.coalesce(minor, derived)
+
+    def _loss_totals(self, wallets):
+        table = self._scan(ds.field("wallet_address").isin(wallets) & (ds.field("result") == "loss"),
+                           ["wallet_address", "currency", "bet_amount"])
+        if table is None:
+            return {}
+        grouped = table.group_by(["wallet_address", "currency"]).aggregate([("bet_amount", "sum")])
+        return {(row["wallet_address"], row["currency"]): row["bet_amount_sum"] for row in grouped.to_pylist()}
+
+    def _scan(self, predicate, columns) -> Optional[pa.Table]:
+        dataset = self._current_dataset()
+        if dataset is None:
+            return None
+        table = dataset.to_table(columns=columns, filter=predicate)
+        self.cold_scans += 1
+        self.cold_rows += table.num_rows
+        return table if table.num_rows else None
+
+    def _current_dataset(self) -> Optional[ds.Dataset]:
+        """
+        Day files before the horizon; files only become visible when the horizon moves, so the
+        listing is redone then. Later partitions belong to an unfinished run and MongoDB still serves them
+        """
+        horizon = self.horizon()
+        if horizon is None:
+            return None
+        if self._dataset_horizon != horizon:
+            horizon_day = day_key(horizon)
+            files = sorted(path for path in self.root.glob("date=*/part-0.parquet")
+                           if path.parent.name.split("=", 1)[1] < horizon_day)
+            self._dates_visible = [path.parent.name.split("=", 1)[1] for path in files]
+            self._dataset = ds.dataset([str(path) for path in files], format="parquet",
+                                       partitioning=PARTITIONING, partition_base_dir=str(self.root)) if files else None
+            self._dataset_horizon = horizon
+        return self._dataset
+
+    def _dates(self) -> List[str]:
+        """Archived day partitions, oldest first"""
+        return self._dates_visible if self._current_dataset() is not None else []
+
+    def _read_horizon(self) -> Optional[datetime]:
+        try:
+            return datetime.fromisoformat(json.loads((self.root / "_horizon.json").read_text())["horizon"])
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Unreadable bet archive horizon: {e}")
+            return self._horizon
+
+    @staticmethod
+    def _archive_row(bet: Dict[str, Any]) -> Dict[str, Any]:
+        return {**{field: bet.get(field) for field in BET_SCHEMA.names}, "_id": str(bet["_id"])}
+
+    @staticmethod
+    def _rows(table: pa.Table) -> List[Dict[str, Any]]:
+        # Nulls become missing keys, like fields absent from the original documents
+        return [{key: value for key, value in row.items() if value is not None} for row in table.to_pylist()]
+
+    @staticmethod
+    def _replace(path: Path, content: bytes):
+        temp = path.with_suffix(path.suffix + ".tmp")
+        with open(temp, "wb") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, path)
+
+# Global archive instance
+bet_archive = BetArchive()
@@ -0,0 +1,84 @@
+"""
+Game Bet Tiering
+Moves game_bets older than BET_HOT_DAYS out of MongoDB into the Parquet archive, one
+UTC day at a time:
+
+    1. write the day's partition (temp file, fsync, rename)
+    2. advance the archive horizon past the day
+    3. once every reader has picked up the new horizon, delete the day's bets from MongoDB
+
+A crash at any point leaves each bet in at least one tier, and readers only ever see one
+copy: before step 2 the partition is invisible, after it the MongoDB copies are filtered
+out. Rerunning picks up where the last run stopped
+"""
+
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+
+from archive.bet_archive import BetArchive, bet_archive, day_key
+
+logger = logging.getLogger(__name__)
+
+HOT_DAYS = int(os.getenv("BET_HOT_DAYS", "30"))
+FETCH_BATCH = 5000
+
+class BetTiering:
+    """Archives whole days of bets older than the hot window"""
+
+    def __init__(self, db, archive: BetArchive = bet_archive, hot_days: int = HOT_DAYS):
+        self.db = db
+        self.archive = archive
+        self.hot_days = hot_days
+
+    def cutoff(self, now: datetime = None) -> datetime:
+        """Midnight UTC hot_days ago; everything before it is cold"""
+        now = now or datetime.utcnow()
+        return datetime(now.year, now.month, now.day) - timedelta(days=self.hot_days)
+
+    async def run(self, max_days: Optional[int] = None) -> Dict[str, Any]:
+        """Archive every complete day before the cutoff, oldest first"""
+        cutoff = self.cutoff()
+        day = self.archive.horizon() or await self._first_day()
+        report = {"days": 0, "archived": 0, "deleted": 0, "horizon": None}
+
+        while day is not None and day < cutoff and (max_days is None or report["days"] < max_days):
+            next_day = day + timedelta(days=1)
+            rows = await self.db.game_bets.find(
+                {"timestamp": {"$gte": day, "$lt": next_day}}
+            ).batch_size(FETCH_BATCH).to_list(None)
+
+            if rows:
+                report["archived"] += await asyncio.to_thread(self.archive.write_day, day, rows)
+                logger.info(f"Archived {len(rows)} bets for {day_key(day)}")
+            await asyncio.to_thread(self.archive.set_horizon, next_day)
+            report["days"] += 1
+            day = next_day
+
+        horizon = self.archive.horizon()
+        if horizon is not None:
+            report["deleted"] = await self.purge(horizon)
+            report["horizon"] = horizon.isoformat()
+        return report
+
+    async def purge(self, horizon: datetime) -> int:
+        """
+        Delete archived bets from MongoDB
+        Waits out the readers' horizon cache first: a reader still on the old horizon would
+        otherwise look for these bets in MongoDB after they are gone
+        """
+        if not await self.db.game_bets.find_one({"timestamp": {"$lt": horizon}}, {"_id": 1}):
+            return 0
+        await asyncio.sleep(2 * self.archive.horizon_ttl)
+        result = await self.db.game_bets.delete_many({"timestamp": {"$lt": horizon}})
+        logger.info(f"Deleted {result.deleted_count} archived bets before {horizon.isoformat()}")
+        return result.deleted_count
+
+    async def _first_day(self) -> Optional[datetime]:
+        oldest = await self.db.game_bets.find_one({}, {"timestamp": 1}, sort=[("timestamp", 1)])
+        if not oldest:
+            return None
+        timestamp = oldest["timestamp"]
+        return datetime(timestamp.year, timestamp.month, timestamp.day)
@@ -0,0 +1,64 @@
+"""
+Auth Challenge Stores
+Where pending wallet-auth challenges live between /auth/challenge and /auth/verify.
+Redis shares them across workers with native TTLs and an atomic get-and-delete; the
+in-memory store is for single-process development
+"""
+
+import os
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+CHALLENGE_TTL_SECONDS = int(os.getenv("AUTH_CHALLENGE_TTL", "300"))
+
+class InMemoryChallengeStore:
+    """
+    Process-local challenge store
+    Every challenge has the same TTL, so insertion order is expiry order and a sweep only
+    touches expired entries at the front
+    """
+
+    def __init__(self, ttl_seconds: int = CHALLENGE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._challenges: "OrderedDict[str, tuple]" = OrderedDict()  # hash -> (expires_at, data)
+
+    async def put(self, challenge_hash: str, data: Dict[str, Any]):
+        now = time.monotonic()
+        self._sweep(now)
+        self._challenges[challenge_hash] = (now + self.ttl_seconds, data)
+
+    async def take(self, challenge_hash: str) -> Optional[Dict[str, Any]]:
+        """Remove and return a challenge; None if unknown or expired"""
+        self._sweep(time.monotonic())
+        entry = self._challenges.pop(challenge_hash, None)
+        return entry[1] if entry else None
+
+    def __len__(self) -> int:
+        return len(self._challenges)
+
+    def _sweep(self, now: float):
+        while self._challenges:
+            challenge_hash, (expires_at, _) = next(iter(self._challenges.items()))
+            if expires_at > now:
+                break
+            del self._challenges[challenge_hash]
+
+class RedisChallengeStore:
+    """Challenge store shared by every worker; Redis expires unused challenges itself"""
+
+    KEY_PREFIX = "auth_challenge:"
+
+    def __init__(self, client, ttl_seconds: int = CHALLENGE_TTL_SECONDS):
+        self.client = client  # redis.asyncio client with decode_responses=True
+        self.ttl_seconds = ttl_seconds
+
+    async def put(self, challenge_hash: str, data: Dict[str, Any]):
+        await self.client.set(self.KEY_PREFIX + challenge_hash, json.dumps(data, default=str),
+                              ex=self.ttl_seconds)
+
+    async def take(self, challenge_hash: str) -> Optional[Dict[str, Any]]:
+        """GETDEL makes a challenge single-use even when two workers verify it at once"""
+        value = await self.client.getdel(self.KEY_PREFIX + challenge_hash)
+        return json.loads(value) if value else None
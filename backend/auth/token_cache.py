@@ -0,0 +1,122 @@
+"""
+Verified Token Cache
+Bounded LRU of already-verified JWTs keyed by a SHA256 digest of the token, so chatty
+authenticated endpoints skip HS256 verification on repeat requests, plus a revocation
+list checked in O(1) from an in-memory set kept in sync with a Redis sorted set
+"""
+
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+class VerifiedTokenCache:
+    """LRU of digest -> (exp, wallet info); entries are never served past the token's exp"""
+
+    def __init__(self, max_size: int = None):
+        self.max_size = max_size or int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+        exp, wallet_info = entry
+        if exp <= time.time():
+            del self._entries[digest]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        return wallet_info
+
+    def put(self, digest: str, exp: float, wallet_info: Dict[str, Any]):
+        self._entries[digest] = (exp, wallet_info)
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, digest: str):
+        self._entries.pop(digest, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+class RevocationList:
+    """
+    Revoked token digests
+    Redis holds them in a sorted set scored by the token's exp, so expired revocations
+    can be trimmed by score; each worker mirrors the set in memory and refreshes it
+    every sync_interval seconds
+    """
+
+    REDIS_KEY = "auth:revoked_tokens"
+
+    def __init__(self, sync_interval: float = None):
+        self.sync_interval = sync_interval or float(os.getenv("AUTH_REVOCATION_SYNC_INTERVAL", "5"))
+        self.redis = None
+        self._revoked: Set[str] = set()
+        self._local: Dict[str, float] = {}  # Revoked by this worker: digest -> exp
+        self._task: Optional[asyncio.Task] = None
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self._revoked
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    async def start(self, redis_client=None):
+        """Load revocations and keep syncing them when Redis is available"""
+        if redis_client is None:
+            return
+        self.redis = redis_client
+        try:
+            await self.sync()
+        except Exception as e:
+            logger.warning(f"Token revocation load failed, retrying in the background: {e}")
+        self._task = asyncio.create_task(self._sync_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def revoke(self, digest: str, exp: float):
+        """Revoke locally at once and share with other workers until the token would expire anyway"""
+        now = time.time()
+        self._local = {local: local_exp for local, local_exp in self._local.items() if local_exp > now}
+        self._local[digest] = exp
+        self._revoked.add(digest)
+        if self.redis is None:
+            self._revoked = set(self._local)
+        else:
+            await self.redis.zadd(self.REDIS_KEY, {digest: exp})
+
+    async def sync(self):
+        now = time.time()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(self.REDIS_KEY, "-inf", now)
+            pipe.zrange(self.REDIS_KEY, 0, -1)
+            _, members = await pipe.execute()
+        # Keep our own revocations even if this read raced their ZADD
+        self._revoked = set(members) | {digest for digest, exp in self._local.items() if exp > now}
+
+    async def _sync_loop(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.warning(f"Token revocation sync failed, keeping last known list: {e}")
@@ -4,18 +4,32 @@ from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 import hashlib
 import secrets
+import time
 import jwt
 import os
 from pydantic import BaseModel
 
+from auth.challenge_store import InMemoryChallengeStore
+from auth.token_cache import VerifiedTokenCache, RevocationList, token_digest
+
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+def wallet_info_from_claims(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Wallet info handed to authenticated endpoints"""
+    return {
+        "wallet_address": payload.get("wallet_address"),
+        "network": payload.get("network", "multi"),
+        "type": payload.get("type")
+    }
 
 class WalletAuthManager:
-    def __init__(self, jwt_secret: str = None):
+    def __init__(self, jwt_secret: str = None, challenge_store=None):
         self.jwt_secret = jwt_secret or os.getenv("JWT_SECRET_KEY", "casino_dapp_secret_2024")
-        self.active_challenges = {}
+        # In-memory by default; swapped for the Redis store at startup when Redis is up
+        self.challenge_store = challenge_store or InMemoryChallengeStore()
         
-    def generate_challenge(self, wallet_address: str) -> Dict[str, str]:
+    async def generate_challenge(self, wallet_address: str) -> Dict[str, str]:
         """Generate authentication challenge for wallet"""
         nonce = secrets.token_hex(16)
         timestamp = datetime.utcnow().isoformat()
@@ -34,42 +48,36 @@ This signature will be used to verify your wallet ownership.
         
         challenge_hash = hashlib.sha256(challenge_message.encode()).hexdigest()
         
-        # Store challenge for verification (expires in 5 minutes)
-        self.active_challenges[challenge_hash] = {
+        # Store challenge for verification (the store expires it after 5 minutes)
+        await self.challenge_store.put(challenge_hash, {
             "wallet_address": wallet_address,
             "message": challenge_message,
-            "created_at": datetime.utcnow(),
+            "created_at": timestamp,
             "nonce": nonce
-        }
+        })
         
         return {
             "challenge": challenge_message,
             "challenge_hash": challenge_hash
         }
     
-    def verify_wallet_signature(self, 
+    async def verify_wallet_signature(self, 
                                challenge_hash: str, 
                                signature: str,
                                wallet_address: str) -> bool:
         """Verify wallet signature against challenge"""
-        if challenge_hash not in self.active_challenges:
+        # Challenges are single-use: taking one removes it, whatever the outcome
+        challenge_data = await self.challenge_store.take(challenge_hash)
+        if not challenge_data:
             return False
-            
-        challenge_data = self.active_challenges[challenge_hash]
         
-        # Check if challenge has expired (5 minutes)
-        if datetime.utcnow() - challenge_data["created_at"] > timedelta(minutes=5):
-            del self.active_challenges[challenge_hash]
+        # A challenge only authenticates the wallet it was issued to
+        if challenge_data["wallet_address"] != wallet_address:
             return False
             
         # For demo purposes, we'll accept any signature that's not empty
         # In production, you would verify the actual cryptographic signature
-        if signature and len(signature) > 10:
-            # Clean up used challenge
-            del self.active_challenges[challenge_hash]
-            return True
-            
-        return False
+        return bool(signature and len(signature) > 10)
     
     def create_jwt_token(self, wallet_address: str, network: str = "multi") -> str:
         """Create JWT token for authenticated wallet"""
@@ -83,32 +91,65 @@ This signature will be used to verify your wallet ownership.
         
         return jwt.encode(payload, self.jwt_secret, algorithm="HS256")
     
-    def verify_jwt_token(self, token: str) -> Optional[Dict[str, Any]]:
-        """Verify JWT token and return wallet info"""
+    def decode_jwt_token(self, token: str) -> Optional[Dict[str, Any]]:
+        """Verify JWT token and return its raw claims"""
         try:
-            payload = jwt.decode(token, self.jwt_secret, algorithms=["HS256"])
-            return {
-                "wallet_address": payload.get("wallet_address"),
-                "network": payload.get("network", "multi"),
-                "type": payload.get("type")
-            }
+            return jwt.decode(token, self.jwt_secret, algorithms=["HS256"])
         except jwt.ExpiredSignatureError:
             return None
         except jwt.InvalidTokenError:
             return None
+    
+    def verify_jwt_token(self, token: str) -> Optional[Dict[str, Any]]:
+        """Verify JWT token and return wallet info"""
+        payload = self.decode_jwt_token(token)
+        if payload is None:
+            return None
+        return wallet_info_from_claims(payload)
 
 # Initialize global auth manager
 auth_manager = WalletAuthManager()
 
-def get_authenticated_wallet(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict[str, Any]:
+# Verified tokens skip HS256 on repeat requests; revocations are checked first
+token_cache = VerifiedTokenCache()
+revocation_list = RevocationList()
+
+async def get_authenticated_wallet(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict[str, Any]:
     """Dependency to extract authenticated wallet from JWT token"""
-    wallet_info = auth_manager.verify_jwt_token(credentials.credentials)
+    digest = token_digest(credentials.credentials)
+    if digest in revocation_list:
+        raise HTTPException(status_code=401, detail="Token has been revoked")
     
-    if not wallet_info:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    wallet_info = token_cache.get(digest)
+    if wallet_info is None:
+        payload = auth_manager.decode_jwt_token(credentials.credentials)
+        if not payload:
+            raise HTTPException(status_code=401, detail="Invalid or expired token")
+        wallet_info = wallet_info_from_claims(payload)
+        # Tokens without exp are still accepted, just never cached
+        if payload.get("exp"):
+            token_cache.put(digest, payload["exp"], wallet_info)
     
     return wallet_info
 
+async def get_optional_wallet(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+) -> Optional[Dict[str, Any]]:
+    """Like get_authenticated_wallet, but anonymous requests get None; a bad token is still a 401"""
+    if credentials is None:
+        return None
+    return await get_authenticated_wallet(credentials)
+
+async def revoke_token(token: str) -> bool:
+    """Revoke a valid token until it expires; returns False if it was already unusable"""
+    payload = auth_manager.decode_jwt_token(token)
+    if not payload:
+        return False
+    digest = token_digest(token)
+    token_cache.discard(digest)
+    await revocation_list.revoke(digest, payload.get("exp") or time.time() + 86400)
+    return True
+
 # Pydantic models for request/response
 class ChallengeRequest(BaseModel):
     wallet_address: str
@@ -0,0 +1,154 @@
+"""
+Autoplay Partition Leases
+Splits autoplay sessions into a fixed number of partitions by a stable hash of
+wallet_address and hands each partition to exactly one live worker through a
+renewable lease document, so any number of processes can run autoplay without
+double-betting a session
+"""
+
+import os
+import math
+import socket
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Set, Tuple
+
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+AUTOPLAY_PARTITIONS = int(os.getenv("AUTOPLAY_PARTITIONS", "64"))
+
+def partition_for(wallet_address: str, partitions: int = AUTOPLAY_PARTITIONS) -> int:
+    """Stable partition for a wallet (md5, not hash(), so every process agrees)"""
+    digest = hashlib.md5(wallet_address.encode()).digest()
+    return int.from_bytes(digest[:8], "big") % partitions
+
+class PartitionLeaseManager:
+    """
+    Owns a fair share of autoplay partitions for one worker
+    Leases live in autoplay_leases as {_id: partition, owner, expires_at, epoch}; workers
+    announce themselves in autoplay_workers so each can work out its share as
+    ceil(partitions / live workers). A dead worker's leases expire and are picked
+    up by the survivors on their next heartbeat
+    Every acquisition bumps the lease epoch and stamps it onto the partition's active
+    sessions as lease_epoch, so a stalled former owner can be fenced off at settlement
+    """
+
+    def __init__(self, db, worker_id: str = None, partitions: int = AUTOPLAY_PARTITIONS,
+                 lease_ttl: int = None):
+        self.db = db
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.partitions = partitions
+        self.lease_ttl = lease_ttl or int(os.getenv("AUTOPLAY_LEASE_TTL", "30"))
+        self.owned: Set[int] = set()
+        self.epochs: Dict[int, int] = {}
+
+    @property
+    def heartbeat_interval(self) -> float:
+        """Renew well inside the TTL so one slow heartbeat doesn't lose the leases"""
+        return self.lease_ttl / 3
+
+    async def backfill_partitions(self) -> int:
+        """Assign a partition to active sessions created before partitioning existed"""
+        ops = [
+            UpdateOne({"_id": session["_id"]},
+                      {"$set": {"partition": partition_for(session["wallet_address"], self.partitions)}})
+            async for session in self.db.autoplay_sessions.find(
+                {"status": "active", "partition": {"$exists": False}},
+                {"wallet_address": 1}
+            )
+        ]
+        if ops:
+            await self.db.autoplay_sessions.bulk_write(ops, ordered=False)
+        return len(ops)
+
+    async def heartbeat(self) -> Tuple[Set[int], Set[int]]:
+        """
+        Renew this worker's leases, release any surplus and claim free partitions up to
+        the fair share
+        Returns (gained, lost) partitions since the previous heartbeat
+        """
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.lease_ttl)
+        previous = set(self.owned)
+
+        await self.db.autoplay_workers.update_one(
+            {"_id": self.worker_id},
+            {"$set": {"expires_at": expires_at, "partitions": len(self.owned)}},
+            upsert=True
+        )
+        live_workers = await self.db.autoplay_workers.count_documents({"expires_at": {"$gt": now}})
+        fair_share = math.ceil(self.partitions / max(live_workers, 1))
+
+        # Renew, then re-read what we still hold; a lease lost during a long pause is gone
+        await self.db.autoplay_leases.update_many(
+            {"owner": self.worker_id},
+            {"$set": {"expires_at": expires_at}}
+        )
+        leases = await self.db.autoplay_leases.find({}, {"owner": 1, "expires_at": 1, "epoch": 1}).to_list(None)
+        self.owned = {lease["_id"] for lease in leases if lease.get("owner") == self.worker_id}
+        self.epochs = {lease["_id"]: lease.get("epoch", 0) for lease in leases if lease["_id"] in self.owned}
+
+        # Hand back surplus so a newly started worker can take its share
+        if len(self.owned) > fair_share:
+            surplus = sorted(self.owned)[fair_share:]
+            await self.db.autoplay_leases.update_many(
+                {"_id": {"$in": surplus}, "owner": self.worker_id},
+                {"$set": {"owner": None, "expires_at": now}}
+            )
+            self.owned -= set(surplus)
+            for partition in surplus:
+                self.epochs.pop(partition, None)
+
+        # Claim unowned or expired partitions until we reach the fair share
+        held = {lease["_id"] for lease in leases if lease.get("owner") and lease["expires_at"] > now}
+        for partition in range(self.partitions):
+            if len(self.owned) >= fair_share:
+                break
+            if partition in held:
+                continue
+            if await self._acquire(partition, now, expires_at):
+                self.owned.add(partition)
+
+        gained, lost = self.owned - previous, previous - self.owned
+        if gained or lost:
+            logger.info(f"Autoplay worker {self.worker_id} owns {len(self.owned)}/{self.partitions} "
+                        f"partitions (+{len(gained)} -{len(lost)}, {live_workers} live workers)")
+        return gained, lost
+
+    async def release_all(self):
+        """Give up every lease on clean shutdown so survivors don't wait for expiry"""
+        await self.db.autoplay_leases.update_many(
+            {"owner": self.worker_id},
+            {"$set": {"owner": None, "expires_at": datetime.utcnow()}}
+        )
+        await self.db.autoplay_workers.delete_one({"_id": self.worker_id})
+        self.owned = set()
+        self.epochs = {}
+
+    async def _acquire(self, partition: int, now: datetime, expires_at: datetime) -> bool:
+        try:
+            lease = await self.db.autoplay_leases.find_one_and_update(
+                {"_id": partition, "$or": [
+                    {"owner": None},
+                    {"owner": self.worker_id},
+                    {"expires_at": {"$lte": now}}
+                ]},
+                {"$set": {"owner": self.worker_id, "expires_at": expires_at}, "$inc": {"epoch": 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Another worker holds a live lease, so the upsert tried to insert a second document
+            return False
+
+        # Fence the previous owner out before this worker loads and bets the sessions
+        await self.db.autoplay_sessions.update_many(
+            {"partition": partition, "status": "active"},
+            {"$max": {"lease_epoch": lease["epoch"]}}
+        )
+        self.epochs[partition] = lease["epoch"]
+        return True
@@ -0,0 +1,241 @@
+"""
+Autoplay Scheduler
+Keeps active autoplay sessions in a min-heap keyed by next bet time and settles every
+bet due in a tick as one batch, with a bounded number of batches in flight. With a
+partition lease manager, each scheduler only runs sessions in the partitions it owns
+"""
+
+import os
+import heapq
+import random
+import asyncio
+import itertools
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Tuple, Callable, Awaitable, Optional
+
+from autoplay.partitions import PartitionLeaseManager, partition_for
+
+logger = logging.getLogger(__name__)
+
+class AutoplayScheduler:
+    """
+    In-process autoplay scheduler
+    Heap entries are (due_time, sequence, session_id) on the event loop clock; removed or
+    rescheduled sessions are dropped lazily when their stale entry reaches the top
+    """
+
+    def __init__(self, db, execute_batch: Callable[[List[Dict[str, Any]]], Awaitable[Dict[Any, bool]]],
+                 max_concurrency: int = None, max_batch: int = None,
+                 leases: Optional[PartitionLeaseManager] = None):
+        self.db = db
+        self.leases = leases  # None runs every session in this process
+        # Settles a batch of due sessions, returns session_id -> whether the session keeps running
+        self.execute_batch = execute_batch
+        self.max_concurrency = max_concurrency or int(os.getenv("AUTOPLAY_MAX_CONCURRENCY", "4"))
+        self.max_batch = max_batch or int(os.getenv("AUTOPLAY_MAX_BATCH", "500"))
+
+        self._heap: List[Tuple[float, int, Any]] = []
+        self._sessions: Dict[Any, Dict[str, Any]] = {}
+        self._entry_seq: Dict[Any, int] = {}
+        self._seq = itertools.count()
+        self._pending: List[Tuple[Any, float]] = []  # Due entries waiting for a free batch slot
+        self._in_flight: set = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lease_task: Optional[asyncio.Task] = None
+        self._watermark: Optional[datetime] = None  # Newest started_at seen by the last resync
+
+        self.bets_placed = 0
+        self.batches_run = 0
+        self.max_lag_ms = 0.0
+        self._lag_total_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        """Load active sessions from the database and start the scheduling loop"""
+        self._wakeup = asyncio.Event()
+
+        if self.leases:
+            await self.leases.backfill_partitions()
+            await self.leases.heartbeat()
+            await self._load_sessions({"partition": {"$in": list(self.leases.owned)}})
+            self._lease_task = asyncio.create_task(self._maintain_leases())
+        else:
+            await self._load_sessions({})
+
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Autoplay scheduler started with {len(self._sessions)} active sessions")
+
+    async def stop(self):
+        """Stop scheduling, wait for in-flight batches to finish and hand back leases"""
+        for task in (self._lease_task, self._task):
+            if task:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._lease_task = self._task = None
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        if self.leases:
+            await self.leases.release_all()
+
+    def owns(self, session: Dict[str, Any]) -> bool:
+        """Whether this scheduler should run the session"""
+        if not self.leases:
+            return True
+        partition = session.get("partition")
+        if partition is None:
+            partition = partition_for(session["wallet_address"], self.leases.partitions)
+        return partition in self.leases.owned
+
+    def add_session(self, session: Dict[str, Any], spread: bool = False):
+        """
+        Track a session and schedule its next bet from last_bet_at and bet_frequency
+        With spread=True, overdue sessions are staggered across one bet interval so a
+        restart doesn't fire every session at once
+        """
+        frequency = session["bet_frequency"]
+        delay = 0.0
+        last_bet_at = session.get("last_bet_at")
+        if last_bet_at:
+            elapsed = (datetime.utcnow() - last_bet_at).total_seconds()
+            delay = max(0.0, frequency - elapsed)
+        if delay == 0.0 and spread:
+            delay = random.uniform(0, frequency)
+
+        self._sessions[session["_id"]] = session
+        self._schedule(session["_id"], asyncio.get_running_loop().time() + delay)
+
+    def remove_session(self, session_id):
+        """Stop tracking a session; its heap entry is discarded lazily"""
+        self._sessions.pop(session_id, None)
+        self._entry_seq.pop(session_id, None)
+
+    def remove_wallet(self, wallet_address: str) -> int:
+        """Stop tracking every session belonging to a wallet"""
+        session_ids = [sid for sid, session in self._sessions.items()
+                       if session["wallet_address"] == wallet_address]
+        for session_id in session_ids:
+            self.remove_session(session_id)
+        return len(session_ids)
+
+    def status(self) -> Dict[str, Any]:
+        """Scheduler health for status endpoints"""
+        return {
+            "running": self.running,
+            "worker_id": self.leases.worker_id if self.leases else None,
+            "owned_partitions": len(self.leases.owned) if self.leases else None,
+            "tracked_sessions": len(self._sessions),
+            "heap_size": len(self._heap),
+            "pending": len(self._pending),
+            "in_flight": len(self._in_flight),
+            "bets_placed": self.bets_placed,
+            "batches_run": self.batches_run,
+            "max_lag_ms": round(self.max_lag_ms, 2),
+            "avg_lag_ms": round(self._lag_total_ms / self.bets_placed, 2) if self.bets_placed else 0.0
+        }
+
+    async def _load_sessions(self, query: Dict[str, Any]):
+        async for session in self.db.autoplay_sessions.find({"status": "active", **query}):
+            if session["_id"] not in self._sessions:
+                self.add_session(session, spread=True)
+            if self._watermark is None or session["started_at"] > self._watermark:
+                self._watermark = session["started_at"]
+
+    async def _maintain_leases(self):
+        """Heartbeat leases, follow partition ownership changes and pick up sessions started elsewhere"""
+        while True:
+            await asyncio.sleep(self.leases.heartbeat_interval)
+            try:
+                gained, lost = await self.leases.heartbeat()
+
+                if lost:
+                    for session_id in [sid for sid, session in self._sessions.items()
+                                       if session.get("partition") in lost]:
+                        self.remove_session(session_id)
+                if gained:
+                    await self._load_sessions({"partition": {"$in": list(gained)}})
+
+                # Sessions started through another process; overlap by one TTL to absorb clock skew
+                query = {"partition": {"$in": list(self.leases.owned)}}
+                if self._watermark:
+                    query["started_at"] = {"$gt": self._watermark - timedelta(seconds=self.leases.lease_ttl)}
+                await self._load_sessions(query)
+            except Exception as e:
+                logger.error(f"Autoplay lease heartbeat failed: {e}")
+
+    def _schedule(self, session_id, due_at: float):
+        seq = next(self._seq)
+        self._entry_seq[session_id] = seq
+        is_new_head = not self._heap or due_at < self._heap[0][0]
+        heapq.heappush(self._heap, (due_at, seq, session_id))
+        if is_new_head and self._wakeup:
+            self._wakeup.set()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            self._wakeup.clear()
+            now = loop.time()
+
+            # Pop every due entry, skipping stale ones from removed or rescheduled sessions
+            while self._heap and self._heap[0][0] <= now:
+                due_at, seq, session_id = heapq.heappop(self._heap)
+                if self._entry_seq.get(session_id) != seq:
+                    continue
+                del self._entry_seq[session_id]
+                self._pending.append((session_id, due_at))
+
+            # Due entries pile up while every slot is busy, so batches grow with load
+            while self._pending and len(self._in_flight) < self.max_concurrency:
+                batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+                task = asyncio.create_task(self._run_batch(batch))
+                self._in_flight.add(task)
+                task.add_done_callback(self._batch_done)
+
+            # Sleep until the next bet is due, a sooner session is added or a batch slot frees up
+            timeout = max(0.0, self._heap[0][0] - loop.time()) if self._heap else None
+            if self._pending:
+                timeout = None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _batch_done(self, task: asyncio.Task):
+        self._in_flight.discard(task)
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def _run_batch(self, batch: List[Tuple[Any, float]]):
+        entries = [(session_id, due_at) for session_id, due_at in batch if session_id in self._sessions]
+        if not entries:
+            return
+
+        started = asyncio.get_running_loop().time()
+        sessions = [self._sessions[session_id] for session_id, _ in entries]
+        try:
+            results = await self.execute_batch(sessions)
+        except Exception as e:
+            logger.error(f"Autoplay batch of {len(sessions)} sessions failed: {e}")
+            results = {}
+
+        self.batches_run += 1
+        now = asyncio.get_running_loop().time()
+        for session_id, due_at in entries:
+            lag_ms = (started - due_at) * 1000
+            self.bets_placed += 1
+            self._lag_total_ms += lag_ms
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+
+            # A session missing from the results failed with the batch and is retried next interval
+            if not results.get(session_id, True):
+                self.remove_session(session_id)
+            elif session_id in self._sessions:
+                # Next bet is anchored to the previous due time so timing doesn't drift
+                session = self._sessions[session_id]
+                self._schedule(session_id, max(due_at + session["bet_frequency"], now))
@@ -0,0 +1,303 @@
+"""
+Batched Autoplay Settlement
+Settles every autoplay bet due in a scheduler tick with a constant number of MongoDB
+round-trips: one lease-fenced claim and status read, one user read, one insert_many for bet records and one
+unordered bulk_write each for user balances and session stats, plus one ledger
+transaction for the batch's postings when a ledger is attached and one bulk $inc of
+the hourly bet rollups when rollups are attached
+"""
+
+import uuid
+import asyncio
+import logging
+import random
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from pymongo import UpdateOne, UpdateMany
+
+from autoplay.partitions import PartitionLeaseManager, partition_for
+from games.engine import resolve_bet
+from ledger.postings import bet_legs, liquidity_reward
+from services.amounts import to_minor, to_float
+from savings.loss_totals import seed_loss_totals
+
+logger = logging.getLogger(__name__)
+
+class AutoplaySettlement:
+    """Settles batches of due autoplay sessions"""
+
+    def __init__(self, db, vault, max_vault_transfers: int = 10, ledger=None, rollups=None,
+                 leases: Optional[PartitionLeaseManager] = None):
+        self.db = db
+        self.vault = vault
+        self.leases = leases  # The scheduler's lease manager; None settles any session
+        self.ledger = ledger
+        self.rollups = rollups
+        self._vault_semaphore = asyncio.Semaphore(max_vault_transfers)
+        self._vault_tasks: set = set()
+
+    async def settle(self, sessions: List[Dict[str, Any]]) -> Dict[Any, bool]:
+        """
+        Place one bet for every session in the batch
+        Returns session_id -> whether the session should keep running
+        """
+        now = datetime.utcnow()
+        keep_running: Dict[Any, bool] = {}
+        completed_ids = []
+
+        # Time and loss limits are checked against the scheduler's in-memory copy
+        candidates = []
+        for session in sessions:
+            elapsed_hours = (now - session["started_at"]).total_seconds() / 3600
+            if elapsed_hours >= session["max_duration"] or session.get("total_losses", 0) >= session["max_loss"]:
+                completed_ids.append(session["_id"])
+                keep_running[session["_id"]] = False
+            else:
+                candidates.append(session)
+
+        if candidates:
+            # Sessions stopped from any worker since they were scheduled are dropped silently,
+            # as are sessions in a partition another worker has taken over
+            active_ids = await self._claim(candidates)
+            for session in candidates:
+                if session["_id"] not in active_ids:
+                    keep_running[session["_id"]] = False
+            candidates = [session for session in candidates if session["_id"] in active_ids]
+
+        if candidates:
+            keep_running.update(await self._settle_bets(candidates, now, completed_ids))
+
+        if completed_ids:
+            await self.db.autoplay_sessions.update_many(
+                {"_id": {"$in": completed_ids}, "status": "active"},
+                {"$set": {"status": "completed", "stopped_at": now}}
+            )
+
+        return keep_running
+
+    async def _claim(self, sessions: List[Dict[str, Any]]) -> Set[Any]:
+        """
+        Ids of the sessions this worker may still bet
+        With leases, each session is stamped with its partition's lease epoch unless a newer
+        owner has already stamped a higher one; a worker that stalled past its lease TTL
+        then finds its sessions fenced off instead of betting them a second time
+        """
+        ids = [session["_id"] for session in sessions]
+        if self.leases is None:
+            return {
+                doc["_id"] async for doc in self.db.autoplay_sessions.find(
+                    {"_id": {"$in": ids}, "status": "active"}, {"_id": 1}
+                )
+            }
+
+        by_partition: Dict[int, List[Any]] = defaultdict(list)
+        for session in sessions:
+            partition = session.get("partition")
+            if partition is None:
+                partition = partition_for(session["wallet_address"], self.leases.partitions)
+            if partition in self.leases.epochs:
+                by_partition[partition].append(session["_id"])
+        if not by_partition:
+            return set()
+
+        epochs = {partition: self.leases.epochs[partition] for partition in by_partition}
+        await self.db.autoplay_sessions.bulk_write([
+            UpdateMany(
+                {"_id": {"$in": partition_ids}, "status": "active", "lease_epoch": {"$not": {"$gt": epochs[partition]}}},
+                {"$set": {"lease_epoch": epochs[partition]}}
+            )
+            for partition, partition_ids in by_partition.items()
+        ], ordered=False)
+
+        claimed = set()
+        async for doc in self.db.autoplay_sessions.find(
+            {"_id": {"$in": ids}, "status": "active"}, {"partition": 1, "wallet_address": 1, "lease_epoch": 1}
+        ):
+            partition = doc.get("partition")
+            if partition is None:
+                partition = partition_for(doc["wallet_address"], self.leases.partitions)
+            if partition in epochs and doc.get("lease_epoch") == epochs[partition]:
+                claimed.add(doc["_id"])
+        return claimed
+
+    async def _settle_bets(self, sessions: List[Dict[str, Any]], now: datetime,
+                           completed_ids: List[Any]) -> Dict[Any, bool]:
+        keep_running: Dict[Any, bool] = {}
+        wallets = list({session["wallet_address"] for session in sessions})
+
+        users = {
+            user["wallet_address"]: user
+            async for user in self.db.users.find(
+                {"wallet_address": {"$in": wallets}},
+                {"wallet_address": 1, "deposit_balance": 1, "loss_totals": 1}
+            )
+        }
+
+        # Seed cumulative loss totals for any (wallet, currency) seen for the first time
+        unseeded = {
+            (session["wallet_address"], session["currency"])
+            for session in sessions
+            if session["wallet_address"] in users
+            and session["currency"] not in users[session["wallet_address"]].get("loss_totals", {})
+        }
+        for (wallet, currency), total in (await seed_loss_totals(self.db, unseeded)).items():
+            users[wallet].setdefault("loss_totals", {})[currency] = total
+
+        # Resolve outcomes against per-user balances tracked locally for this tick
+        balances = {wallet: dict(user.get("deposit_balance", {})) for wallet, user in users.items()}
+        loss_totals = {wallet: dict(user.get("loss_totals", {})) for wallet, user in users.items()}
+        # Increments are summed in minor units and converted once per field
+        user_incs: Dict[str, Dict[Tuple[str, str], int]] = defaultdict(lambda: defaultdict(int))
+        user_wagers: Dict[Tuple[str, str], int] = defaultdict(int)
+        bet_records = []
+        session_updates = []
+        losses = []
+
+        for session in sessions:
+            wallet = session["wallet_address"]
+            currency = session["currency"]
+            bet_amount = session["bet_amounts"][currency]
+
+            if wallet not in users or balances[wallet].get(currency, 0) < bet_amount:
+                completed_ids.append(session["_id"])
+                keep_running[session["_id"]] = False
+                continue
+
+            game_type = random.choice(session["games"])
+            is_winner, payout = resolve_bet(game_type, bet_amount)
+            game_id = f"game_{uuid.uuid4().hex}"
+            bet_units = to_minor(bet_amount, currency)
+            payout_units = to_minor(payout, currency)
+
+            balances[wallet][currency] = balances[wallet].get(currency, 0) - bet_amount
+            incs = user_incs[wallet]
+            incs[("deposit_balance", currency)] -= bet_units
+            user_wagers[(wallet, currency)] += bet_units
+
+            record = {
+                "wallet_address": wallet,
+                "game_type": game_type,
+                "bet_amount": bet_amount,
+                "currency": currency,
+                "network": "autoplay",
+                "game_id": game_id,
+                "result": "win" if is_winner else "loss",
+                "payout": payout,
+                "bet_amount_minor": bet_units,
+                "payout_minor": payout_units,
+                "status": "completed",
+                "timestamp": now
+            }
+
+            if is_winner:
+                incs[("winnings_balance", currency)] += payout_units
+            else:
+                # Loss goes to savings, 10% of it to the liquidity pool
+                loss_totals[wallet][currency] = loss_totals[wallet].get(currency, 0) + bet_amount
+                record["running_total"] = loss_totals[wallet][currency]
+                incs[("savings_balance", currency)] += bet_units
+                incs[("liquidity_pool", currency)] += liquidity_reward(bet_units)
+                incs[("loss_totals", currency)] += bet_units
+                losses.append((wallet, currency, bet_amount, game_id))
+
+            bet_records.append(record)
+
+            stats_inc = {"total_bets": 1}
+            if is_winner:
+                stats_inc["total_winnings"] = payout
+            else:
+                stats_inc["total_losses"] = bet_amount
+            session_updates.append((session, stats_inc))
+            keep_running[session["_id"]] = True
+
+        if not bet_records:
+            return keep_running
+
+        # Balances first, guarded so a concurrent debit elsewhere can't drive one negative
+        tick_id = uuid.uuid4().hex
+        user_ops = []
+        for wallet, incs in user_incs.items():
+            guard = {"wallet_address": wallet}
+            for (guard_wallet, currency), wagered in user_wagers.items():
+                if guard_wallet == wallet:
+                    guard[f"deposit_balance.{currency}"] = {"$gte": to_float(wagered, currency)}
+            float_incs = {f"{field}.{currency}": to_float(units, currency)
+                          for (field, currency), units in incs.items() if units}
+            user_ops.append(UpdateOne(guard, {"$inc": float_incs, "$set": {"autoplay_tick": tick_id}}))
+
+        result = await self.db.users.bulk_write(user_ops, ordered=False)
+
+        if result.matched_count < len(user_ops):
+            # Rare: a guard failed. Drop that user's bets from this tick and retry them next time
+            applied = {
+                user["wallet_address"] async for user in self.db.users.find(
+                    {"wallet_address": {"$in": list(user_incs)}, "autoplay_tick": tick_id},
+                    {"wallet_address": 1}
+                )
+            }
+            skipped = set(user_incs) - applied
+            logger.warning(f"Autoplay balance guard failed for {len(skipped)} users, retrying next tick")
+            bet_records = [record for record in bet_records if record["wallet_address"] not in skipped]
+            losses = [loss for loss in losses if loss[0] not in skipped]
+            session_updates = [(session, stats_inc) for session, stats_inc in session_updates
+                               if session["wallet_address"] not in skipped]
+
+        session_ops = []
+        for session, stats_inc in session_updates:
+            session_ops.append(UpdateOne(
+                {"_id": session["_id"]},
+                {"$set": {"last_bet_at": now}, "$inc": stats_inc}
+            ))
+            # Keep the scheduler's copy current so limit checks don't need a re-read
+            session["last_bet_at"] = now
+            for field, value in stats_inc.items():
+                session[field] = session.get(field, 0) + value
+
+        if bet_records:
+            await self.db.game_bets.insert_many(bet_records, ordered=False)
+            if self.ledger is not None:
+                await self._post_to_ledger(bet_records)
+            if self.rollups is not None:
+                try:
+                    await self.rollups.record(bet_records)
+                except Exception as e:
+                    logger.error(f"Bet rollup update failed for {len(bet_records)} autoplay bets: {e}")
+        if session_ops:
+            await self.db.autoplay_sessions.bulk_write(session_ops, ordered=False)
+
+        # Vault transfers call CoinPayments, so they run off the settlement path
+        for loss in losses:
+            task = asyncio.create_task(self._transfer_to_vault(*loss))
+            self._vault_tasks.add(task)
+            task.add_done_callback(self._vault_tasks.discard)
+
+        return keep_running
+
+    async def _post_to_ledger(self, bet_records: List[Dict[str, Any]]):
+        """One ledger transaction for the whole tick, keyed by game_id so a repost can't double-post"""
+        postings = [{
+            "kind": "bet",
+            "wallet_address": record["wallet_address"],
+            "reference": record["game_id"],
+            "legs": bet_legs(record["wallet_address"], record["currency"], record["bet_amount_minor"],
+                             record["result"] == "win", record["payout_minor"])
+        } for record in bet_records]
+        try:
+            # users balances are already updated, so a failed post is deferred and retried
+            await self.ledger.post_or_defer(postings)
+        except Exception as e:
+            logger.error(f"Ledger posting and deferral failed for {len(postings)} autoplay bets: {e}")
+
+    async def _transfer_to_vault(self, wallet: str, currency: str, amount: float, game_id: str):
+        async with self._vault_semaphore:
+            try:
+                await self.vault.transfer_to_savings_vault(
+                    user_wallet=wallet,
+                    currency=currency,
+                    amount=amount,
+                    bet_id=game_id
+                )
+            except Exception as e:
+                logger.error(f"Vault transfer failed for {game_id}: {e}")
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Autoplay Worker
+Standalone process that runs autoplay for the partitions it leases. Start as many as
+needed across cores and hosts; partitions rebalance as workers come and go. Set
+AUTOPLAY_SCHEDULER_ENABLED=false on the API servers when running dedicated workers.
+
+    python backend/autoplay/worker.py
+"""
+
+import os
+import sys
+import signal
+import asyncio
+import logging
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+
+# Add backend directory to path
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+# Load environment variables
+load_dotenv(backend_dir / '.env')
+
+from autoplay.partitions import PartitionLeaseManager
+from autoplay.scheduler import AutoplayScheduler
+from autoplay.settlement import AutoplaySettlement
+from ledger.journal import Ledger
+from games.rollups import BetRollups
+from savings.non_custodial_vault import non_custodial_vault
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+async def main():
+    """Run the scheduler for leased partitions until SIGINT/SIGTERM"""
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+
+    leases = PartitionLeaseManager(db)
+    ledger = Ledger(db, client)
+    settlement = AutoplaySettlement(db, non_custodial_vault, ledger=ledger, rollups=BetRollups(db), leases=leases)
+    scheduler = AutoplayScheduler(db, settlement.settle, leases=leases)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    ledger.start()
+    await scheduler.start()
+    logger.info(f"Autoplay worker {scheduler.leases.worker_id} running")
+    await stop.wait()
+
+    # Releasing leases on the way out lets the other workers take over immediately
+    await scheduler.stop()
+    await ledger.stop()
+    logger.info(f"Autoplay worker stopped: {scheduler.status()}")
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -319,11 +319,13 @@ class SPLTokenManager:
             return {"balance": "0", "decimals": 9, "ui_amount": 0.0, "error": str(e)}
 
 class CRTTokenManager:
+    DECIMALS = 6  # CRT token uses 6 decimals
+    
     def __init__(self, solana_manager: SolanaManager, spl_manager: SPLTokenManager):
         self.solana = solana_manager
         self.spl = spl_manager
         self.crt_mint = os.getenv("CRT_TOKEN_MINT", "9pjWtc6x88wrRMXTxkBcNB6YtcN7NNcyzDAfUMfRknty")
-        self.decimals = 6  # CRT token uses 6 decimals
+        self.decimals = self.DECIMALS
         self.price_cache = {"price": 0.15, "last_update": None}  # Mock price for now
         
     async def get_crt_balance(self, wallet_address: str) -> Dict[str, Any]:
@@ -0,0 +1,43 @@
+"""
+Casino Game Engine
+Shared outcome logic for single bets and batched autoplay settlement
+"""
+
+import random
+from typing import Tuple
+
+# Different win rates for different games
+GAME_WIN_RATES = {
+    "Slot Machine": 0.15,    # 15% win rate
+    "Roulette": 0.47,        # ~47% win rate (red/black)
+    "Dice": 0.49,            # ~49% win rate
+    "Plinko": 0.20,          # 20% win rate for big multipliers
+    "Keno": 0.25,            # 25% win rate
+    "Mines": 0.30            # 30% win rate
+}
+
+def resolve_bet(game_type: str, bet_amount: float) -> Tuple[bool, float]:
+    """Decide whether a bet wins and its payout, using real randomness"""
+    win_rate = GAME_WIN_RATES.get(game_type, 0.25)
+    is_winner = random.random() < win_rate
+
+    if not is_winner:
+        return False, 0
+
+    # Calculate payout based on game type
+    if game_type == "Slot Machine":
+        payout = bet_amount * random.choice([2, 3, 5, 10, 25])  # Variable multipliers
+    elif game_type == "Roulette":
+        payout = bet_amount * 2  # Even money bets
+    elif game_type == "Dice":
+        payout = bet_amount * random.uniform(1.5, 10)  # Based on prediction
+    elif game_type == "Plinko":
+        payout = bet_amount * random.choice([1.5, 2, 4, 9, 26, 130, 1000])
+    elif game_type == "Keno":
+        payout = bet_amount * random.choice([3, 12, 42, 108, 810])
+    elif game_type == "Mines":
+        payout = bet_amount * random.uniform(2, 50)
+    else:
+        payout = bet_amount * 2
+
+    return True, payout
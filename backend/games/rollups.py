@@ -0,0 +1,179 @@
+"""
+Bet Rollups
+Hourly bet totals per (wallet, game_type, currency), maintained with $inc as bets settle,
+so stats over any range sum at most one document per active hour instead of every bet
+
+    bet_rollups       {wallet_address, game_type, currency, hour, bets, wins, losses,
+                       wagered_minor, payout_minor, lost_minor}
+    bet_rollup_state  {_id: "bet_rollups", live_since, backfilled_through}
+
+Live increments cover bets from live_since, the first hour boundary after rollups were
+first enabled; the backfill rebuilds every hour before it from game_bets and the bet
+archive. The two never overlap, so the backfill can be rerun safely while bets settle
+"""
+
+import time
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Iterable
+
+from pymongo import UpdateOne
+
+from archive.bet_archive import BetArchive, bet_archive
+from services.amounts import CURRENCY_PRECISION, DEFAULT_PRECISION, to_minor
+
+logger = logging.getLogger(__name__)
+
+ROLLUPS = "bet_rollups"
+STATE = "bet_rollup_state"
+ROLLUP_KEYS = ["wallet_address", "game_type", "currency", "hour"]
+COUNTERS = ["bets", "wins", "losses", "wagered_minor", "payout_minor", "lost_minor"]
+READY_RECHECK_SECONDS = 60
+WRITE_CHUNK = 1000
+
+def floor_hour(timestamp: datetime) -> datetime:
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+def _minor_expression(amount_field: str) -> Dict[str, Any]:
+    """Stored minor units, or the decimal amount scaled by its currency's precision for older bets"""
+    scale = {"$switch": {
+        "branches": [{"case": {"$eq": ["$currency", currency]}, "then": 10 ** places}
+                     for currency, places in CURRENCY_PRECISION.items()],
+        "default": 10 ** DEFAULT_PRECISION
+    }}
+    return {"$ifNull": [
+        f"${amount_field}_minor",
+        {"$toLong": {"$round": [{"$multiply": [{"$ifNull": [f"${amount_field}", 0]}, scale]}, 0]}}
+    ]}
+
+class BetRollups:
+    """Maintains and answers queries over hourly bet rollups"""
+
+    def __init__(self, db, archive: BetArchive = bet_archive):
+        self.db = db
+        self.archive = archive
+        self.live_since: Optional[datetime] = None
+        self._ready = False
+        self._ready_checked = 0.0
+
+        self.bets_rolled_up = 0
+
+    async def start(self) -> datetime:
+        """Load (or on first use, fix) the hour from which settlement maintains rollups"""
+        if self.live_since is None:
+            first_hour = floor_hour(datetime.utcnow()) + timedelta(hours=1)
+            await self.db[STATE].update_one(
+                {"_id": ROLLUPS}, {"$setOnInsert": {"live_since": first_hour}}, upsert=True
+            )
+            state = await self.db[STATE].find_one({"_id": ROLLUPS})
+            self.live_since = state["live_since"]
+        return self.live_since
+
+    async def record(self, bet_records: Iterable[Dict[str, Any]]):
+        """$inc the rollups for settled bets; one unordered bulk write per call"""
+        live_since = await self.start()
+        increments: Dict[tuple, Dict[str, int]] = {}
+        for record in bet_records:
+            if record["timestamp"] < live_since:
+                continue
+            key = (record["wallet_address"], record["game_type"], record["currency"], floor_hour(record["timestamp"]))
+            won = record["result"] == "win"
+            wagered = record.get("bet_amount_minor", to_minor(record["bet_amount"], record["currency"]))
+            counters = increments.setdefault(key, dict.fromkeys(COUNTERS, 0))
+            counters["bets"] += 1
+            counters["wins" if won else "losses"] += 1
+            counters["wagered_minor"] += wagered
+            counters["payout_minor"] += record.get("payout_minor", to_minor(record.get("payout", 0), record["currency"]))
+            if not won:
+                counters["lost_minor"] += wagered
+
+        if increments:
+            await self.db[ROLLUPS].bulk_write([
+                UpdateOne(dict(zip(ROLLUP_KEYS, key)), {"$inc": counters}, upsert=True)
+                for key, counters in increments.items()
+            ], ordered=False)
+            self.bets_rolled_up += sum(counters["bets"] for counters in increments.values())
+
+    async def ready(self) -> bool:
+        """Whether the backfill has covered every hour before live_since"""
+        if not self._ready and time.monotonic() - self._ready_checked > READY_RECHECK_SECONDS:
+            state = await self.db[STATE].find_one({"_id": ROLLUPS}) or {}
+            self._ready = bool(state.get("backfilled_through")) and state["backfilled_through"] >= state["live_since"]
+            self._ready_checked = time.monotonic()
+        return self._ready
+
+    async def totals(self, wallet_address: str, start: datetime = None, end: datetime = None,
+                     by: Iterable[str] = ("currency",)) -> List[Dict[str, Any]]:
+        """
+        Summed counters for a wallet between start and end, grouped by any of game_type, currency, hour
+        Ranges resolve to whole hours: the hour containing start is included, the hour
+        containing end is not (end at 10:30 stops at 10:00)
+        """
+        match: Dict[str, Any] = {"wallet_address": wallet_address}
+        if start or end:
+            match["hour"] = {}
+            if start:
+                match["hour"]["$gte"] = floor_hour(start)
+            if end:
+                match["hour"]["$lt"] = floor_hour(end)
+        rows = await self.db[ROLLUPS].aggregate([
+            {"$match": match},
+            {"$group": {
+                "_id": {field: f"${field}" for field in by},
+                **{counter: {"$sum": f"${counter}"} for counter in COUNTERS}
+            }}
+        ]).to_list(None)
+        return [{**row.pop("_id"), **row} for row in rows]
+
+    async def backfill(self) -> Dict[str, Any]:
+        """Rebuild every hour before live_since from game_bets and the archive"""
+        live_since = await self.start()
+        started = time.perf_counter()
+
+        # Hot tier: one aggregation that replaces each hour's rollup in place
+        await self.db.game_bets.aggregate([
+            {"$match": {"$and": [self.archive.hot_query({}), {"timestamp": {"$lt": live_since}}]}},
+            {"$group": {
+                "_id": {
+                    "wallet_address": "$wallet_address",
+                    "game_type": "$game_type",
+                    "currency": "$currency",
+                    "hour": {"$dateTrunc": {"date": "$timestamp", "unit": "hour"}}
+                },
+                "bets": {"$sum": 1},
+                "wins": {"$sum": {"$cond": [{"$eq": ["$result", "win"]}, 1, 0]}},
+                "losses": {"$sum": {"$cond": [{"$eq": ["$result", "win"]}, 0, 1]}},
+                "wagered_minor": {"$sum": _minor_expression("bet_amount")},
+                "payout_minor": {"$sum": _minor_expression("payout")},
+                "lost_minor": {"$sum": {"$cond": [{"$eq": ["$result", "win"]}, 0, _minor_expression("bet_amount")]}}
+            }},
+            {"$replaceWith": {"$mergeObjects": ["$_id", {counter: f"${counter}" for counter in COUNTERS}]}},
+            {"$merge": {"into": ROLLUPS, "on": ROLLUP_KEYS, "whenMatched": "replace", "whenNotMatched": "insert"}}
+        ], allowDiskUse=True).to_list(None)
+
+        # Cold tier: archived days, one partition at a time
+        archived_hours = 0
+        async for rows in self.archive.iter_hourly_rollups():
+            ops = [UpdateOne({key: row[key] for key in ROLLUP_KEYS},
+                             {"$set": {counter: row[counter] for counter in COUNTERS}}, upsert=True)
+                   for row in rows if row["hour"] < live_since]
+            for start in range(0, len(ops), WRITE_CHUNK):
+                await self.db[ROLLUPS].bulk_write(ops[start:start + WRITE_CHUNK], ordered=False)
+            archived_hours += len(ops)
+
+        await self.db[STATE].update_one({"_id": ROLLUPS}, {"$set": {"backfilled_through": live_since}})
+        self._ready = True
+        logger.info(f"Bet rollups backfilled up to {live_since.isoformat()}")
+        return {
+            "live_since": live_since,
+            "rollups": await self.db[ROLLUPS].count_documents({"hour": {"$lt": live_since}}),
+            "archived_rollups": archived_hours,
+            "seconds": time.perf_counter() - started
+        }
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "live_since": self.live_since.isoformat() if self.live_since else None,
+            "ready": self._ready,
+            "bets_rolled_up": self.bets_rolled_up
+        }
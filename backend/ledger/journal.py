@@ -0,0 +1,255 @@
+"""
+Ledger Journal
+Append-only journal of balanced postings with materialized per-account balances.
+Each entry gets a gap-tolerant global sequence number and is written together with the
+$inc of every balance it touches in one MongoDB transaction, so a balance document
+always equals the sum of the entries that touch it and a read is a single lookup
+
+    ledger_entries     {seq, kind, wallet_address, reference, legs: [{account, currency, amount}], created_at}
+    ledger_balances    {_id, account, wallet_address, bucket, balances: {currency: amount}, seq}
+
+Amounts are int64 minor units; convert with services.amounts at the API boundary
+
+System accounts such as system:house take part in most postings, so their balances are
+spread over LEDGER_SYSTEM_SHARDS documents to keep concurrent transactions from
+conflicting on one document; reading one sums its shards
+
+Postings for balance changes already applied to users go through post_or_defer: if the
+journal write fails they are parked in ledger_deferred and reposted every
+LEDGER_RETRY_INTERVAL seconds until they land (their references make a repost a no-op)
+
+    ledger_deferred    {posting, error, attempts, created_at}
+"""
+
+import os
+import random
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from ledger.postings import check_balanced, net_by_account, parse_account
+
+logger = logging.getLogger(__name__)
+
+ENTRIES = "ledger_entries"
+BALANCES = "ledger_balances"
+COUNTERS = "ledger_counters"
+DEFERRED = "ledger_deferred"
+
+SYSTEM_SHARDS = int(os.getenv("LEDGER_SYSTEM_SHARDS", "16"))
+RETRY_INTERVAL = int(os.getenv("LEDGER_RETRY_INTERVAL", "30"))
+RETRY_BATCH = 500
+
+# IllegalOperation: the server is a standalone mongod without transaction support
+TRANSACTIONS_UNSUPPORTED = 20
+
+class Ledger:
+    """Posts entries and serves materialized balances"""
+
+    def __init__(self, db, client=None):
+        self.db = db
+        self.client = client
+        self.transactions = client is not None
+        self._task: Optional[asyncio.Task] = None
+
+        self.entries_posted = 0
+        self.duplicates_skipped = 0
+        self.postings_deferred = 0
+        self.deferred_reposted = 0
+
+    def start(self):
+        """Start reposting deferred postings in the background"""
+        self._task = asyncio.create_task(self._retry_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def post(self, kind: str, legs: List[Dict[str, Any]], wallet_address: str = None,
+                   reference: str = None, metadata: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
+        """Post one entry; returns None if an entry with this reference already exists"""
+        posted = await self.post_many([{
+            "kind": kind, "legs": legs, "wallet_address": wallet_address,
+            "reference": reference, "metadata": metadata
+        }])
+        return posted[0] if posted else None
+
+    async def post_many(self, postings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Post a batch of entries in one transaction
+        References are idempotency keys: postings whose reference is already in the
+        journal are skipped, so a retried request can never post twice
+        """
+        for posting in postings:
+            check_balanced(posting["legs"])
+        if not postings:
+            return []
+
+        first_seq = await self._allocate(len(postings))
+        now = datetime.utcnow()
+        entries = []
+        for offset, posting in enumerate(postings):
+            entry = {
+                "seq": first_seq + offset,
+                "kind": posting["kind"],
+                "wallet_address": posting.get("wallet_address"),
+                "legs": posting["legs"],
+                "created_at": now
+            }
+            if posting.get("reference"):
+                entry["reference"] = posting["reference"]
+            if posting.get("metadata"):
+                entry["metadata"] = posting["metadata"]
+            entries.append(entry)
+
+        posted = await self._write(entries)
+        self.entries_posted += len(posted)
+        self.duplicates_skipped += len(entries) - len(posted)
+        return posted
+
+    async def post_or_defer(self, postings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Post a batch, or park it in ledger_deferred when the journal write fails
+        For changes already applied to users' balances, which the journal must not lose
+        Every posting needs a reference so the eventual repost can't double-post
+        """
+        try:
+            return await self.post_many(postings)
+        except Exception as e:
+            logger.error(f"Ledger posting failed for {len(postings)} entries, deferring for retry: {e}")
+            now = datetime.utcnow()
+            await self.db[DEFERRED].insert_many([
+                {"posting": posting, "error": str(e), "attempts": 0, "created_at": now}
+                for posting in postings
+            ])
+            self.postings_deferred += len(postings)
+            return []
+
+    async def retry_deferred(self, limit: int = RETRY_BATCH) -> int:
+        """Repost the oldest deferred postings; returns how many left the queue"""
+        deferred = await self.db[DEFERRED].find().sort("created_at", 1).limit(limit).to_list(None)
+        if not deferred:
+            return 0
+        try:
+            await self.post_many([doc["posting"] for doc in deferred])
+        except Exception as e:
+            await self.db[DEFERRED].update_many(
+                {"_id": {"$in": [doc["_id"] for doc in deferred]}},
+                {"$inc": {"attempts": 1}, "$set": {"error": str(e)}}
+            )
+            raise
+        await self.db[DEFERRED].delete_many({"_id": {"$in": [doc["_id"] for doc in deferred]}})
+        self.deferred_reposted += len(deferred)
+        logger.info(f"Reposted {len(deferred)} deferred ledger entries")
+        return len(deferred)
+
+    async def balance(self, account: str) -> Dict[str, int]:
+        """Current balance of one account, currency -> minor units"""
+        totals: Dict[str, int] = {}
+        async for doc in self.db[BALANCES].find({"account": account}, {"balances": 1}):
+            for currency, amount in doc.get("balances", {}).items():
+                totals[currency] = totals.get(currency, 0) + amount
+        return totals
+
+    async def wallet_balances(self, wallet_address: str) -> Dict[str, Any]:
+        """Every bucket of a wallet, bucket -> currency -> minor units, plus the last seq applied"""
+        buckets, last_seq = {}, 0
+        async for doc in self.db[BALANCES].find({"wallet_address": wallet_address}):
+            buckets[doc["bucket"]] = doc.get("balances", {})
+            last_seq = max(last_seq, doc.get("seq", 0))
+        return {"balances": buckets, "seq": last_seq}
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "transactions": self.transactions,
+            "entries_posted": self.entries_posted,
+            "duplicates_skipped": self.duplicates_skipped,
+            "postings_deferred": self.postings_deferred,
+            "deferred_reposted": self.deferred_reposted
+        }
+
+    async def _retry_loop(self):
+        while True:
+            await asyncio.sleep(RETRY_INTERVAL)
+            try:
+                while await self.retry_deferred() == RETRY_BATCH:
+                    pass
+            except Exception as e:
+                logger.error(f"Deferred ledger repost failed: {e}")
+
+    async def _allocate(self, count: int) -> int:
+        """Reserve count consecutive sequence numbers; an aborted write leaves a gap"""
+        counter = await self.db[COUNTERS].find_one_and_update(
+            {"_id": "ledger_seq"},
+            {"$inc": {"value": count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return counter["value"] - count + 1
+
+    def _balance_ops(self, entries: List[Dict[str, Any]]) -> List[UpdateOne]:
+        ops = []
+        for entry in entries:
+            for account, amounts in net_by_account(entry["legs"]).items():
+                owner = parse_account(account)
+                key = account if owner["wallet_address"] else f"{account}#{random.randrange(SYSTEM_SHARDS)}"
+                ops.append(UpdateOne(
+                    {"_id": key},
+                    {
+                        "$inc": {f"balances.{currency}": amount for currency, amount in amounts.items()},
+                        "$max": {"seq": entry["seq"]},
+                        "$setOnInsert": {"account": account, **owner}
+                    },
+                    upsert=True
+                ))
+        return ops
+
+    async def _write(self, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insert entries and apply their balances atomically; returns the entries written"""
+        while entries and self.transactions:
+            try:
+                async with await self.client.start_session() as session:
+                    # with_transaction retries transient write conflicts and unknown commits
+                    await session.with_transaction(lambda s: self._write_in_session(entries, s))
+                return entries
+            except BulkWriteError as e:
+                # The transaction aborted on a duplicate reference: drop those and go again
+                duplicates = self._duplicate_indexes(e)
+                entries = [entry for index, entry in enumerate(entries) if index not in duplicates]
+            except OperationFailure as e:
+                if e.code != TRANSACTIONS_UNSUPPORTED:
+                    raise
+                self.transactions = False
+                logger.warning("MongoDB transactions unavailable; ledger balances are applied after "
+                               "their entries without atomicity. Use a replica set in production")
+
+        if not entries:
+            return []
+
+        # Standalone fallback: entries first, so a crash can only leave balances behind the
+        # journal, which a replay repairs
+        try:
+            await self.db[ENTRIES].insert_many(entries, ordered=False)
+        except BulkWriteError as e:
+            duplicates = self._duplicate_indexes(e)
+            entries = [entry for index, entry in enumerate(entries) if index not in duplicates]
+        if entries:
+            await self.db[BALANCES].bulk_write(self._balance_ops(entries), ordered=False)
+        return entries
+
+    async def _write_in_session(self, entries: List[Dict[str, Any]], session):
+        await self.db[ENTRIES].insert_many(entries, ordered=False, session=session)
+        await self.db[BALANCES].bulk_write(self._balance_ops(entries), ordered=False, session=session)
+
+    @staticmethod
+    def _duplicate_indexes(error: BulkWriteError) -> set:
+        write_errors = error.details.get("writeErrors", [])
+        if not write_errors or any(write_error["code"] != 11000 for write_error in write_errors):
+            raise error
+        return {write_error["index"] for write_error in write_errors}
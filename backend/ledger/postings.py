@@ -0,0 +1,131 @@
+"""
+Ledger Postings
+Accounts and balanced leg sets for the double-entry ledger. Every posting is a list of
+legs (account, currency, amount) whose amounts sum to zero per currency: positive legs
+credit an account, negative legs debit it. Amounts are integer minor units (see
+services.amounts), so a balanced posting nets to exactly zero. User accounts mirror the
+balance buckets on the users document; system accounts absorb the other side of money
+entering, leaving or being created by the platform
+"""
+
+from collections import defaultdict
+from typing import Dict, Any, List, Iterable
+
+from services.amounts import to_minor
+
+# Ledger bucket -> users document field it mirrors
+BALANCE_BUCKETS = {
+    "deposit": "deposit_balance",
+    "winnings": "winnings_balance",
+    "savings": "savings_balance",
+    "gaming": "gaming_balance",
+    "liquidity": "liquidity_pool",
+}
+
+# System accounts
+HOUSE = "system:house"          # Casino side of bets and liquidity rewards
+EXTERNAL = "system:external"    # Funds entering or leaving the platform
+OPENING = "system:opening"      # Counterpart of balances carried over into the ledger
+CONVERSION = "system:conversion"  # Other side of currency conversions
+
+# Liquidity reward credited on every lost bet, as a fraction of the stake
+LOSS_LIQUIDITY_RATE = 0.1
+
+class UnbalancedPosting(ValueError):
+    """Raised when a posting's legs don't net to zero in every currency"""
+
+def wallet_account(wallet_address: str, bucket: str) -> str:
+    if bucket not in BALANCE_BUCKETS:
+        raise ValueError(f"Unknown balance bucket {bucket}")
+    return f"wallet:{wallet_address}:{bucket}"
+
+def parse_account(account: str) -> Dict[str, Any]:
+    """wallet:<address>:<bucket> -> {wallet_address, bucket}; system accounts have neither"""
+    kind, _, rest = account.partition(":")
+    if kind != "wallet":
+        return {"wallet_address": None, "bucket": None}
+    wallet_address, _, bucket = rest.rpartition(":")
+    return {"wallet_address": wallet_address, "bucket": bucket}
+
+def leg(account: str, currency: str, amount: int) -> Dict[str, Any]:
+    return {"account": account, "currency": currency, "amount": amount}
+
+def check_balanced(legs: List[Dict[str, Any]]):
+    """Every leg must be a non-zero integer amount and each currency must net to zero"""
+    if len(legs) < 2:
+        raise UnbalancedPosting("A posting needs at least two legs")
+    totals: Dict[str, int] = defaultdict(int)
+    for posting_leg in legs:
+        amount = posting_leg["amount"]
+        if not isinstance(amount, int) or isinstance(amount, bool):
+            raise UnbalancedPosting(f"Leg on {posting_leg['account']} is not in integer minor units")
+        if not amount:
+            raise UnbalancedPosting(f"Zero amount leg on {posting_leg['account']}")
+        totals[posting_leg["currency"]] += amount
+    for currency, total in totals.items():
+        if total:
+            raise UnbalancedPosting(f"{currency} legs net to {total}, not zero")
+
+def net_by_account(legs: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, int]]:
+    """Collapse legs to account -> currency -> net amount"""
+    net: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for posting_leg in legs:
+        net[posting_leg["account"]][posting_leg["currency"]] += posting_leg["amount"]
+    return net
+
+def liquidity_reward(bet_units: int) -> int:
+    return round(bet_units * LOSS_LIQUIDITY_RATE)
+
+def bet_legs(wallet_address: str, currency: str, bet_amount: int, is_winner: bool,
+             payout: int) -> List[Dict[str, Any]]:
+    """
+    Stake leaves the deposit bucket; a win is paid into winnings by the house, a loss
+    moves the stake into savings and the house adds the liquidity reward
+    """
+    deposit = wallet_account(wallet_address, "deposit")
+    if is_winner:
+        legs = [leg(deposit, currency, -bet_amount), leg(HOUSE, currency, bet_amount)]
+        if payout:
+            legs += [leg(HOUSE, currency, -payout),
+                     leg(wallet_account(wallet_address, "winnings"), currency, payout)]
+        return legs
+
+    legs = [leg(deposit, currency, -bet_amount),
+            leg(wallet_account(wallet_address, "savings"), currency, bet_amount)]
+    reward = liquidity_reward(bet_amount)
+    if reward:
+        legs += [leg(HOUSE, currency, -reward),
+                 leg(wallet_account(wallet_address, "liquidity"), currency, reward)]
+    return legs
+
+def conversion_legs(wallet_address: str, from_currency: str, amount: int, to_currency: str,
+                    converted: int, liquidity: int) -> List[Dict[str, Any]]:
+    """Swap through the conversion account; the house funds the liquidity contribution"""
+    deposit = wallet_account(wallet_address, "deposit")
+    legs = [
+        leg(deposit, from_currency, -amount),
+        leg(CONVERSION, from_currency, amount),
+        leg(CONVERSION, to_currency, -converted),
+        leg(deposit, to_currency, converted),
+    ]
+    if liquidity:
+        legs += [leg(HOUSE, to_currency, -liquidity),
+                 leg(wallet_account(wallet_address, "liquidity"), to_currency, liquidity)]
+    return legs
+
+def deposit_legs(wallet_address: str, currency: str, amount: int) -> List[Dict[str, Any]]:
+    return [leg(EXTERNAL, currency, -amount), leg(wallet_account(wallet_address, "deposit"), currency, amount)]
+
+def opening_legs(wallet_address: str, user: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Carry a user's current balances into the ledger against the opening account"""
+    legs = []
+    for bucket, field in BALANCE_BUCKETS.items():
+        for currency, amount in (user.get(field) or {}).items():
+            # liquidity_pool also holds bookkeeping keys such as total_contributed
+            if not (currency.isupper() and isinstance(amount, (int, float))):
+                continue
+            units = to_minor(amount, currency)
+            if units:
+                legs.append(leg(wallet_account(wallet_address, bucket), currency, units))
+                legs.append(leg(OPENING, currency, -units))
+    return legs
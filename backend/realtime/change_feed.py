@@ -0,0 +1,106 @@
+"""
+Wallet Change Feed
+One MongoDB change stream over users, user_wallets and game_bets per process, routed
+by wallet address to the sync layer for wallets with sockets on this process, so
+clients get pushed deltas instead of polling
+"""
+
+import asyncio
+import logging
+from typing import Dict, Any, Callable, Awaitable, Optional, Set
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+WATCHED_COLLECTIONS = ["users", "user_wallets", "game_bets"]
+
+# Server error codes meaning change streams are unsupported (standalone server)
+CHANGE_STREAM_UNSUPPORTED = {40573, 40324}
+
+class WalletChangeFeed:
+    """
+    Watches wallet-related collections and hands each changed document to on_change()
+    Changes for wallets with no subscribers in this process are dropped, so each worker
+    runs its own stream and delivers only to its own sockets
+    """
+
+    def __init__(self, db, on_change: Callable[[str, Dict[str, Any]], Awaitable[None]]):
+        self.db = db
+        self.on_change = on_change  # (collection, full document)
+        self.subscribed: Set[str] = set()
+        self.available = False
+        self.changes_seen = 0
+        self.changes_delivered = 0
+        self._resume_token = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def subscribe(self, wallet_address: str):
+        self.subscribed.add(wallet_address)
+
+    def unsubscribe(self, wallet_address: str):
+        self.subscribed.discard(wallet_address)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "available": self.available,
+            "subscribed_wallets": len(self.subscribed),
+            "changes_seen": self.changes_seen,
+            "changes_delivered": self.changes_delivered
+        }
+
+    async def _run(self):
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": WATCHED_COLLECTIONS},
+            "operationType": {"$in": ["insert", "update", "replace"]}
+        }}]
+        backoff = 1.0
+
+        while True:
+            try:
+                async with self.db.watch(pipeline, full_document="updateLookup",
+                                         resume_after=self._resume_token) as stream:
+                    self.available = True
+                    backoff = 1.0
+                    logger.info("Wallet change stream started")
+                    async for change in stream:
+                        self._resume_token = stream.resume_token
+                        await self._handle(change)
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                self.available = False
+                if e.code in CHANGE_STREAM_UNSUPPORTED:
+                    logger.warning("Change streams need a replica set; wallet push disabled, clients fall back to refresh_wallet")
+                    return
+                # An expired resume token can't be resumed; start from now instead
+                logger.error(f"Wallet change stream failed: {e}")
+                self._resume_token = None
+            except PyMongoError as e:
+                self.available = False
+                logger.error(f"Wallet change stream interrupted: {e}")
+
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    async def _handle(self, change: Dict[str, Any]):
+        self.changes_seen += 1
+        document = change.get("fullDocument") or {}
+        wallet_address = document.get("wallet_address")
+        if not wallet_address or wallet_address not in self.subscribed:
+            return
+
+        try:
+            await self.on_change(change["ns"]["coll"], document)
+            self.changes_delivered += 1
+        except Exception as e:
+            logger.error(f"Wallet push to {wallet_address} failed: {e}")
@@ -0,0 +1,243 @@
+"""
+WebSocket Connection Manager
+Tracks sockets by wallet address with a bounded send queue and a dedicated sender per
+connection, so one slow client never stalls delivery to the others. Heartbeats evict
+idle sockets and Redis pub/sub routes messages to whichever worker holds a wallet's
+sockets
+"""
+
+import os
+import json
+import uuid
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Any, Optional, Set
+
+from services.json_response import dumps_text
+
+logger = logging.getLogger(__name__)
+
+WS_CHANNEL = "ws:wallet"
+RESYNC_REQUIRED = dumps_text({"type": "resync_required"})
+# How long one pub/sub read waits; an idle channel just returns None and reads again
+PUBSUB_POLL_SECONDS = 1.0
+
+class Connection:
+    """
+    One socket's outbound queue
+    Messages with a coalesce_key replace any queued message with the same key (only the
+    latest matters); when the queue overflows it is discarded and the client is told
+    to resync
+    """
+
+    def __init__(self, websocket, wallet_address: str, max_queue: int):
+        self.websocket = websocket
+        self.wallet_address = wallet_address
+        self.max_queue = max_queue
+        self.queue: deque = deque()  # (coalesce_key, payload)
+        self.ready = asyncio.Event()
+        self.last_seen = asyncio.get_running_loop().time()
+        self.dropped = 0
+        self.send_started: Optional[float] = None  # Loop time the in-progress send began
+        self.sender: Optional[asyncio.Task] = None
+
+    def enqueue(self, payload: str, coalesce_key: str = None):
+        if coalesce_key is not None:
+            for index, (key, _) in enumerate(self.queue):
+                if key == coalesce_key:
+                    self.queue[index] = (coalesce_key, payload)
+                    return
+
+        if len(self.queue) >= self.max_queue:
+            # Everything queued is stale by now; the client resyncs from a fresh snapshot
+            self.dropped += len(self.queue)
+            self.queue.clear()
+            self.queue.append(("resync_required", RESYNC_REQUIRED))
+
+        self.queue.append((coalesce_key, payload))
+        self.ready.set()
+
+    def touch(self):
+        self.last_seen = asyncio.get_running_loop().time()
+
+class ConnectionManager:
+    """Per-worker socket registry with backpressure, heartbeats and cross-worker fan-out"""
+
+    def __init__(self, max_queue: int = None, send_timeout: float = None,
+                 heartbeat_interval: float = None, idle_timeout: float = None):
+        self.max_queue = max_queue or int(os.getenv("WS_MAX_QUEUE", "100"))
+        self.send_timeout = send_timeout or float(os.getenv("WS_SEND_TIMEOUT", "5"))
+        self.heartbeat_interval = heartbeat_interval or float(os.getenv("WS_HEARTBEAT_INTERVAL", "25"))
+        self.idle_timeout = idle_timeout or float(os.getenv("WS_IDLE_TIMEOUT", "90"))
+        self.worker_id = uuid.uuid4().hex
+        self.redis = None
+
+        self.connections: Dict[str, Set[Connection]] = {}
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._pubsub_task: Optional[asyncio.Task] = None
+
+        self.messages_sent = 0
+        self.messages_dropped = 0
+        self.evicted = 0
+
+    @property
+    def connection_count(self) -> int:
+        return sum(len(connections) for connections in self.connections.values())
+
+    async def start(self, redis_client=None):
+        """Start heartbeats, plus the pub/sub listener when Redis is available"""
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        if redis_client is not None:
+            self.redis = redis_client
+            self._pubsub_task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        for task in (self._heartbeat_task, self._pubsub_task):
+            if task:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._heartbeat_task = self._pubsub_task = None
+        for connections in list(self.connections.values()):
+            for connection in list(connections):
+                await self._close(connection, code=1001)
+
+    def connect(self, websocket, wallet_address: str) -> Connection:
+        """Register an accepted socket and start its sender"""
+        connection = Connection(websocket, wallet_address, self.max_queue)
+        connection.sender = asyncio.create_task(self._send_loop(connection))
+        self.connections.setdefault(wallet_address, set()).add(connection)
+        return connection
+
+    def disconnect(self, connection: Connection):
+        """Unregister a socket; safe to call more than once"""
+        if connection.sender and connection.sender is not asyncio.current_task():
+            connection.sender.cancel()
+        self.messages_dropped += connection.dropped
+        connection.dropped = 0
+        connections = self.connections.get(connection.wallet_address)
+        if connections is None:
+            return
+        connections.discard(connection)
+        if not connections:
+            del self.connections[connection.wallet_address]
+
+    def send(self, connection: Connection, message: Dict[str, Any], coalesce_key: str = None):
+        """Queue a message for one socket"""
+        connection.enqueue(dumps_text(message), coalesce_key)
+
+    def send_local(self, wallet_address: str, message: Dict[str, Any], coalesce_key: str = None,
+                   exclude: Connection = None) -> int:
+        """Queue a message for this worker's sockets of a wallet; serialized once for all of them"""
+        connections = [connection for connection in self.connections.get(wallet_address, ())
+                       if connection is not exclude]
+        if not connections:
+            return 0
+        payload = dumps_text(message)
+        for connection in connections:
+            connection.enqueue(payload, coalesce_key)
+        return len(connections)
+
+    async def publish(self, wallet_address: str, message: Dict[str, Any], coalesce_key: str = None):
+        """Deliver to a wallet's sockets on every worker"""
+        self.send_local(wallet_address, message, coalesce_key)
+        if self.redis is None:
+            return
+        try:
+            await self.redis.publish(WS_CHANNEL, dumps_text({
+                "origin": self.worker_id,
+                "wallet": wallet_address,
+                "coalesce_key": coalesce_key,
+                "message": message
+            }))
+        except Exception as e:
+            logger.warning(f"WebSocket publish failed, delivered locally only: {e}")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "connections": self.connection_count,
+            "wallets": len(self.connections),
+            "queued": sum(len(connection.queue) for connections in self.connections.values()
+                          for connection in connections),
+            "messages_sent": self.messages_sent,
+            "messages_dropped": self.messages_dropped + sum(
+                connection.dropped for connections in self.connections.values() for connection in connections),
+            "evicted": self.evicted,
+            "cross_worker": self.redis is not None
+        }
+
+    async def _send_loop(self, connection: Connection):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                await connection.ready.wait()
+                connection.ready.clear()
+                while connection.queue:
+                    _, payload = connection.queue.popleft()
+                    connection.send_started = loop.time()
+                    await connection.websocket.send_text(payload)
+                    connection.send_started = None
+                    self.messages_sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"WebSocket send to {connection.wallet_address} failed: {e}")
+            await self._close(connection, code=1011)
+
+    async def _heartbeat(self):
+        """
+        Sweep every send_timeout: evict sockets stuck mid-send or idle too long, and queue
+        a ping once per heartbeat_interval
+        Stalled sends are caught here rather than with a timeout on every send, which
+        would cost a task per message
+        """
+        loop = asyncio.get_running_loop()
+        ping = dumps_text({"type": "ping"})
+        last_ping = loop.time()
+        while True:
+            await asyncio.sleep(min(self.send_timeout, self.heartbeat_interval))
+            now = loop.time()
+            send_ping = now - last_ping >= self.heartbeat_interval
+            if send_ping:
+                last_ping = now
+            for connections in list(self.connections.values()):
+                for connection in list(connections):
+                    stalled = connection.send_started is not None and now - connection.send_started > self.send_timeout
+                    if stalled or now - connection.last_seen > self.idle_timeout:
+                        self.evicted += 1
+                        await self._close(connection, code=1008 if stalled else 1001)
+                    elif send_ping:
+                        connection.enqueue(ping, coalesce_key="ping")
+
+    async def _close(self, connection: Connection, code: int):
+        self.disconnect(connection)
+        try:
+            await connection.websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def _listen(self):
+        backoff = 1.0
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(WS_CHANNEL)
+                backoff = 1.0
+                # Not listen(): it reads with the shared pool's 1s socket_timeout, so every idle
+                # second would raise TimeoutError and drop the subscription
+                while True:
+                    item = await pubsub.get_message(ignore_subscribe_messages=True, timeout=PUBSUB_POLL_SECONDS)
+                    if item is None or item.get("type") != "message":
+                        continue
+                    envelope = json.loads(item["data"])
+                    if envelope["origin"] == self.worker_id:
+                        continue
+                    self.send_local(envelope["wallet"], envelope["message"], envelope.get("coalesce_key"))
+            except asyncio.CancelledError:
+                await pubsub.aclose()
+                raise
+            except Exception as e:
+                logger.error(f"WebSocket pub/sub listener failed: {e}")
+                await pubsub.aclose()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
@@ -0,0 +1,142 @@
+"""
+Wallet Sync Protocol
+Versioned snapshot-plus-delta sync for wallet WebSockets. A client gets one full
+wallet_snapshot, then wallet_delta messages carrying only the changed paths. Each delta
+names the version it applies to, so a client that sees a gap asks for a resync instead
+of drifting
+
+    {"type": "wallet_snapshot", "wallet": ..., "version": 7, "data": {"user": {...}, "wallet": {...}}}
+    {"type": "wallet_delta", "wallet": ..., "base_version": 7, "version": 8,
+     "set": {"user.deposit_balance.CRT": 900.0}, "unset": []}
+
+Clients apply a delta when base_version equals their version, ignore it when version is
+not newer, and send {"type": "resync"} otherwise
+"""
+
+import logging
+from typing import Dict, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Only balance fields ever leave the server from the users collection
+SYNCED_USER_FIELDS = ["deposit_balance", "winnings_balance", "savings_balance", "liquidity_pool",
+                      "gaming_balance", "escrow_balance", "username"]
+
+PUSHED_BET_FIELDS = ["game_id", "game_type", "bet_amount", "currency", "result", "payout",
+                     "running_total", "timestamp"]
+
+def user_view(user: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: user[field] for field in SYNCED_USER_FIELDS if field in (user or {})}
+
+def wallet_view(wallet: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: value for field, value in (wallet or {}).items() if field != "_id"}
+
+def flatten(view: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """Nested dicts to dotted paths, so a single balance change is a single path"""
+    flat = {}
+    for key, value in view.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict) and value:
+            flat.update(flatten(value, f"{path}."))
+        else:
+            flat[path] = value
+    return flat
+
+class WalletSync:
+    """
+    Per-worker sync state for wallets with sockets on this worker
+    Versions count changes seen by this worker for a wallet; every socket for the wallet
+    on this worker shares the sequence, and a reconnect starts from a fresh snapshot
+    """
+
+    def __init__(self, db, connections):
+        self.db = db
+        self.connections = connections
+        self._state: Dict[str, Tuple[int, Dict[str, Any]]] = {}  # wallet -> (version, flattened view)
+
+        self.snapshots_sent = 0
+        self.deltas_sent = 0
+
+    async def send_snapshot(self, connection):
+        """Read the wallet fresh and send this socket a full snapshot"""
+        wallet_address = connection.wallet_address
+        user = await self.db.users.find_one({"wallet_address": wallet_address},
+                                            {field: 1 for field in SYNCED_USER_FIELDS})
+        wallet = await self.db.user_wallets.find_one({"wallet_address": wallet_address})
+        view = {"user": user_view(user), "wallet": wallet_view(wallet)}
+
+        # Other sockets on this worker may be behind the fresh read; bring them forward first
+        version = self._apply(wallet_address, view, exclude=connection)
+
+        self.connections.send(connection, {
+            "type": "wallet_snapshot",
+            "wallet": wallet_address,
+            "version": version,
+            "data": view
+        }, coalesce_key="wallet_snapshot")
+        self.snapshots_sent += 1
+
+    async def on_change(self, collection: str, document: Dict[str, Any]):
+        """Change-feed callback: turn a changed document into a delta or bet event"""
+        wallet_address = document["wallet_address"]
+
+        if collection == "game_bets":
+            self.connections.send_local(wallet_address, {
+                "type": "bet_settled",
+                "wallet": wallet_address,
+                "data": {field: document[field] for field in PUSHED_BET_FIELDS if field in document}
+            })
+            return
+
+        if wallet_address not in self._state:
+            return
+        _, current = self._state[wallet_address]
+        if collection == "users":
+            section, view = "user", user_view(document)
+        else:
+            section, view = "wallet", wallet_view(document)
+
+        # Replace one section and keep the other as last seen
+        merged = {path: value for path, value in current.items()
+                  if path != section and not path.startswith(f"{section}.")}
+        merged.update(flatten({section: view}))
+        self._apply_flat(wallet_address, merged)
+
+    def release(self, wallet_address: str):
+        """Forget a wallet once its last socket on this worker has gone"""
+        self._state.pop(wallet_address, None)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "tracked_wallets": len(self._state),
+            "snapshots_sent": self.snapshots_sent,
+            "deltas_sent": self.deltas_sent
+        }
+
+    def _apply(self, wallet_address: str, view: Dict[str, Any], exclude=None) -> int:
+        return self._apply_flat(wallet_address, flatten(view), exclude)
+
+    def _apply_flat(self, wallet_address: str, flat: Dict[str, Any], exclude=None) -> int:
+        """Store the new view and broadcast the delta from the previous one; returns the version"""
+        if wallet_address not in self._state:
+            self._state[wallet_address] = (1, flat)
+            return 1
+
+        version, previous = self._state[wallet_address]
+        changed = {path: value for path, value in flat.items()
+                   if path not in previous or previous[path] != value}
+        removed = [path for path in previous if path not in flat]
+        if not changed and not removed:
+            return version
+
+        self._state[wallet_address] = (version + 1, flat)
+        message = {
+            "type": "wallet_delta",
+            "wallet": wallet_address,
+            "base_version": version,
+            "version": version + 1,
+            "set": changed,
+            "unset": removed
+        }
+        self.deltas_sent += self.connections.send_local(wallet_address, message, exclude=exclude)
+        return version + 1
@@ -0,0 +1,157 @@
+"""
+Sharded Liquidity Pool
+The global liquidity pool split across N shard documents so concurrent internal
+withdrawals don't serialize on one document's write lock. Balances are integer minor
+units. A debit is a single guarded $inc on one shard ($gte in the filter), so the check
+and the debit are atomic and no interleaving can drive a shard negative
+
+    liquidity_pool_shards  {_id: shard index, balances: {currency: minor units}, legacy_migrated: [currency]}
+"""
+
+import os
+import time
+import random
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+SHARDS = "liquidity_pool_shards"
+LEGACY = "liquidity_pool"
+
+class ShardedLiquidityPool:
+    """
+    Debits try a random shard first, then the largest shards, and only then gather the
+    amount from several shards, refunding what was taken if the pool as a whole is short
+    """
+
+    def __init__(self, db, shards: int = None, total_ttl: float = None):
+        self.db = db
+        self.shards = shards or int(os.getenv("LIQUIDITY_POOL_SHARDS", "16"))
+        self.total_ttl = total_ttl if total_ttl is not None else float(os.getenv("LIQUIDITY_POOL_TOTAL_TTL", "2"))
+        self._totals: Dict[str, int] = {}
+        self._totals_at = 0.0
+
+        self.debits = 0
+        self.fallbacks = 0
+        self.split_debits = 0
+        self.rejected = 0
+
+    async def migrate_legacy(self) -> bool:
+        """
+        Spread the old single liquidity_pool document over the shards, once
+        Each shard records the currencies it has received, so a rerun after a crash (or a
+        concurrent start) credits only what is missing; the legacy document is marked
+        migrated only once every shard has its share
+        """
+        legacy = await self.db[LEGACY].find_one({"migrated_to_shards": {"$ne": True}})
+        if not legacy:
+            return False
+
+        from services.amounts import to_minor
+        for currency, amount in legacy.items():
+            if currency == "_id" or not isinstance(amount, (int, float)):
+                continue
+            units = to_minor(amount, currency)
+            share, remainder = divmod(units, self.shards)
+            for shard in range(self.shards):
+                portion = share + (remainder if shard == 0 else 0)
+                if portion:
+                    await self._credit_legacy_share(shard, currency, portion)
+        await self.db[LEGACY].update_one({"_id": legacy["_id"]}, {"$set": {"migrated_to_shards": True}})
+        logger.info(f"Migrated legacy liquidity pool into {self.shards} shards")
+        return True
+
+    async def credit(self, currency: str, units: int, shard: int = None):
+        shard = random.randrange(self.shards) if shard is None else shard
+        await self.db[SHARDS].update_one({"_id": shard}, {"$inc": {f"balances.{currency}": units}}, upsert=True)
+        self._adjust_cached(currency, units)
+
+    async def debit(self, currency: str, units: int) -> bool:
+        """Take units out of the pool atomically; False if the whole pool can't cover it"""
+        field = f"balances.{currency}"
+
+        if await self._debit_shard(random.randrange(self.shards), field, units):
+            self.debits += 1
+            self._adjust_cached(currency, -units)
+            return True
+
+        # The random shard was too small: try the others, largest first
+        self.fallbacks += 1
+        shard_balances = await self._shard_balances(currency)
+        for shard, balance in shard_balances:
+            if balance >= units and await self._debit_shard(shard, field, units):
+                self.debits += 1
+                self._adjust_cached(currency, -units)
+                return True
+
+        # No single shard is big enough: gather from several, all or nothing
+        taken: List[Tuple[int, int]] = []
+        remaining = units
+        for shard, balance in shard_balances:
+            take = min(balance, remaining)
+            if take > 0 and await self._debit_shard(shard, field, take):
+                taken.append((shard, take))
+                remaining -= take
+            if remaining == 0:
+                self.debits += 1
+                self.split_debits += 1
+                self._adjust_cached(currency, -units)
+                return True
+
+        for shard, take in taken:
+            await self.credit(currency, take, shard=shard)
+        self.rejected += 1
+        return False
+
+    async def total(self, currency: str, max_age: Optional[float] = None) -> int:
+        return (await self.totals(max_age)).get(currency, 0)
+
+    async def totals(self, max_age: Optional[float] = None) -> Dict[str, int]:
+        """Pool balance per currency, summed across shards; cached for up to total_ttl seconds"""
+        max_age = self.total_ttl if max_age is None else max_age
+        if time.monotonic() - self._totals_at > max_age:
+            totals: Dict[str, int] = {}
+            async for doc in self.db[SHARDS].find({}, {"balances": 1}):
+                for currency, units in doc.get("balances", {}).items():
+                    totals[currency] = totals.get(currency, 0) + units
+            self._totals, self._totals_at = totals, time.monotonic()
+        return dict(self._totals)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "shards": self.shards,
+            "debits": self.debits,
+            "fallbacks": self.fallbacks,
+            "split_debits": self.split_debits,
+            "rejected": self.rejected
+        }
+
+    async def _credit_legacy_share(self, shard: int, currency: str, units: int):
+        try:
+            result = await self.db[SHARDS].update_one(
+                {"_id": shard, "legacy_migrated": {"$ne": currency}},
+                {"$inc": {f"balances.{currency}": units}, "$addToSet": {"legacy_migrated": currency}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # The shard exists and already holds this currency's share, so the upsert hit its _id
+            return
+        if result.modified_count or result.upserted_id is not None:
+            self._adjust_cached(currency, units)
+
+    async def _debit_shard(self, shard: int, field: str, units: int) -> bool:
+        result = await self.db[SHARDS].update_one({"_id": shard, field: {"$gte": units}}, {"$inc": {field: -units}})
+        return result.modified_count == 1
+
+    async def _shard_balances(self, currency: str) -> List[Tuple[int, int]]:
+        field = f"balances.{currency}"
+        docs = await self.db[SHARDS].find({field: {"$gt": 0}}, {field: 1}).to_list(None)
+        balances = [(doc["_id"], doc["balances"][currency]) for doc in docs]
+        return sorted(balances, key=lambda item: item[1], reverse=True)
+
+    def _adjust_cached(self, currency: str, units: int):
+        if self._totals_at:
+            self._totals[currency] = self._totals.get(currency, 0) + units
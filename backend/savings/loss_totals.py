@@ -0,0 +1,67 @@
+"""
+Cumulative Loss Totals
+Per-wallet, per-currency running totals of lost bets, stored on the user document
+(users.loss_totals.<currency>) so each loss record can carry its running total
+"""
+
+from typing import Dict, Tuple, Iterable
+
+from pymongo import ReturnDocument
+
+from archive.bet_archive import bet_archive
+
+async def seed_loss_totals(db, pairs: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], float]:
+    """
+    Seed missing loss totals from existing loss records, hot and archived, once per (wallet, currency)
+    Returns the total each pair holds afterwards
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return {}
+
+    wallets = list({wallet for wallet, _ in pairs})
+    sums = await db.game_bets.aggregate([
+        {"$match": bet_archive.hot_query({"wallet_address": {"$in": wallets}, "result": "loss"})},
+        {"$group": {
+            "_id": {"wallet": "$wallet_address", "currency": "$currency"},
+            "total": {"$sum": "$bet_amount"}
+        }}
+    ]).to_list(None)
+    existing = await bet_archive.loss_totals(wallets) if bet_archive.horizon() else {}
+    for row in sums:
+        pair = (row["_id"]["wallet"], row["_id"]["currency"])
+        existing[pair] = existing.get(pair, 0) + row["total"]
+
+    seeded = {}
+    for wallet, currency in pairs:
+        total_field = f"loss_totals.{currency}"
+        # Only the first writer seeds; a concurrent seed of the same pair is a no-op
+        await db.users.update_one(
+            {"wallet_address": wallet, total_field: {"$exists": False}},
+            {"$set": {total_field: existing.get((wallet, currency), 0)}}
+        )
+        user = await db.users.find_one({"wallet_address": wallet}, {total_field: 1})
+        seeded[(wallet, currency)] = (user or {}).get("loss_totals", {}).get(currency, 0)
+    return seeded
+
+async def next_loss_running_total(db, wallet_address: str, currency: str, amount: float) -> float:
+    """Atomically add a loss to the wallet's cumulative loss total for a currency and return the new total"""
+    total_field = f"loss_totals.{currency}"
+
+    async def increment():
+        return await db.users.find_one_and_update(
+            {"wallet_address": wallet_address, total_field: {"$exists": True}},
+            {"$inc": {total_field: amount}},
+            projection={total_field: 1},
+            return_document=ReturnDocument.AFTER
+        )
+
+    updated = await increment()
+    if updated is None:
+        # First tracked loss in this currency: seed the total from existing loss records once
+        await seed_loss_totals(db, [(wallet_address, currency)])
+        updated = await increment()
+        if updated is None:
+            return amount
+
+    return updated["loss_totals"][currency]
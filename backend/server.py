@@ -1,19 +1,22 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Depends, WebSocket, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import uuid
 from datetime import datetime, timedelta
 import asyncio
 import json
+import csv
+import io
 from pycoingecko import CoinGeckoAPI
-import redis
-from passlib.context import CryptContext
 from savings.non_custodial_vault import non_custodial_vault
 from decimal import Decimal
 
@@ -24,29 +27,64 @@ load_dotenv(ROOT_DIR / '.env')
 from blockchain.solana_manager import SolanaManager, SPLTokenManager, CRTTokenManager
 from blockchain.tron_manager import TronManager, TronTransactionManager
 from blockchain.doge_manager import DogeManager, DogeTransactionManager
-from auth.wallet_auth import WalletAuthManager, get_authenticated_wallet, ChallengeRequest, VerifyRequest
+from auth.wallet_auth import (WalletAuthManager, get_authenticated_wallet, get_optional_wallet, ChallengeRequest,
+                              VerifyRequest, security, revoke_token, token_cache, revocation_list)
+from fastapi.security import HTTPAuthorizationCredentials
+from auth.challenge_store import RedisChallengeStore
 
 # Import CoinPayments service (after loading environment variables)
 from services.coinpayments_service import coinpayments_service
+from services.redis_service import redis_service
+from services.index_registry import ensure_indexes
+from services.password_hasher import password_hasher, PasswordOverloaded
+from services.json_response import FastJSONResponse, dumps_text
+from services.conditional_get import make_etag, etag_matches, etag_headers, not_modified
+from services.request_batcher import RequestBatcher
+from services.history_cursor import encode_history_cursor, decode_history_cursor
+from autoplay.scheduler import AutoplayScheduler
+from autoplay.partitions import PartitionLeaseManager, partition_for
+from autoplay.settlement import AutoplaySettlement
+from realtime.change_feed import WalletChangeFeed
+from realtime.connection_manager import ConnectionManager
+from realtime.wallet_sync import WalletSync
+from games.engine import resolve_bet
+from savings.loss_totals import next_loss_running_total
+from savings.liquidity_pool import ShardedLiquidityPool
+from archive.bet_archive import bet_archive
+from games.rollups import BetRollups
+from services.timeseries_layout import TIMESERIES_STREAMS, ensure_timeseries
+from services.write_behind import WriteBehindBuffer, WriteBehindOverloaded
+from ledger.journal import Ledger
+from ledger.checkpoints import LedgerCheckpoints
+from ledger.postings import bet_legs, conversion_legs, deposit_legs, liquidity_reward, wallet_account, BALANCE_BUCKETS
+from services.amounts import to_minor, to_float, balances_to_float
 
 # Initialize CoinGecko client for real-time prices
 cg = CoinGeckoAPI()
-try:
-    redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
-    redis_client.ping()  # Test connection
-    print("✅ Redis connected successfully")
-except Exception as e:
-    print(f"⚠️ Redis connection failed: {e}")
-    redis_client = None
 mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
-# Initialize password context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # Create the main app
-app = FastAPI(title="Casino Savings dApp API", version="1.0.0")
+app = FastAPI(title="Casino Savings dApp API", version="1.0.0", default_response_class=FastJSONResponse)
+
+@app.exception_handler(PasswordOverloaded)
+async def password_overloaded_handler(request: Request, exc: PasswordOverloaded):
+    """Shed login/register load instead of queueing bcrypt work without bound"""
+    return JSONResponse(
+        status_code=429,
+        content={"success": False, "message": "Too many concurrent password operations, please retry"},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(WriteBehindOverloaded)
+async def write_behind_overloaded_handler(request: Request, exc: WriteBehindOverloaded):
+    """The bet spool is full because MongoDB isn't taking batches; nothing was changed"""
+    return JSONResponse(
+        status_code=503,
+        content={"success": False, "message": "Bets are temporarily unavailable, please retry"},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -62,7 +100,23 @@ doge_tx_manager = DogeTransactionManager(doge_manager)
 auth_manager = WalletAuthManager()
 
 # Global state for WebSocket connections
-active_connections: Dict[str, List[WebSocket]] = {}
+connection_manager = ConnectionManager()
+
+# Double-entry ledger: journal with materialized balances, plus checkpoints for replay
+ledger = Ledger(db, client)
+ledger_checkpoints = LedgerCheckpoints(db)
+
+# Bet records are spooled locally and inserted in batches; balances stay synchronous
+bet_writer = WriteBehindBuffer(db, "game_bets")
+
+# Hourly bet totals per wallet, game and currency, kept current by bet settlement
+bet_rollups = BetRollups(db)
+
+# Global liquidity pool, sharded so internal withdrawals don't contend on one document
+liquidity_pool = ShardedLiquidityPool(db)
+
+# In-process dispatcher for POST /api/batch
+request_batcher = RequestBatcher(app)
 
 # Enhanced models for wallet system
 class UserWallet(BaseModel):
@@ -154,6 +208,14 @@ class BetRequest(BaseModel):
     currency: str
     network: str
 
+class BatchSubRequest(BaseModel):
+    method: str = "GET"
+    path: str  # Including any query string, e.g. /api/crypto/prices?currencies=CRT
+    body: Optional[Any] = None
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest]
+
 # Basic routes
 @api_router.get("/")
 async def root():
@@ -196,12 +258,31 @@ async def health_check():
         "timestamp": datetime.utcnow().isoformat()
     }
 
+@api_router.get("/metrics")
+async def get_metrics():
+    """Process-local runtime metrics for this worker"""
+    return {
+        "password_hashing": password_hasher.metrics(),
+        "token_cache": {**token_cache.stats(), "revoked_tokens": len(revocation_list)},
+        "websockets": connection_manager.status(),
+        "wallet_sync": wallet_sync.status(),
+        "change_feed": wallet_change_feed.status(),
+        "autoplay_scheduler": autoplay_scheduler.status(),
+        "request_batching": request_batcher.status(),
+        "ledger": ledger.status(),
+        "liquidity_pool": liquidity_pool.status(),
+        "bet_archive": bet_archive.status(),
+        "bet_rollups": bet_rollups.status(),
+        "bet_write_buffer": bet_writer.status(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
 # Authentication endpoints
 @api_router.post("/auth/challenge")
 async def generate_auth_challenge(request: ChallengeRequest):
     """Generate authentication challenge for wallet connection"""
     try:
-        challenge_data = auth_manager.generate_challenge(request.wallet_address)
+        challenge_data = await auth_manager.generate_challenge(request.wallet_address)
         return {
             "success": True,
             "challenge": challenge_data["challenge"],
@@ -218,7 +299,7 @@ async def verify_wallet_connection(request: VerifyRequest):
         raise HTTPException(status_code=400, detail="Missing required fields")
     
     # Verify signature
-    if not auth_manager.verify_wallet_signature(request.challenge_hash, request.signature, request.wallet_address):
+    if not await auth_manager.verify_wallet_signature(request.challenge_hash, request.signature, request.wallet_address):
         raise HTTPException(status_code=401, detail="Invalid signature")
     
     # Generate JWT token
@@ -232,6 +313,13 @@ async def verify_wallet_connection(request: VerifyRequest):
         "expires_in": 86400  # 24 hours
     }
 
+@api_router.post("/auth/logout")
+async def logout(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Revoke the presented token on every worker until it would have expired"""
+    if not await revoke_token(credentials.credentials):
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    return {"success": True, "message": "Logged out"}
+
 # Real blockchain balance endpoints (new endpoints for real blockchain integration)
 @api_router.get("/wallet/balance/{currency}")
 async def get_real_balance(currency: str, wallet_address: str):
@@ -418,109 +506,125 @@ async def simulate_crt_deposit(request: Dict[str, Any]):
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+# User fields the polled read endpoints are built from; their ETags digest exactly these
+WALLET_VIEW_PROJECTION = {"_id": 0, "user_id": 1, "wallet_address": 1, "created_at": 1, "deposit_balance": 1,
+                          "winnings_balance": 1, "gaming_balance": 1, "liquidity_pool": 1, "savings_balance": 1}
+ESCROW_VIEW_PROJECTION = {"_id": 0, "escrow_balance": 1, "real_token_backing": 1, "escrow_status": 1}
+
+async def _wallet_view(user: Dict[str, Any]) -> Dict[str, Any]:
+    """Hybrid chain/database balances for a user document read with WALLET_VIEW_PROJECTION"""
+    wallet_address = user["wallet_address"]
+    
+    # Get REAL blockchain balances instead of fake database balances
+    real_balances = {
+        "CRT": 0.0,
+        "DOGE": 0.0, 
+        "TRX": 0.0,
+        "SOL": 0.0,
+        "USDC": 0.0  # Added USDC support for conversions
+    }
+    
+    # Get real CRT balance
+    try:
+        crt_balance = await crt_manager.get_crt_balance(wallet_address)
+        if crt_balance.get("success"):
+            real_balances["CRT"] = crt_balance.get("crt_balance", 0.0)
+    except Exception as e:
+        print(f"Error getting CRT balance: {e}")
+    
+    # Get real DOGE balance
+    try:
+        doge_balance = await doge_manager.get_balance(wallet_address)
+        if doge_balance.get("success"):
+            real_balances["DOGE"] = doge_balance.get("balance", 0.0)
+    except Exception as e:
+        print(f"Error getting DOGE balance: {e}")
+    
+    # Get real TRX balance
+    try:
+        trx_balance = await tron_tx_manager.get_trx_balance(wallet_address)
+        if trx_balance.get("success"):
+            real_balances["TRX"] = trx_balance.get("balance", 0.0)
+    except Exception as e:
+        print(f"Error getting TRX balance: {e}")
+    
+    # Get real SOL balance
+    try:
+        sol_balance = await solana_manager.get_balance(wallet_address)
+        if sol_balance.get("success"):
+            real_balances["SOL"] = sol_balance.get("balance", 0.0)
+    except Exception as e:
+        print(f"Error getting SOL balance: {e}")
+    
+    # Keep database savings balance (this should remain as internal tracking)
+    savings_balance = user.get("savings_balance", {"CRT": 0, "DOGE": 0, "TRX": 0, "USDC": 0})
+    
+    # Get database deposit balances for converted currencies
+    deposit_balances = user.get("deposit_balance", {"CRT": 0, "DOGE": 0, "TRX": 0, "USDC": 0})
+    
+    # For converted currencies, prioritize database balance over blockchain API
+    # This is because user conversions create database balances, not necessarily real blockchain transfers
+    
+    # Use database balances for all converted currencies
+    for currency in ["USDC", "DOGE", "TRX"]:
+        if deposit_balances.get(currency, 0) > 0:
+            real_balances[currency] = deposit_balances.get(currency, 0)
+    
+    # For CRT, check if user has done conversions - if so, use database balance
+    # Otherwise use blockchain balance for users who haven't converted
+    if deposit_balances.get("CRT", 0) > 0 and deposit_balances.get("CRT", 0) != real_balances.get("CRT", 0):
+        # User has done conversions - use database balance which reflects conversions
+        real_balances["CRT"] = deposit_balances.get("CRT", 0)
+    elif real_balances.get("CRT", 0) > 0:
+        # User has not converted - use blockchain balance
+        pass  # real_balances["CRT"] already contains the blockchain balance
+    else:
+        # Fallback to database
+        real_balances["CRT"] = deposit_balances.get("CRT", 0)
+    
+    user_data = {
+        "user_id": user["user_id"],
+        "wallet_address": user["wallet_address"],
+        # REAL blockchain balances for deposit and winnings
+        "deposit_balance": real_balances,
+        "winnings_balance": user.get("winnings_balance", {"CRT": 0, "DOGE": 0, "TRX": 0, "USDC": 0}),
+        "gaming_balance": user.get("gaming_balance", {"CRT": 0, "DOGE": 0, "TRX": 0, "USDC": 0}),
+        "liquidity_pool": user.get("liquidity_pool", {"CRT": 0, "DOGE": 0, "TRX": 0, "USDC": 0}),
+        # Keep savings as internal database tracking
+        "savings_balance": savings_balance,
+        "created_at": user["created_at"].isoformat() if "created_at" in user else None,
+        "balance_source": "hybrid_blockchain_database",
+        "last_balance_update": datetime.utcnow().isoformat(),
+        "balance_notes": {
+            "CRT": "Real blockchain + converted amounts",
+            "USDC": "Converted currency (database tracked)",
+            "DOGE": "Converted currency (database tracked)", 
+            "TRX": "Converted currency (database tracked)",
+            "SOL": "Real blockchain balance"
+        }
+    }
+    
+    return user_data
+
 @app.get("/api/wallet/{wallet_address}")
-async def get_wallet_info(wallet_address: str):
+async def get_wallet_info(wallet_address: str, request: Request):
     """Get wallet balance information for a user - REAL BLOCKCHAIN BALANCES ONLY"""
     try:
         # Find user by wallet address
-        user = await db.users.find_one({"wallet_address": wallet_address})
+        user = await db.users.find_one({"wallet_address": wallet_address}, WALLET_VIEW_PROJECTION)
         
         if not user:
             return {"success": False, "message": "Wallet not found"}
         
-        # Get REAL blockchain balances instead of fake database balances
-        real_balances = {
-            "CRT": 0.0,
-            "DOGE": 0.0, 
-            "TRX": 0.0,
-            "SOL": 0.0,
-            "USDC": 0.0  # Added USDC support for conversions
-        }
-        
-        # Get real CRT balance
-        try:
-            crt_balance = await crt_manager.get_crt_balance(wallet_address)
-            if crt_balance.get("success"):
-                real_balances["CRT"] = crt_balance.get("crt_balance", 0.0)
-        except Exception as e:
-            print(f"Error getting CRT balance: {e}")
-        
-        # Get real DOGE balance
-        try:
-            doge_balance = await doge_manager.get_balance(wallet_address)
-            if doge_balance.get("success"):
-                real_balances["DOGE"] = doge_balance.get("balance", 0.0)
-        except Exception as e:
-            print(f"Error getting DOGE balance: {e}")
-        
-        # Get real TRX balance
-        try:
-            trx_balance = await tron_tx_manager.get_trx_balance(wallet_address)
-            if trx_balance.get("success"):
-                real_balances["TRX"] = trx_balance.get("balance", 0.0)
-        except Exception as e:
-            print(f"Error getting TRX balance: {e}")
+        # Same balances within the same chain epoch: answer 304 before any chain lookup
+        etag = make_etag("wallet", user, include_chain=True)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return not_modified(etag)
         
-        # Get real SOL balance
-        try:
-            sol_balance = await solana_manager.get_balance(wallet_address)
-            if sol_balance.get("success"):
-                real_balances["SOL"] = sol_balance.get("balance", 0.0)
-        except Exception as e:
-            print(f"Error getting SOL balance: {e}")
-        
-        # Keep database savings balance (this should remain as internal tracking)
-        savings_balance = user.get("savings_balance", {"CRT": 0, "DOGE": 0, "TRX": 0, "USDC": 0})
-        
-        # Get database deposit balances for converted currencies
-        deposit_balances = user.get("deposit_balance", {"CRT": 0, "DOGE": 0, "TRX": 0, "USDC": 0})
-        
-        # For converted currencies, prioritize database balance over blockchain API
-        # This is because user conversions create database balances, not necessarily real blockchain transfers
-        
-        # Use database balances for all converted currencies
-        for currency in ["USDC", "DOGE", "TRX"]:
-            if deposit_balances.get(currency, 0) > 0:
-                real_balances[currency] = deposit_balances.get(currency, 0)
-        
-        # For CRT, check if user has done conversions - if so, use database balance
-        # Otherwise use blockchain balance for users who haven't converted
-        if deposit_balances.get("CRT", 0) > 0 and deposit_balances.get("CRT", 0) != real_balances.get("CRT", 0):
-            # User has done conversions - use database balance which reflects conversions
-            real_balances["CRT"] = deposit_balances.get("CRT", 0)
-        elif real_balances.get("CRT", 0) > 0:
-            # User has not converted - use blockchain balance
-            pass  # real_balances["CRT"] already contains the blockchain balance
-        else:
-            # Fallback to database
-            real_balances["CRT"] = deposit_balances.get("CRT", 0)
-        
-        user_data = {
-            "user_id": user["user_id"],
-            "wallet_address": user["wallet_address"],
-            # REAL blockchain balances for deposit and winnings
-            "deposit_balance": real_balances,
-            "winnings_balance": user.get("winnings_balance", {"CRT": 0, "DOGE": 0, "TRX": 0, "USDC": 0}),
-            "gaming_balance": user.get("gaming_balance", {"CRT": 0, "DOGE": 0, "TRX": 0, "USDC": 0}),
-            "liquidity_pool": user.get("liquidity_pool", {"CRT": 0, "DOGE": 0, "TRX": 0, "USDC": 0}),
-            # Keep savings as internal database tracking
-            "savings_balance": savings_balance,
-            "created_at": user["created_at"].isoformat() if "created_at" in user else None,
-            "balance_source": "hybrid_blockchain_database",
-            "last_balance_update": datetime.utcnow().isoformat(),
-            "balance_notes": {
-                "CRT": "Real blockchain + converted amounts",
-                "USDC": "Converted currency (database tracked)",
-                "DOGE": "Converted currency (database tracked)", 
-                "TRX": "Converted currency (database tracked)",
-                "SOL": "Real blockchain balance"
-            }
-        }
-        
-        return {
+        return FastJSONResponse({
             "success": True,
-            "wallet": user_data
-        }
+            "wallet": await _wallet_view(user)
+        }, headers=etag_headers(etag))
         
     except Exception as e:
         print(f"Error in get_wallet_info: {e}")
@@ -605,11 +709,13 @@ async def withdraw_funds(request: WithdrawRequest):
             }
         
         # Check liquidity constraints for internal withdrawals (no destination address)
+        # The total is a cached sum of the shards; the debit below is what actually guards the pool
+        pool_debit_units = 0
         if not destination_address:
-            liquidity_pool = await db.liquidity_pool.find_one() or {}
-            available_liquidity = liquidity_pool.get(currency, 0)
+            available_liquidity = to_float(await liquidity_pool.total(currency), currency)
             
-            if amount > available_liquidity:
+            if amount > available_liquidity or not await liquidity_pool.debit(currency, to_minor(amount, currency)):
+                available_liquidity = to_float(await liquidity_pool.total(currency, max_age=0), currency)
                 max_withdrawal = min(current_balance, available_liquidity)
                 return {
                     "success": False,
@@ -617,6 +723,7 @@ async def withdraw_funds(request: WithdrawRequest):
                     "max_withdrawal": max_withdrawal,
                     "available_liquidity": available_liquidity
                 }
+            pool_debit_units = to_minor(amount, currency)
         
         # REAL BLOCKCHAIN WITHDRAWAL IMPLEMENTATION
         blockchain_result = None
@@ -710,21 +817,6 @@ async def withdraw_funds(request: WithdrawRequest):
         # Update user balance only AFTER successful blockchain transaction
         new_balance = current_balance - amount
         balance_field = f"{wallet_type}_balance.{currency}"
-        
-        await db.users.update_one(
-            {"wallet_address": wallet_address},
-            {"$set": {balance_field: new_balance}}
-        )
-        
-        # Update liquidity pool for internal withdrawals
-        if not destination_address:
-            await db.liquidity_pool.update_one(
-                {},
-                {"$inc": {currency: -amount}},
-                upsert=True
-            )
-        
-        # Record transaction with real blockchain info
         transaction_id = str(uuid.uuid4())
         transaction = {
             "transaction_id": transaction_id,
@@ -740,8 +832,25 @@ async def withdraw_funds(request: WithdrawRequest):
             "timestamp": datetime.utcnow(),
             "verification_url": verification_url if destination_address else None
         }
+        balance_updated = False
         
-        await db.transactions.insert_one(transaction)
+        try:
+            await db.users.update_one(
+                {"wallet_address": wallet_address},
+                {"$set": {balance_field: new_balance}}
+            )
+            balance_updated = True
+            
+            # Record transaction with real blockchain info
+            await db.transactions.insert_one(transaction)
+        except Exception:
+            # An internal withdrawal that wasn't recorded never happened: return the pool's
+            # liquidity and the user's balance
+            if pool_debit_units:
+                await liquidity_pool.credit(currency, pool_debit_units)
+                if balance_updated:
+                    await db.users.update_one({"wallet_address": wallet_address}, {"$inc": {balance_field: amount}})
+            raise
         
         # Return success with real blockchain confirmation
         response = {
@@ -801,13 +910,16 @@ async def convert_currency(request: ConvertRequest):
             return {"success": False, "message": "Conversion not supported"}
         
         rate = conversion_rates[rate_key]
-        converted_amount = request.amount * rate
+        # Exact arithmetic in minor units; floats only for the stored fields and the response
+        amount_units = to_minor(request.amount, request.from_currency)
+        converted_units = to_minor(Decimal(str(request.amount)) * Decimal(str(rate)), request.to_currency)
+        converted_amount = to_float(converted_units, request.to_currency)
         
         # Check deposit wallet balance for from_currency
         deposit_balance = user.get("deposit_balance", {})
         current_from_balance = deposit_balance.get(request.from_currency, 0)
         
-        if current_from_balance < request.amount:
+        if to_minor(current_from_balance, request.from_currency) < amount_units:
             return {"success": False, "message": "Insufficient balance"}
         
         # ALWAYS ALLOW CONVERSION - No liquidity restrictions for building up coins
@@ -860,9 +972,11 @@ async def convert_currency(request: ConvertRequest):
                 real_doge_created = False
         
         # Update balances (database tracking + real tokens for DOGE)
-        new_from_balance = current_from_balance - request.amount
+        new_from_balance = to_float(to_minor(current_from_balance, request.from_currency) - amount_units,
+                                    request.from_currency)
         current_to_balance = deposit_balance.get(request.to_currency, 0)
-        new_to_balance = current_to_balance + converted_amount
+        new_to_balance = to_float(to_minor(current_to_balance, request.to_currency) + converted_units,
+                                  request.to_currency)
         
         await db.users.update_one(
             {"wallet_address": request.wallet_address},
@@ -873,9 +987,11 @@ async def convert_currency(request: ConvertRequest):
         )
         
         # Add 10% of converted amount to liquidity pool (changed from 50% per user request)
-        liquidity_contribution = converted_amount * 0.1  # 10% to liquidity pool
+        liquidity_units = converted_units // 10  # 10% to liquidity pool
+        liquidity_contribution = to_float(liquidity_units, request.to_currency)
         current_liquidity = user.get("liquidity_pool", {"CRT": 0, "DOGE": 0, "TRX": 0, "USDC": 0})
-        new_liquidity = current_liquidity.get(request.to_currency, 0) + liquidity_contribution
+        new_liquidity = to_float(to_minor(current_liquidity.get(request.to_currency, 0), request.to_currency)
+                                 + liquidity_units, request.to_currency)
         
         await db.users.update_one(
             {"wallet_address": request.wallet_address},
@@ -891,6 +1007,8 @@ async def convert_currency(request: ConvertRequest):
             "to_currency": request.to_currency,
             "amount": request.amount,
             "converted_amount": converted_amount,
+            "amount_minor": amount_units,
+            "converted_amount_minor": converted_units,
             "rate": rate,
             "liquidity_contributed": liquidity_contribution,
             "timestamp": datetime.now(),
@@ -899,6 +1017,16 @@ async def convert_currency(request: ConvertRequest):
         
         await db.transactions.insert_one(transaction)
         
+        try:
+            await ledger.post_or_defer([{
+                "kind": "conversion", "wallet_address": request.wallet_address,
+                "reference": transaction["transaction_id"],
+                "legs": conversion_legs(request.wallet_address, request.from_currency, amount_units,
+                                        request.to_currency, converted_units, liquidity_units)
+            }])
+        except Exception as e:
+            logger.error(f"Ledger posting and deferral failed for conversion {transaction['transaction_id']}: {e}")
+        
         return {
             "success": True,
             "message": f"Converted {request.amount} {request.from_currency} to {converted_amount:.4f} {request.to_currency}",
@@ -1189,43 +1317,16 @@ async def place_bet(bet: GameBet):
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        # Generate unique game ID
-        game_id = f"game_{uuid.uuid4().hex[:8]}"
+        # Fail fast while the bet spool is full, before any balance or total changes
+        await bet_writer.wait_for_capacity()
         
-        # Real game logic with proper randomness
-        import random
-        
-        # Different win rates for different games
-        game_win_rates = {
-            "Slot Machine": 0.15,    # 15% win rate
-            "Roulette": 0.47,        # ~47% win rate (red/black)
-            "Dice": 0.49,            # ~49% win rate
-            "Plinko": 0.20,          # 20% win rate for big multipliers
-            "Keno": 0.25,            # 25% win rate
-            "Mines": 0.30            # 30% win rate
-        }
+        # Generate unique game ID (full width: it is the bet's ledger reference)
+        game_id = f"game_{uuid.uuid4().hex}"
         
-        win_rate = game_win_rates.get(bet.game_type, 0.25)
-        is_winner = random.random() < win_rate
-        
-        # Calculate payout based on game type
-        if is_winner:
-            if bet.game_type == "Slot Machine":
-                payout = bet.bet_amount * random.choice([2, 3, 5, 10, 25])  # Variable multipliers
-            elif bet.game_type == "Roulette":
-                payout = bet.bet_amount * 2  # Even money bets
-            elif bet.game_type == "Dice":
-                payout = bet.bet_amount * random.uniform(1.5, 10)  # Based on prediction
-            elif bet.game_type == "Plinko":
-                payout = bet.bet_amount * random.choice([1.5, 2, 4, 9, 26, 130, 1000])
-            elif bet.game_type == "Keno":
-                payout = bet.bet_amount * random.choice([3, 12, 42, 108, 810])
-            elif bet.game_type == "Mines":
-                payout = bet.bet_amount * random.uniform(2, 50)
-            else:
-                payout = bet.bet_amount * 2
-        else:
-            payout = 0
+        # Real game logic with proper randomness
+        is_winner, payout = resolve_bet(bet.game_type, bet.bet_amount)
+        bet_units = to_minor(bet.bet_amount, bet.currency)
+        payout_units = to_minor(payout, bet.currency)
         
         # Store real bet record
         bet_record = {
@@ -1233,59 +1334,54 @@ async def place_bet(bet: GameBet):
             "game_id": game_id,
             "result": "win" if is_winner else "loss",
             "payout": payout,
+            "bet_amount_minor": bet_units,
+            "payout_minor": payout_units,
             "status": "completed",
             "timestamp": datetime.utcnow()
         }
         
-        # Insert bet record into database
-        await db.game_bets.insert_one(bet_record)
+        # One atomic $inc for every balance the bet touches, guarded so the deposit covers the
+        # whole bet: a win credits winnings, a loss credits savings and 10% of it to the
+        # liquidity pool. Amounts come from the same minor units as the ledger legs
+        deposit_field = f"deposit_balance.{bet.currency}"
+        balance_incs = {deposit_field: -to_float(bet_units, bet.currency)}
+        if is_winner and payout_units > 0:
+            balance_incs[f"winnings_balance.{bet.currency}"] = to_float(payout_units, bet.currency)
+        elif not is_winner:
+            balance_incs[f"savings_balance.{bet.currency}"] = to_float(bet_units, bet.currency)
+            balance_incs[f"liquidity_pool.{bet.currency}"] = to_float(liquidity_reward(bet_units), bet.currency)
+        result = await db.users.update_one(
+            {"wallet_address": bet.wallet_address, deposit_field: {"$gte": to_float(bet_units, bet.currency)}},
+            {"$inc": balance_incs}
+        )
+        if result.matched_count == 0:
+            return {
+                "success": False,
+                "message": f"Insufficient {bet.currency} deposit balance for this bet",
+                "current_balance": user.get("deposit_balance", {}).get(bet.currency, 0)
+            }
         
-        # CRUCIAL FIX: Actually update user's savings balance for losses
-        if not is_winner:  # If it's a loss
-            # Add the lost bet amount to user's savings balance
-            user = await db.users.find_one({"wallet_address": bet.wallet_address})
-            if user:
-                current_savings = user.get("savings_balance", {}).get(bet.currency, 0)
-                new_savings = current_savings + bet.bet_amount
-                
-                await db.users.update_one(
-                    {"wallet_address": bet.wallet_address},
-                    {"$set": {f"savings_balance.{bet.currency}": new_savings}}
-                )
-                
-                # Also add 10% of the lost amount to liquidity pool
-                liquidity_contribution = bet.bet_amount * 0.1
-                current_liquidity = user.get("liquidity_pool", {}).get(bet.currency, 0)
-                new_liquidity = current_liquidity + liquidity_contribution
-                
-                await db.users.update_one(
-                    {"wallet_address": bet.wallet_address},
-                    {"$set": {f"liquidity_pool.{bet.currency}": new_liquidity}}
-                )
+        # Losses carry the cumulative per-currency savings total so history pages need no replay
+        if not is_winner:
+            bet_record["running_total"] = await next_loss_running_total(db, bet.wallet_address, bet.currency, bet.bet_amount)
         
-        # Update user's deposit balance (deduct the bet amount)
-        user = await db.users.find_one({"wallet_address": bet.wallet_address})
-        if user:
-            current_deposit = user.get("deposit_balance", {}).get(bet.currency, 0)
-            new_deposit = max(0, current_deposit - bet.bet_amount)  # Don't go negative
-            
-            # If winning, add payout to winnings balance
-            if is_winner and payout > 0:
-                current_winnings = user.get("winnings_balance", {}).get(bet.currency, 0)
-                new_winnings = current_winnings + payout
-                
-                await db.users.update_one(
-                    {"wallet_address": bet.wallet_address},
-                    {"$set": {
-                        f"deposit_balance.{bet.currency}": new_deposit,
-                        f"winnings_balance.{bet.currency}": new_winnings
-                    }}
-                )
-            else:
-                await db.users.update_one(
-                    {"wallet_address": bet.wallet_address},
-                    {"$set": {f"deposit_balance.{bet.currency}": new_deposit}}
-                )
+        # Spool the bet record; it reaches game_bets with the next batch. Capacity was checked
+        # up front, and the balances have changed, so this must not fail on back-pressure
+        await bet_writer.add(bet_record, wait=False)
+        
+        # The balances reflect the bet, so the journal may record it
+        try:
+            await ledger.post_or_defer([{
+                "kind": "bet", "wallet_address": bet.wallet_address, "reference": game_id,
+                "legs": bet_legs(bet.wallet_address, bet.currency, bet_units, is_winner, payout_units)
+            }])
+        except Exception as e:
+            logger.error(f"Ledger posting and deferral failed for {game_id}: {e}")
+        
+        try:
+            await bet_rollups.record([bet_record])
+        except Exception as e:
+            logger.error(f"Bet rollup update failed for {game_id}: {e}")
         
         # Handle losses - transfer to NON-CUSTODIAL savings vault instead of database
         savings_contribution = bet.bet_amount if not is_winner else 0
@@ -1300,19 +1396,11 @@ async def place_bet(bet: GameBet):
                 bet_id=game_id
             )
             
-            # Also update database as backup record (but real tokens are in vault)
-            if savings_vault_result.get("success"):
-                current_savings = user.get("savings_balance", {}).get(bet.currency, 0)
-                new_savings = current_savings + savings_contribution
-                
-                await db.users.update_one(
-                    {"wallet_address": bet.wallet_address},
-                    {"$set": {f"savings_balance.{bet.currency}": new_savings}}
-                )
+            # savings_balance already holds the database record of this loss
         
         liquidity_added = savings_contribution * 0.1 if not is_winner else 0
         
-        return {
+        return FastJSONResponse({
             "success": True,
             "game_id": game_id,
             "bet_amount": bet.bet_amount,
@@ -1331,35 +1419,293 @@ async def place_bet(bet: GameBet):
                 "user_controlled": True
             },
             "message": f"Game processed. Savings: {'✅ Transferred to secure vault' if savings_vault_result.get('success') else '⚠️ Saved in database'}"
-        }
+        })
         
+    except WriteBehindOverloaded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Fields returned by history pages and exports
+HISTORY_FIELDS = ["game_id", "game_type", "bet_amount", "currency", "network", "result", "payout", "status", "timestamp"]
+HISTORY_SORT = [("timestamp", -1), ("_id", -1)]
+
+def _decode_history_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    try:
+        return decode_history_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _history_query(wallet_address: str, position: Optional[Tuple[datetime, ObjectId]] = None) -> Dict[str, Any]:
+    """Build the hot-tier game_bets filter for a wallet, continuing after the cursor position when given"""
+    query: Dict[str, Any] = {"wallet_address": wallet_address}
+    if position:
+        timestamp, last_id = position
+        query["$or"] = [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": last_id}}
+        ]
+    return bet_archive.hot_query(query)
+
+def _history_row(game: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten a projected bet document for export"""
+    row = {"_id": str(game["_id"])}
+    for field in HISTORY_FIELDS:
+        value = game.get(field)
+        row[field] = value.isoformat() if isinstance(value, datetime) else value
+    return row
+
+@api_router.get("/ledger/{wallet_address}")
+async def get_ledger_balances(
+    wallet_address: str,
+    at_seq: Optional[int] = None,
+    wallet_info: Dict = Depends(get_authenticated_wallet)
+):
+    """Ledger balances for a wallet: materialized now, or as of a ledger sequence number"""
+    if wallet_address != wallet_info["wallet_address"]:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    
+    if at_seq is None:
+        current = await ledger.wallet_balances(wallet_address)
+        balances, seq = current["balances"], current["seq"]
+    else:
+        balances, seq = {}, at_seq
+        for bucket in BALANCE_BUCKETS:
+            amounts = await ledger_checkpoints.balance_at(wallet_account(wallet_address, bucket), at_seq)
+            if amounts:
+                balances[bucket] = amounts
+    
+    # Stored in minor units; the API speaks decimal amounts
+    return {
+        "success": True,
+        "wallet_address": wallet_address,
+        "balances": {bucket: balances_to_float(amounts) for bucket, amounts in balances.items()},
+        "seq": seq
+    }
+
 @api_router.get("/games/history/{wallet_address}")
-async def get_game_history(wallet_address: str, wallet_info: Dict = Depends(get_authenticated_wallet)):
-    """Get game history for wallet"""
+async def get_game_history(
+    wallet_address: str,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    wallet_info: Dict = Depends(get_authenticated_wallet)
+):
+    """Get game history for wallet, newest first, using keyset (timestamp, _id) pagination"""
     try:
         if wallet_address != wallet_info["wallet_address"]:
             raise HTTPException(status_code=403, detail="Unauthorized")
         
-        # Get game history from database
-        game_history = await db.game_bets.find({"wallet_address": wallet_address}).to_list(100)
+        limit = max(1, min(limit, 500))
+        position = _decode_history_cursor(cursor) if cursor else None
+        
+        # Fetch one extra document to know whether another page exists
+        game_history = await db.game_bets.find(
+            _history_query(wallet_address, position),
+            {field: 1 for field in HISTORY_FIELDS}
+        ).sort(HISTORY_SORT).limit(limit + 1).to_list(limit + 1)
+        
+        # Older bets live in the Parquet archive; every archived bet sorts after every hot one
+        horizon = bet_archive.horizon()
+        if len(game_history) <= limit and horizon:
+            before = (position[0], str(position[1])) if position and position[0] < horizon else None
+            game_history += await bet_archive.history(
+                wallet_address, limit + 1 - len(game_history), HISTORY_FIELDS, before
+            )
         
-        # Convert ObjectId to string for JSON serialization
-        for game in game_history:
-            game["_id"] = str(game["_id"])
+        has_more = len(game_history) > limit
+        game_history = game_history[:limit]
+        next_cursor = encode_history_cursor(game_history[-1]) if has_more else None
         
-        return {
+        # Rendered straight from the Mongo documents; ObjectIds and datetimes encode natively
+        return FastJSONResponse({
             "success": True,
             "games": game_history,
-            "total_games": len(game_history)
-        }
+            "total_games": len(game_history),
+            "next_cursor": next_cursor,
+            "has_more": has_more
+        })
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/games/history/{wallet_address}/export")
+async def export_game_history(
+    wallet_address: str,
+    format: str = "ndjson",
+    wallet_info: Dict = Depends(get_authenticated_wallet)
+):
+    """Stream the full game history as NDJSON or CSV from a server-side cursor"""
+    if wallet_address != wallet_info["wallet_address"]:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    
+    cursor = db.game_bets.find(
+        _history_query(wallet_address),
+        {field: 1 for field in HISTORY_FIELDS}
+    ).sort(HISTORY_SORT).batch_size(1000)
+    
+    async def all_games():
+        # Hot bets first, then the archive one day at a time; both newest first
+        async for game in cursor:
+            yield game
+        async for games in bet_archive.iter_history(wallet_address, HISTORY_FIELDS):
+            for game in games:
+                yield game
+    
+    async def stream_rows():
+        # Rows are buffered into ~64KB chunks so memory stays flat regardless of history size
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=["_id", *HISTORY_FIELDS])
+        if format == "csv":
+            writer.writeheader()
+        async for game in all_games():
+            if format == "csv":
+                writer.writerow(_history_row(game))
+            else:
+                buffer.write(dumps_text(_history_row(game)) + "\n")
+            if buffer.tell() > 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_rows(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="game_history_{wallet_address}.{format}"'}
+    )
+
 # Savings endpoints
+async def _savings_summary(wallet_address: str) -> Dict[str, Any]:
+    """Savings totals, stats and the 50 most recent losses from game_bets and its archive"""
+    if await bet_rollups.ready():
+        # Totals and stats from the hourly rollups; only the recent page reads bets
+        rows = await bet_rollups.totals(wallet_address)
+        savings_by_currency = [
+            {"_id": row["currency"], "total_saved": to_float(row["lost_minor"], row["currency"]), "count": row["losses"]}
+            for row in rows if row["losses"]
+        ]
+        stats = {
+            "total_games": sum(row["bets"] for row in rows),
+            "total_wins": sum(row["wins"] for row in rows),
+            "total_losses": sum(row["losses"] for row in rows)
+        }
+        savings_history = await db.game_bets.find(
+            bet_archive.hot_query({"wallet_address": wallet_address, "result": "loss"}),
+            {"timestamp": 1, "game_type": 1, "currency": 1, "bet_amount": 1, "game_id": 1, "running_total": 1}
+        ).sort("timestamp", -1).limit(50).to_list(50)
+        if len(savings_history) < 50 and bet_archive.horizon():
+            savings_history += await bet_archive.recent_losses(wallet_address, 50 - len(savings_history))
+    else:
+        # Totals, stats and the recent page in a single aggregation over the hot tier
+        summary_pipeline = [
+            {"$match": bet_archive.hot_query({"wallet_address": wallet_address})},
+            {"$facet": {
+                "savings_by_currency": [
+                    {"$match": {"result": "loss"}},
+                    {"$group": {
+                        "_id": "$currency",
+                        "total_saved": {"$sum": "$bet_amount"},
+                        "count": {"$sum": 1}
+                    }}
+                ],
+                "stats": [
+                    {"$group": {
+                        "_id": None,
+                        "total_games": {"$sum": 1},
+                        "total_wins": {"$sum": {"$cond": [{"$eq": ["$result", "win"]}, 1, 0]}},
+                        "total_losses": {"$sum": {"$cond": [{"$eq": ["$result", "loss"]}, 1, 0]}}
+                    }}
+                ],
+                "recent_losses": [
+                    {"$match": {"result": "loss"}},
+                    {"$sort": {"timestamp": -1}},
+                    {"$limit": 50},
+                    {"$project": {
+                        "timestamp": 1, "game_type": 1, "currency": 1,
+                        "bet_amount": 1, "game_id": 1, "running_total": 1
+                    }}
+                ]
+            }}
+        ]
+    
+        summary = (await db.game_bets.aggregate(summary_pipeline).to_list(1))[0]
+        savings_by_currency = summary["savings_by_currency"]
+        stats = summary["stats"][0] if summary["stats"] else {}
+        savings_history = summary["recent_losses"]
+    
+        # Fold in the archived tier: the hot page is newer, so archived losses only fill the remainder
+        if bet_archive.horizon():
+            cold = await bet_archive.summary(wallet_address, recent_losses=50 - len(savings_history))
+            saved = {item["_id"]: item for item in savings_by_currency}
+            stats = dict(stats)
+            for currency, totals in cold["by_currency"].items():
+                if totals["losses"]:
+                    item = saved.setdefault(currency, {"_id": currency, "total_saved": 0, "count": 0})
+                    item["total_saved"] += totals["lost"]
+                    item["count"] += totals["losses"]
+                stats["total_games"] = stats.get("total_games", 0) + totals["games"]
+                stats["total_wins"] = stats.get("total_wins", 0) + totals["wins"]
+                stats["total_losses"] = stats.get("total_losses", 0) + totals["losses"]
+            savings_by_currency = list(saved.values())
+            savings_history = savings_history + cold["recent_losses"]
+    
+    # Running totals are stored on each loss when written; legacy records without one
+    # fall back to a running total accumulated within this page
+    page_totals = {}
+    processed_history = []
+    
+    for transaction in reversed(savings_history):
+        currency = transaction["currency"]
+        amount = transaction["bet_amount"]
+        page_totals[currency] = page_totals.get(currency, 0) + amount
+        
+        processed_history.append({
+            "_id": str(transaction["_id"]),
+            "date": transaction["timestamp"].strftime("%Y-%m-%d %H:%M"),
+            "game": transaction["game_type"],
+            "currency": currency,
+            "amount": amount,
+            "game_result": "Loss",
+            "running_total": transaction.get("running_total", page_totals[currency]),
+            "game_id": transaction["game_id"]
+        })
+    
+    # Newest first
+    processed_history.reverse()
+    
+    total_games = stats.get("total_games", 0)
+    total_wins = stats.get("total_wins", 0)
+    total_losses = stats.get("total_losses", 0)
+    
+    # Calculate USD values (mock prices for demo)
+    price_map = {"CRT": 5.02, "DOGE": 0.24, "TRX": 0.51}
+    total_usd = sum(
+        item["total_saved"] * price_map.get(item["_id"], 0) 
+        for item in savings_by_currency
+    )
+    
+    return {
+        "success": True,
+        "wallet_address": wallet_address,
+        "total_savings": {
+            currency_data["_id"]: currency_data["total_saved"] 
+            for currency_data in savings_by_currency
+        },
+        "total_usd": total_usd,
+        "savings_history": processed_history,
+        "stats": {
+            "total_games": total_games,
+            "total_wins": total_wins,
+            "total_losses": total_losses,
+            "win_rate": (total_wins / total_games * 100) if total_games > 0 else 0
+        }
+    }
+
 @api_router.get("/savings/{wallet_address}")
 async def get_savings_info(wallet_address: str, wallet_info: Dict = Depends(get_authenticated_wallet)):
     """Get real savings information from actual game losses"""
@@ -1367,83 +1713,7 @@ async def get_savings_info(wallet_address: str, wallet_info: Dict = Depends(get_
         if wallet_address != wallet_info["wallet_address"]:
             raise HTTPException(status_code=403, detail="Unauthorized")
         
-        # Get all game losses (which become savings)
-        losses_pipeline = [
-            {"$match": {"wallet_address": wallet_address, "result": "loss"}},
-            {"$group": {
-                "_id": "$currency", 
-                "total_saved": {"$sum": "$bet_amount"},
-                "count": {"$sum": 1}
-            }}
-        ]
-        
-        savings_by_currency = await db.game_bets.aggregate(losses_pipeline).to_list(100)
-        
-        # Get savings history (all losses become savings entries)
-        savings_history_cursor = db.game_bets.find({
-            "wallet_address": wallet_address, 
-            "result": "loss"
-        }).sort("timestamp", -1).limit(50)
-        
-        savings_history = await savings_history_cursor.to_list(50)
-        
-        # Calculate running totals for each currency
-        currency_totals = {}
-        processed_history = []
-        
-        # Process in reverse chronological order to calculate running totals
-        for transaction in reversed(savings_history):
-            currency = transaction["currency"]
-            amount = transaction["bet_amount"]
-            
-            if currency not in currency_totals:
-                currency_totals[currency] = 0
-            currency_totals[currency] += amount
-            
-            # Add to processed history with running total
-            processed_transaction = {
-                "_id": str(transaction["_id"]),
-                "date": transaction["timestamp"].strftime("%Y-%m-%d %H:%M"),
-                "game": transaction["game_type"],
-                "currency": currency,
-                "amount": amount,
-                "game_result": "Loss",
-                "running_total": currency_totals[currency],
-                "game_id": transaction["game_id"]
-            }
-            processed_history.append(processed_transaction)
-        
-        # Reverse back to chronological order (newest first)
-        processed_history.reverse()
-        
-        # Calculate totals
-        total_games = await db.game_bets.count_documents({"wallet_address": wallet_address})
-        total_wins = await db.game_bets.count_documents({"wallet_address": wallet_address, "result": "win"})
-        total_losses = await db.game_bets.count_documents({"wallet_address": wallet_address, "result": "loss"})
-        
-        # Calculate USD values (mock prices for demo)
-        price_map = {"CRT": 5.02, "DOGE": 0.24, "TRX": 0.51}
-        total_usd = sum(
-            item["total_saved"] * price_map.get(item["_id"], 0) 
-            for item in savings_by_currency
-        )
-        
-        return {
-            "success": True,
-            "wallet_address": wallet_address,
-            "total_savings": {
-                currency_data["_id"]: currency_data["total_saved"] 
-                for currency_data in savings_by_currency
-            },
-            "total_usd": total_usd,
-            "savings_history": processed_history,
-            "stats": {
-                "total_games": total_games,
-                "total_wins": total_wins,
-                "total_losses": total_losses,
-                "win_rate": (total_wins / total_games * 100) if total_games > 0 else 0
-            }
-        }
+        return await _savings_summary(wallet_address)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1503,7 +1773,7 @@ async def register_user(request: RegisterRequest):
             username = f"user_{request.wallet_address[:8]}"
         
         # Hash password
-        password_hash = pwd_context.hash(request.password)
+        password_hash = await password_hasher.hash(request.password)
         
         # Create new user
         user_data = {
@@ -1518,7 +1788,22 @@ async def register_user(request: RegisterRequest):
             "created_at": datetime.utcnow()
         }
         
-        result = await db.users.insert_one(user_data)
+        # The unique indexes settle races the checks above can't; a generated username that
+        # collides on its wallet prefix takes more of the address until it is unique
+        prefix_length = 8
+        while True:
+            try:
+                await db.users.insert_one(user_data)
+                break
+            except DuplicateKeyError as e:
+                user_data.pop("_id", None)
+                key = (e.details or {}).get("keyPattern", {})
+                if "wallet_address" in key:
+                    return {"success": False, "message": "Wallet address already registered"}
+                if request.username or prefix_length >= len(request.wallet_address):
+                    return {"success": False, "message": "Username already taken"}
+                prefix_length += 4
+                username = user_data["username"] = f"user_{request.wallet_address[:prefix_length]}"
         
         return {
             "success": True,
@@ -1529,6 +1814,8 @@ async def register_user(request: RegisterRequest):
             "created_at": user_data["created_at"].isoformat()
         }
         
+    except PasswordOverloaded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1541,21 +1828,9 @@ async def login_user(request: LoginRequest):
         if not user:
             return {"success": False, "message": "Wallet address not found"}
         
-        # Verify password using bcrypt (consistent with reset function)
+        # Verify password using bcrypt (consistent with reset function); old SHA256 records still work
         stored_password = user.get("password") or user.get("password_hash", "")
-        
-        # If it's old SHA256 format, still check it
-        import hashlib
-        sha256_hash = hashlib.sha256(request.password.encode()).hexdigest()
-        
-        # Try bcrypt first (new format), then fallback to SHA256 (old format)
-        password_valid = False
-        if stored_password:
-            try:
-                password_valid = pwd_context.verify(request.password, stored_password)
-            except:
-                # Fallback to SHA256 check for backwards compatibility
-                password_valid = (stored_password == sha256_hash)
+        password_valid = await password_hasher.verify(request.password, stored_password)
         
         if not password_valid:
             return {"success": False, "message": "Invalid password"}
@@ -1569,6 +1844,8 @@ async def login_user(request: LoginRequest):
             "created_at": user["created_at"].isoformat()
         }
         
+    except PasswordOverloaded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1583,19 +1860,9 @@ async def login_with_username(request: UsernameLoginRequest):
         if not user:
             return {"success": False, "message": "Username not found"}
         
-        # Verify password
+        # Verify password (bcrypt, or SHA256 for old records)
         stored_password = user.get("password") or user.get("password_hash", "")
-        
-        # Try bcrypt first (new format), then fallback to SHA256 (old format)
-        password_valid = False
-        if stored_password:
-            try:
-                password_valid = pwd_context.verify(request.password, stored_password)
-            except:
-                # Fallback to SHA256 check for backwards compatibility
-                import hashlib
-                sha256_hash = hashlib.sha256(request.password.encode()).hexdigest()
-                password_valid = (stored_password == sha256_hash)
+        password_valid = await password_hasher.verify(request.password, stored_password)
         
         if not password_valid:
             return {"success": False, "message": "Invalid password"}
@@ -1609,6 +1876,8 @@ async def login_with_username(request: UsernameLoginRequest):
             "created_at": user["created_at"].isoformat()
         }
         
+    except PasswordOverloaded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1669,9 +1938,11 @@ async def simulate_bet_loss(request: Dict[str, Any]):
             "result": "loss",
             "payout": 0,
             "status": "completed",
-            "timestamp": datetime.utcnow()
+            "timestamp": datetime.utcnow(),
+            "running_total": await next_loss_running_total(db, wallet_address, currency, amount)
         }
         await db.game_bets.insert_one(bet_record)
+        await bet_rollups.record([bet_record])
         
         return {
             "success": True,
@@ -1697,7 +1968,7 @@ async def reset_password(request: Dict[str, Any]):
             return {"success": False, "message": "wallet_address and new_password required"}
         
         # Hash the new password
-        hashed_password = pwd_context.hash(new_password)
+        hashed_password = await password_hasher.hash(new_password)
         
         # Update the password in database
         result = await db.users.update_one(
@@ -1714,6 +1985,8 @@ async def reset_password(request: Dict[str, Any]):
         else:
             return {"success": False, "message": "User not found or password not changed"}
             
+    except PasswordOverloaded:
+        raise
     except Exception as e:
         return {"success": False, "error": str(e)}
 
@@ -1794,16 +2067,19 @@ async def start_autoplay(request: Dict[str, Any]):
             "total_bets": 0,
             "total_winnings": 0,
             "total_losses": 0,
-            "last_bet_at": None
+            "last_bet_at": None,
+            "partition": partition_for(wallet_address)
         }
         
-        # Store autoplay session
+        # Store autoplay session; the worker owning its partition picks it up
         await db.autoplay_sessions.insert_one(autoplay_settings)
+        if autoplay_scheduler.running and autoplay_scheduler.owns(autoplay_settings):
+            autoplay_scheduler.add_session(autoplay_settings)
         
         return {
             "success": True,
             "message": "Auto-play started! AI will bet for you automatically.",
-            "settings": autoplay_settings,
+            "settings": {key: value for key, value in autoplay_settings.items() if key != "_id"},
             "session_id": str(autoplay_settings["_id"]) if "_id" in autoplay_settings else "new"
         }
         
@@ -1824,6 +2100,7 @@ async def stop_autoplay(request: Dict[str, Any]):
             {"wallet_address": wallet_address, "status": "active"},
             {"$set": {"status": "stopped", "stopped_at": datetime.utcnow()}}
         )
+        autoplay_scheduler.remove_wallet(wallet_address)
         
         return {
             "success": True,
@@ -1834,55 +2111,59 @@ async def stop_autoplay(request: Dict[str, Any]):
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+async def _autoplay_status(wallet_address: str) -> Dict[str, Any]:
+    """Active auto-play sessions for a wallet plus scheduler state"""
+    active_sessions = await db.autoplay_sessions.find(
+        {"wallet_address": wallet_address, "status": "active"}
+    ).to_list(10)
+    
+    return {
+        "success": True,
+        "active_sessions": len(active_sessions),
+        "sessions": active_sessions,
+        "scheduler": autoplay_scheduler.status()
+    }
+
 @app.get("/api/autoplay/status/{wallet_address}")
 async def get_autoplay_status(wallet_address: str):
     """Get current auto-play status"""
     try:
-        # Get active sessions
-        active_sessions = await db.autoplay_sessions.find(
-            {"wallet_address": wallet_address, "status": "active"}
-        ).to_list(10)
-        
-        return {
-            "success": True,
-            "active_sessions": len(active_sessions),
-            "sessions": active_sessions
-        }
+        return FastJSONResponse(await _autoplay_status(wallet_address))
         
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 @app.post("/api/autoplay/process-bets")
 async def process_autoplay_bets():
-    """Process auto-play bets for all active sessions (called by scheduler)"""
+    """Process auto-play bets for all active sessions (manual fallback when the scheduler is disabled)"""
+    if autoplay_scheduler.running:
+        return {
+            "success": True,
+            "processed_bets": 0,
+            "scheduler": autoplay_scheduler.status(),
+            "message": "Auto-play bets are placed automatically by the in-process scheduler"
+        }
+    
     try:
+        # Dedicated autoplay workers own every partition; settling here would double-bet
+        live_workers = await db.autoplay_workers.count_documents({"expires_at": {"$gt": datetime.utcnow()}})
+        if live_workers:
+            return {
+                "success": True,
+                "processed_bets": 0,
+                "live_workers": live_workers,
+                "message": "Auto-play bets are placed automatically by the autoplay workers"
+            }
+        
         # Get all active autoplay sessions
         active_sessions = await db.autoplay_sessions.find({"status": "active"}).to_list(100)
         
-        processed_count = 0
-        
-        for session in active_sessions:
-            try:
-                # Check if session should continue
-                if not await _should_continue_autoplay(session):
-                    await db.autoplay_sessions.update_one(
-                        {"_id": session["_id"]},
-                        {"$set": {"status": "completed", "stopped_at": datetime.utcnow()}}
-                    )
-                    continue
-                
-                # Check if it's time for next bet
-                if await _is_time_for_next_bet(session):
-                    # Place an AI bet
-                    bet_result = await _place_ai_bet(session)
-                    if bet_result["success"]:
-                        # Update session stats
-                        await _update_session_stats(session["_id"], bet_result)
-                        processed_count += 1
-            
-            except Exception as e:
-                print(f"Error processing autoplay session {session['_id']}: {e}")
-                continue
+        # Settle every due session in one batch
+        due_sessions = [session for session in active_sessions if await _is_time_for_next_bet(session)]
+        bets_before = sum(session.get("total_bets", 0) for session in due_sessions)
+        if due_sessions:
+            await autoplay_settlement.settle(due_sessions)
+        processed_count = sum(session.get("total_bets", 0) for session in due_sessions) - bets_before
         
         return {
             "success": True,
@@ -1893,41 +2174,10 @@ async def process_autoplay_bets():
     except Exception as e:
         return {"success": False, "error": str(e)}
 
-async def _should_continue_autoplay(session):
-    """Check if autoplay session should continue"""
-    try:
-        # Check time limit
-        started_at = session["started_at"]
-        max_duration_hours = session["max_duration"]
-        elapsed_hours = (datetime.utcnow() - started_at).total_seconds() / 3600
-        
-        if elapsed_hours >= max_duration_hours:
-            return False
-        
-        # Check loss limit
-        max_loss = session["max_loss"]
-        total_losses = session.get("total_losses", 0)
-        
-        if total_losses >= max_loss:
-            return False
-        
-        # Check if user has sufficient balance
-        user = await db.users.find_one({"wallet_address": session["wallet_address"]})
-        if not user:
-            return False
-        
-        currency = session["currency"]
-        bet_amount = session["bet_amounts"][currency]
-        current_balance = user.get("deposit_balance", {}).get(currency, 0)
-        
-        if current_balance < bet_amount:
-            return False
-        
-        return True
-        
-    except Exception as e:
-        print(f"Error checking autoplay continuation: {e}")
-        return False
+autoplay_leases = PartitionLeaseManager(db)
+autoplay_settlement = AutoplaySettlement(db, non_custodial_vault, ledger=ledger, rollups=bet_rollups,
+                                         leases=autoplay_leases)
+autoplay_scheduler = AutoplayScheduler(db, autoplay_settlement.settle, leases=autoplay_leases)
 
 async def _is_time_for_next_bet(session):
     """Check if it's time for the next bet"""
@@ -1944,66 +2194,6 @@ async def _is_time_for_next_bet(session):
     except Exception as e:
         return True
 
-async def _place_ai_bet(session):
-    """Place an AI bet for autoplay session"""
-    try:
-        import random
-        
-        # Randomly select game
-        games = session["games"]
-        selected_game = random.choice(games)
-        
-        # Get bet settings
-        currency = session["currency"]
-        bet_amount = session["bet_amounts"][currency]
-        wallet_address = session["wallet_address"]
-        
-        # Place the bet using existing betting system
-        bet_data = BetRequest(
-            wallet_address=wallet_address,
-            game_type=selected_game,
-            bet_amount=bet_amount,
-            currency=currency,
-            network="autoplay"
-        )
-        
-        # Use existing place_bet function
-        result = await place_bet(bet_data)
-        
-        return {
-            "success": result.get("success", False),
-            "game": selected_game,
-            "amount": bet_amount,
-            "currency": currency,
-            "result": result.get("result", "unknown"),
-            "payout": result.get("payout", 0),
-            "message": result.get("message", "")
-        }
-        
-    except Exception as e:
-        return {"success": False, "error": str(e)}
-
-async def _update_session_stats(session_id, bet_result):
-    """Update autoplay session statistics"""
-    try:
-        update_data = {
-            "last_bet_at": datetime.utcnow(),
-            "$inc": {"total_bets": 1}
-        }
-        
-        if bet_result["result"] == "win":
-            update_data["$inc"]["total_winnings"] = bet_result["payout"]
-        else:
-            update_data["$inc"]["total_losses"] = bet_result["amount"]
-        
-        await db.autoplay_sessions.update_one(
-            {"_id": session_id},
-            update_data
-        )
-        
-    except Exception as e:
-        print(f"Error updating session stats: {e}")
-
 # Simulate real escrow for demonstration
 @app.post("/api/test/simulate-escrow")
 async def simulate_escrow(request: Dict[str, Any]):
@@ -2062,13 +2252,17 @@ async def simulate_escrow(request: Dict[str, Any]):
         return {"success": False, "error": str(e)}
 
 @app.get("/api/escrow/status/{wallet_address}")
-async def get_escrow_status(wallet_address: str):
+async def get_escrow_status(wallet_address: str, request: Request):
     """Get escrow status and breakdown"""
     try:
-        user = await db.users.find_one({"wallet_address": wallet_address})
+        user = await db.users.find_one({"wallet_address": wallet_address}, ESCROW_VIEW_PROJECTION)
         if not user:
             return {"success": False, "message": "User not found"}
         
+        etag = make_etag("escrow", user)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return not_modified(etag)
+        
         escrow_balance = user.get("escrow_balance", {})
         real_backing = user.get("real_token_backing", False)
         escrow_status = user.get("escrow_status", "none")
@@ -2087,7 +2281,7 @@ async def get_escrow_status(wallet_address: str):
                     "usd_value": usd_value
                 }
         
-        return {
+        return FastJSONResponse({
             "success": True,
             "wallet_address": wallet_address,
             "escrow_status": escrow_status,
@@ -2095,52 +2289,63 @@ async def get_escrow_status(wallet_address: str):
             "total_escrow_usd": total_escrow_usd,
             "escrow_breakdown": escrow_breakdown,
             "note": "SIMULATION" if escrow_status == "simulated" else "REAL ESCROW"
-        }
+        }, headers=etag_headers(etag))
         
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+async def _vault_view(wallet_address: str, database_savings: Dict[str, Any]) -> Dict[str, Any]:
+    """On-chain vault balances alongside the database savings record"""
+    # Get real vault balances for all currencies
+    vault_balances = {}
+    vault_addresses = {}
+    
+    currencies = ["DOGE", "TRX", "CRT", "SOL"]
+    
+    vault_infos = await asyncio.gather(*(
+        non_custodial_vault.get_savings_vault_balance(wallet_address, currency) for currency in currencies
+    ))
+    for currency, vault_info in zip(currencies, vault_infos):
+        if vault_info.get("success"):
+            vault_balances[currency] = vault_info.get("balance", 0)
+            vault_addresses[currency] = vault_info.get("savings_address")
+    
+    return {
+        "success": True,
+        "wallet_address": wallet_address,
+        "vault_type": "non_custodial",
+        "user_controlled": True,
+        # Real blockchain balances
+        "vault_balances": vault_balances,
+        "vault_addresses": vault_addresses,
+        # Database backup records
+        "database_savings": database_savings,
+        "instructions": {
+            "withdrawal": "Use /api/savings/vault/withdraw to create withdrawal transaction",
+            "verification": "Verify balances on blockchain using provided addresses",
+            "private_keys": f"Derive from {wallet_address} + salt 'savings_vault_2025_secure'"
+        },
+        "security": {
+            "custody": "non_custodial",
+            "control": "user_controlled", 
+            "backup": "database_records_available"
+        }
+    }
+
 @app.get("/api/savings/vault/{wallet_address}")  
-async def get_savings_vault_info(wallet_address: str):
+async def get_savings_vault_info(wallet_address: str, request: Request):
     """Get user's non-custodial savings vault information and balances"""
     try:
-        # Get real vault balances for all currencies
-        vault_balances = {}
-        vault_addresses = {}
-        
-        currencies = ["DOGE", "TRX", "CRT", "SOL"]
-        
-        for currency in currencies:
-            vault_info = await non_custodial_vault.get_savings_vault_balance(wallet_address, currency)
-            if vault_info.get("success"):
-                vault_balances[currency] = vault_info.get("balance", 0)
-                vault_addresses[currency] = vault_info.get("savings_address")
-        
-        # Also get database savings as backup record
-        user = await db.users.find_one({"wallet_address": wallet_address})
+        # Database savings first: with the chain epoch they version the whole response
+        user = await db.users.find_one({"wallet_address": wallet_address}, {"_id": 0, "savings_balance": 1})
         database_savings = user.get("savings_balance", {}) if user else {}
         
-        return {
-            "success": True,
-            "wallet_address": wallet_address,
-            "vault_type": "non_custodial",
-            "user_controlled": True,
-            # Real blockchain balances
-            "vault_balances": vault_balances,
-            "vault_addresses": vault_addresses,
-            # Database backup records
-            "database_savings": database_savings,
-            "instructions": {
-                "withdrawal": "Use /api/savings/vault/withdraw to create withdrawal transaction",
-                "verification": "Verify balances on blockchain using provided addresses",
-                "private_keys": f"Derive from {wallet_address} + salt 'savings_vault_2025_secure'"
-            },
-            "security": {
-                "custody": "non_custodial",
-                "control": "user_controlled", 
-                "backup": "database_records_available"
-            }
-        }
+        etag = make_etag("vault", database_savings, include_chain=True)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return not_modified(etag)
+        
+        return FastJSONResponse(await _vault_view(wallet_address, database_savings),
+                                headers=etag_headers(etag))
         
     except Exception as e:
         return {"success": False, "error": str(e)}
@@ -2842,39 +3047,47 @@ async def start_deposit_monitoring(request: Dict[str, Any]):
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+def _liquidity_pool_view(user: Dict[str, Any]) -> Dict[str, Any]:
+    """Liquidity pool balances with USD value and withdrawal limits"""
+    # Get or create liquidity pool
+    liquidity_pool = user.get("liquidity_pool", {
+        "CRT": 0, "DOGE": 0, "TRX": 0, "USDC": 0,
+        "total_contributed": 0,
+        "created_at": datetime.now().isoformat()
+    })
+    
+    # Calculate total liquidity value in USD (mock prices for demo)
+    mock_prices = {"CRT": 0.15, "DOGE": 0.08, "TRX": 0.12, "USDC": 1.0}
+    total_liquidity_usd = sum(
+        liquidity_pool.get(currency, 0) * mock_prices[currency] 
+        for currency in mock_prices
+    )
+    
+    return {
+        "success": True,
+        "liquidity_pool": liquidity_pool,
+        "total_liquidity_usd": round(total_liquidity_usd, 2),
+        "withdrawal_limits": {
+            currency: min(balance * 0.1, liquidity_pool.get(currency, 0)) 
+            for currency, balance in liquidity_pool.items() 
+            if currency in mock_prices
+        }
+    }
+
 @app.get("/api/liquidity-pool/{wallet_address}")
-async def get_liquidity_pool(wallet_address: str):
+async def get_liquidity_pool(wallet_address: str, request: Request):
     """Get user's liquidity pool status"""
     try:
         # Find user
-        user = await db.users.find_one({"wallet_address": wallet_address})
+        user = await db.users.find_one({"wallet_address": wallet_address}, {"_id": 0, "liquidity_pool": 1})
         if not user:
             return {"success": False, "message": "User not found"}
         
-        # Get or create liquidity pool
-        liquidity_pool = user.get("liquidity_pool", {
-            "CRT": 0, "DOGE": 0, "TRX": 0, "USDC": 0,
-            "total_contributed": 0,
-            "created_at": datetime.now().isoformat()
-        })
-        
-        # Calculate total liquidity value in USD (mock prices for demo)
-        mock_prices = {"CRT": 0.15, "DOGE": 0.08, "TRX": 0.12, "USDC": 1.0}
-        total_liquidity_usd = sum(
-            liquidity_pool.get(currency, 0) * mock_prices[currency] 
-            for currency in mock_prices
-        )
+        etag = make_etag("liquidity_pool", user)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return not_modified(etag)
         
-        return {
-            "success": True,
-            "liquidity_pool": liquidity_pool,
-            "total_liquidity_usd": round(total_liquidity_usd, 2),
-            "withdrawal_limits": {
-                currency: min(balance * 0.1, liquidity_pool.get(currency, 0)) 
-                for currency, balance in liquidity_pool.items() 
-                if currency in mock_prices
-            }
-        }
+        return FastJSONResponse(_liquidity_pool_view(user), headers=etag_headers(etag))
         
     except Exception as e:
         print(f"Error in get_liquidity_pool: {e}")
@@ -2956,13 +3169,9 @@ async def get_conversion_rates():
     cache_key = "conversion_rates"
     
     # Check cache first
-    if redis_client:
-        try:
-            cached_rates = redis_client.get(cache_key)
-            if cached_rates:
-                return {"success": True, "rates": json.loads(cached_rates), "source": "cache"}
-        except Exception as e:
-            print(f"Redis cache error: {e}")
+    cached_rates = await redis_service.get_json(cache_key)
+    if cached_rates:
+        return {**cached_rates, "source": "cache"}
     
     try:
         # Get current prices for our supported currencies
@@ -3010,11 +3219,7 @@ async def get_conversion_rates():
         }
         
         # Cache for 30 seconds
-        if redis_client:
-            try:
-                redis_client.setex(cache_key, 30, json.dumps(result))
-            except Exception as e:
-                print(f"Redis cache set error: {e}")
+        await redis_service.set_json(cache_key, 30, result)
         
         return result
         
@@ -3034,19 +3239,17 @@ async def get_conversion_rates():
             "error": str(e)
         }
 
+PRICE_TICKS_ENABLED = os.getenv("PRICE_TICKS_ENABLED", "false").lower() == "true"
+
 @app.get("/api/crypto/price/{currency}")
 async def get_crypto_price(currency: str):
     """Get current price for a specific cryptocurrency"""
     cache_key = f"price_{currency.lower()}"
     
     # Check cache first
-    if redis_client:
-        try:
-            cached_price = redis_client.get(cache_key)
-            if cached_price:
-                return {"success": True, "data": json.loads(cached_price)}
-        except Exception as e:
-            print(f"Redis cache error: {e}")
+    cached_price = await redis_service.get_json(cache_key)
+    if cached_price:
+        return {"success": True, "data": cached_price}
     
     try:
         # Map currency to CoinGecko ID
@@ -3094,11 +3297,20 @@ async def get_crypto_price(currency: str):
             }
         
         # Cache for 30 seconds
-        if redis_client:
+        await redis_service.set_json(cache_key, 30, result)
+        
+        # Opt-in price history: one tick per upstream fetch into the price_ticks time-series collection
+        if PRICE_TICKS_ENABLED:
             try:
-                redis_client.setex(cache_key, 30, json.dumps(result))
+                await db.price_ticks.insert_one({
+                    "timestamp": datetime.utcnow(),
+                    "currency": result["currency"],
+                    "price_usd": result["price_usd"],
+                    "price_change_24h": result["price_change_24h"],
+                    "volume_24h": result["volume_24h"]
+                })
             except Exception as e:
-                print(f"Redis cache set error: {e}")
+                logger.warning(f"Price tick not recorded for {currency}: {e}")
         
         return {"success": True, "data": result}
         
@@ -3107,6 +3319,111 @@ async def get_crypto_price(currency: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch price data: {str(e)}")
 
+@app.get("/api/crypto/prices")
+async def get_crypto_prices(currencies: str = "CRT,DOGE,TRX,USDC"):
+    """Get conversion rates and several prices, reading all cached entries in one round-trip"""
+    requested = [currency.strip().upper() for currency in currencies.split(",") if currency.strip()]
+    price_keys = {currency: f"price_{currency.lower()}" for currency in requested}
+    
+    # One pipelined Redis read for rates plus every requested price
+    cached = await redis_service.get_many_json(["conversion_rates", *price_keys.values()])
+    
+    rates_result = cached.get("conversion_rates") or await get_conversion_rates()
+    rates = rates_result.get("rates", {})
+    
+    prices = {}
+    errors = {}
+    for currency, cache_key in price_keys.items():
+        if cache_key in cached:
+            prices[currency] = cached[cache_key]
+            continue
+        try:
+            prices[currency] = (await get_crypto_price(currency))["data"]
+        except HTTPException as e:
+            errors[currency] = e.detail
+    
+    return FastJSONResponse({
+        "success": True,
+        "rates": rates,
+        "prices": prices,
+        "errors": errors if errors else None,
+        "cache_hits": len(cached)
+    })
+
+
+DASHBOARD_SECTION_TIMEOUT = float(os.getenv("DASHBOARD_SECTION_TIMEOUT", "5"))
+
+async def _dashboard_section(source: str, builder, *args) -> Dict[str, Any]:
+    """Build one dashboard section; a failure or timeout only blanks that section"""
+    started = asyncio.get_running_loop().time()
+    try:
+        data = builder(*args)
+        if asyncio.iscoroutine(data):
+            data = await asyncio.wait_for(data, DASHBOARD_SECTION_TIMEOUT)
+        section = {"success": True, "data": data}
+    except asyncio.TimeoutError:
+        section = {"success": False, "error": f"Timed out after {DASHBOARD_SECTION_TIMEOUT}s"}
+    except HTTPException as e:
+        section = {"success": False, "error": e.detail}
+    except Exception as e:
+        section = {"success": False, "error": str(e)}
+    
+    section["source"] = source
+    section["as_of"] = datetime.utcnow().isoformat()
+    section["elapsed_ms"] = round((asyncio.get_running_loop().time() - started) * 1000, 1)
+    return section
+
+async def _unauthenticated_section():
+    raise HTTPException(status_code=401, detail="Authentication required for this wallet")
+
+@api_router.get("/dashboard/{wallet_address}")
+async def get_dashboard(wallet_address: str, wallet_info: Optional[Dict] = Depends(get_optional_wallet)):
+    """
+    Everything the dashboard loads on start-up in one call
+    The user document is read once and shared by every section; the rest run concurrently
+    and each reports its own source and as_of time. Savings need a bearer token for this
+    wallet; without one that section alone is marked unauthenticated
+    """
+    user = await db.users.find_one({"wallet_address": wallet_address}, WALLET_VIEW_PROJECTION)
+    if not user:
+        return {"success": False, "message": "Wallet not found"}
+    
+    authenticated = wallet_info is not None and wallet_info["wallet_address"] == wallet_address
+    sections = {
+        "wallet": _dashboard_section("chain+database", _wallet_view, user),
+        "savings": (_dashboard_section("database", _savings_summary, wallet_address) if authenticated
+                    else _dashboard_section("database", _unauthenticated_section)),
+        "liquidity_pool": _dashboard_section("database", _liquidity_pool_view, user),
+        "conversion_rates": _dashboard_section("coingecko+cache", get_conversion_rates),
+        "autoplay": _dashboard_section("database", _autoplay_status, wallet_address),
+        "savings_vault": _dashboard_section("chain+database", _vault_view, wallet_address,
+                                            user.get("savings_balance", {}))
+    }
+    results = await asyncio.gather(*sections.values())
+    
+    return FastJSONResponse({
+        "success": True,
+        "wallet_address": wallet_address,
+        "generated_at": datetime.utcnow().isoformat(),
+        "sections": dict(zip(sections, results))
+    })
+
+@api_router.post("/batch")
+async def batch_requests(batch: BatchRequest, request: Request):
+    """
+    Run several API calls in one round-trip
+    Sub-requests go through the app in-process with the caller's Authorization header,
+    run concurrently up to BATCH_MAX_CONCURRENCY within BATCH_TIME_BUDGET seconds, and
+    come back in order as {status, body}; one failing call never fails the batch. Writes
+    still running when the budget runs out finish anyway and come back as 202 pending
+    """
+    sub_requests = [sub_request.dict() for sub_request in batch.requests]
+    error = request_batcher.validate(sub_requests)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    
+    results = await request_batcher.execute(sub_requests, dict(request.headers))
+    return FastJSONResponse({"success": True, "results": results})
 
 # Test endpoint to add savings (for demo purposes)
 @app.post("/api/test/add-savings")
@@ -3127,56 +3444,43 @@ async def add_test_savings(request: Dict[str, Any]):
         return {"success": False, "message": str(e)}
 @api_router.websocket("/ws/wallet/{wallet_address}")
 async def websocket_wallet_monitor(websocket: WebSocket, wallet_address: str):
-    """WebSocket endpoint for real-time wallet monitoring"""
+    """WebSocket endpoint for real-time wallet monitoring (snapshot, then versioned deltas)"""
     await websocket.accept()
     
-    if wallet_address not in active_connections:
-        active_connections[wallet_address] = []
-    active_connections[wallet_address].append(websocket)
+    connection = connection_manager.connect(websocket, wallet_address)
+    wallet_change_feed.subscribe(wallet_address)
     
     try:
-        # Send initial wallet info
-        wallet_record = await db.user_wallets.find_one({"wallet_address": wallet_address})
+        # Create the wallet record on first connect
+        wallet_record = await db.user_wallets.find_one({"wallet_address": wallet_address}, {"_id": 1})
         if not wallet_record:
-            # Create new wallet record
             new_wallet = UserWallet(wallet_address=wallet_address)
             await db.user_wallets.insert_one(new_wallet.dict())
-            wallet_record = new_wallet.dict()
         
-        await websocket.send_text(json.dumps({
-            "type": "wallet_update",
-            "wallet": wallet_address,
-            "data": {
-                "success": True,
-                "wallet": wallet_record
-            }
-        }))
+        # Send initial snapshot; changes follow as deltas from the change feed
+        await wallet_sync.send_snapshot(connection)
         
         # Keep connection alive and handle messages
         while True:
             data = await websocket.receive_text()
+            connection.touch()
             message = json.loads(data)
             
-            if message.get("type") == "refresh_wallet":
-                # Refresh and send updated wallet info
-                updated_wallet = await db.user_wallets.find_one({"wallet_address": wallet_address})
-                await websocket.send_text(json.dumps({
-                    "type": "wallet_update", 
-                    "wallet": wallet_address,
-                    "data": {
-                        "success": True,
-                        "wallet": updated_wallet
-                    }
-                }))
+            # Clients resync after a version gap; refresh_wallet is the older name for it
+            if message.get("type") in ("resync", "refresh_wallet"):
+                await wallet_sync.send_snapshot(connection)
                 
     except Exception as e:
         print(f"WebSocket error: {e}")
     finally:
-        # Remove connection on disconnect
-        if wallet_address in active_connections:
-            active_connections[wallet_address].remove(websocket)
-            if not active_connections[wallet_address]:
-                del active_connections[wallet_address]
+        # Remove connection on disconnect (it may already be gone if evicted)
+        connection_manager.disconnect(connection)
+        if wallet_address not in connection_manager.connections:
+            wallet_change_feed.unsubscribe(wallet_address)
+            wallet_sync.release(wallet_address)
+
+wallet_sync = WalletSync(db, connection_manager)
+wallet_change_feed = WalletChangeFeed(db, wallet_sync.on_change)
 
 # =============================================================================
 # COINPAYMENTS REAL BLOCKCHAIN INTEGRATION ENDPOINTS
@@ -3437,6 +3741,10 @@ async def handle_coinpayments_withdrawal_webhook(request: Request, background_ta
         logger.error(f"CoinPayments withdrawal webhook failed: {str(e)}")
         raise HTTPException(status_code=500, detail="Webhook processing failed")
 
+# CoinPayments transaction ids kept on each user to make deposit credits idempotent; older
+# ones are still recognised through their deposits record
+CREDITED_DEPOSITS_KEPT = int(os.getenv("CREDITED_DEPOSITS_KEPT", "1000"))
+
 async def process_deposit_credit(deposit_info: Dict[str, Any]):
     """Background task to credit user account for confirmed deposits"""
     try:
@@ -3457,7 +3765,9 @@ async def process_deposit_credit(deposit_info: Dict[str, Any]):
         
         user_id = deposit_address_record["user_id"]
         currency = deposit_info["currency"]
-        amount = Decimal(deposit_info["net_amount"])  # Use net amount after fees
+        # Net amount after fees, straight from CoinPayments' decimal string to minor units
+        amount_units = to_minor(Decimal(deposit_info["net_amount"]), currency)
+        amount = to_float(amount_units, currency)
         
         # Find user
         user = await db.users.find_one({"_id": user_id}) or await db.users.find_one({"wallet_address": user_id})
@@ -3465,14 +3775,32 @@ async def process_deposit_credit(deposit_info: Dict[str, Any]):
             logger.error(f"User not found: {user_id}")
             return
         
-        # Credit deposit balance
-        current_balance = user.get("deposit_balance", {}).get(currency, 0)
-        new_balance = current_balance + float(amount)
+        # The credit and its idempotency key are one update of the user document, so a repeated
+        # IPN for an already credited deposit matches nothing instead of crediting twice
+        transaction_id = deposit_info["transaction_id"]
+        credited = False
+        if not await db.deposits.find_one({"transaction_id": transaction_id}, {"_id": 1}):
+            result = await db.users.update_one(
+                {"_id": user["_id"], "credited_deposits": {"$ne": transaction_id}},
+                {
+                    "$inc": {f"deposit_balance.{currency}": amount},
+                    "$push": {"credited_deposits": {"$each": [transaction_id], "$slice": -CREDITED_DEPOSITS_KEPT}}
+                }
+            )
+            credited = result.modified_count == 1
+        if not credited:
+            logger.info(f"Deposit {transaction_id} already credited")
         
-        await db.users.update_one(
-            {"_id": user["_id"]},
-            {"$set": {f"deposit_balance.{currency}": new_balance}}
-        )
+        # The steps below are idempotent and run on every IPN, so a retry completes
+        # whatever a failure after the credit left out
+        try:
+            await ledger.post_or_defer([{
+                "kind": "deposit", "wallet_address": user.get("wallet_address"),
+                "reference": f"coinpayments:{transaction_id}",
+                "legs": deposit_legs(user.get("wallet_address"), currency, amount_units)
+            }])
+        except Exception as e:
+            logger.error(f"Ledger posting and deferral failed for deposit {transaction_id}: {e}")
         
         # Record successful deposit
         deposit_record = {
@@ -3481,7 +3809,8 @@ async def process_deposit_credit(deposit_info: Dict[str, Any]):
             "transaction_id": deposit_info["transaction_id"],
             "deposit_id": deposit_info["deposit_id"],
             "currency": currency,
-            "amount": float(amount),
+            "amount": amount,
+            "amount_minor": amount_units,
             "address": deposit_info["address"],
             "status": "confirmed",
             "confirmations": deposit_info["confirmations"],
@@ -3489,9 +3818,12 @@ async def process_deposit_credit(deposit_info: Dict[str, Any]):
             "service": "coinpayments"
         }
         
-        await db.deposits.insert_one(deposit_record)
+        await db.deposits.update_one(
+            {"transaction_id": transaction_id}, {"$setOnInsert": deposit_record}, upsert=True
+        )
         
-        logger.info(f"Successfully credited {amount} {currency} to user {user_id}")
+        if credited:
+            logger.info(f"Successfully credited {amount} {currency} to user {user_id}")
         
     except Exception as e:
         logger.error(f"Failed to process deposit credit: {str(e)}")
@@ -3547,6 +3879,53 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def startup_shared_clients():
+    await redis_service.connect()
+    if redis_service.available:
+        # Challenges issued by one worker must be verifiable on any other
+        auth_manager.challenge_store = RedisChallengeStore(redis_service.client)
+    await revocation_list.start(redis_service.client if redis_service.available else None)
+    try:
+        await ensure_indexes(db)
+    except Exception as e:
+        logger.error(f"Index bootstrap failed: {e}")
+    try:
+        await liquidity_pool.migrate_legacy()
+    except Exception as e:
+        logger.error(f"Liquidity pool shard migration failed: {e}")
+    if os.environ.get("BET_WRITE_BEHIND_ENABLED", "true").lower() == "true":
+        try:
+            await bet_writer.start()
+        except Exception as e:
+            # Without the spool, bets are inserted one at a time as before
+            logger.error(f"Bet write-behind buffer unavailable: {e}")
+    try:
+        await bet_rollups.start()
+    except Exception as e:
+        logger.error(f"Bet rollups unavailable at startup: {e}")
+    if PRICE_TICKS_ENABLED:
+        try:
+            await ensure_timeseries(db, TIMESERIES_STREAMS["price_ticks"])
+        except Exception as e:
+            logger.error(f"price_ticks time-series collection unavailable: {e}")
+    ledger.start()
+    if os.environ.get("AUTOPLAY_SCHEDULER_ENABLED", "true").lower() == "true":
+        await autoplay_scheduler.start()
+    await connection_manager.start(redis_service.client if redis_service.available else None)
+    if os.environ.get("WALLET_CHANGE_STREAM_ENABLED", "true").lower() == "true":
+        wallet_change_feed.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await autoplay_scheduler.stop()
+    await ledger.stop()
+    await wallet_change_feed.stop()
+    await revocation_list.stop()
+    await connection_manager.stop()
+    await request_batcher.close()
+    await bet_writer.stop()
+    await redis_service.close()
+    await coinpayments_service.close()
+    password_hasher.shutdown()
     client.close()
@@ -0,0 +1,54 @@
+"""
+Amounts
+Integer minor-unit amounts and the one conversion layer between them and the decimal
+amounts the API speaks. Minor-unit amounts are int64 counts of a currency's smallest unit,
+so server-side $inc and $sum over them are exact and analytics can load them straight into
+int64 arrays. Precision per currency comes from the CoinPayments currency table and the
+CRT mint's decimals
+
+Scope: the ledger and the *_minor fields of bets, transactions and deposits are int64.
+The balance fields on users (deposit_balance, winnings_balance, savings_balance,
+liquidity_pool) are still floats, read and written across the app and the ops scripts;
+writes to them use to_float of exact minor-unit amounts, and the ledger's materialized
+balances are the int64 source for moving reads off them
+"""
+
+from decimal import Decimal, ROUND_HALF_EVEN
+from typing import Dict, Union
+
+from services.coinpayments_service import CoinPaymentsService
+from blockchain.solana_manager import CRTTokenManager
+
+CURRENCY_PRECISION: Dict[str, int] = {
+    code: config.precision for code, config in CoinPaymentsService.CURRENCIES.items()
+}
+CURRENCY_PRECISION["CRT"] = CRTTokenManager.DECIMALS
+CURRENCY_PRECISION["SOL"] = 9  # Lamports
+DEFAULT_PRECISION = 8
+
+INT64_MAX = 2 ** 63 - 1
+
+Number = Union[int, float, str, Decimal]
+
+def precision(currency: str) -> int:
+    return CURRENCY_PRECISION.get(currency.upper(), DEFAULT_PRECISION)
+
+def to_minor(amount: Number, currency: str) -> int:
+    """Decimal amount -> minor units, rounded half-even at the currency's precision"""
+    places = precision(currency)
+    # str() first so a float like 0.1 converts as written, not as its binary expansion
+    value = amount if isinstance(amount, Decimal) else Decimal(str(amount))
+    units = int(value.scaleb(places).quantize(Decimal(1), rounding=ROUND_HALF_EVEN))
+    if abs(units) > INT64_MAX:
+        raise OverflowError(f"{amount} {currency} does not fit in int64 minor units")
+    return units
+
+def to_decimal(units: int, currency: str) -> Decimal:
+    return Decimal(units).scaleb(-precision(currency))
+
+def to_float(units: int, currency: str) -> float:
+    """Minor units -> the float the API and legacy balance fields use"""
+    return float(to_decimal(units, currency))
+
+def balances_to_float(balances: Dict[str, int]) -> Dict[str, float]:
+    return {currency: to_float(units, currency) for currency, units in balances.items()}
@@ -6,9 +6,10 @@ Handles deposits, withdrawals, and transaction management for DOGE, TRX, and USD
 import os
 import hmac
 import hashlib
-import requests
+import httpx
 import json
 import asyncio
+import random
 import time
 from typing import Dict, Any, Optional, List
 from datetime import datetime, timedelta
@@ -67,6 +68,15 @@ class CoinPaymentsService:
         )
     }
     
+    # Per-command request timeouts in seconds (reads are cheap, withdrawals may be slow)
+    COMMAND_TIMEOUTS = {
+        'get_callback_address': 10.0,
+        'create_withdrawal': 20.0,
+        'get_tx_info': 8.0,
+        'balances': 8.0
+    }
+    DEFAULT_TIMEOUT = 10.0
+    
     def __init__(self):
         """Initialize CoinPayments service with API credentials"""
         self.public_key = os.getenv('COINPAYMENTS_PUBLIC_KEY')
@@ -77,9 +87,40 @@ class CoinPaymentsService:
         
         if not all([self.public_key, self.private_key]):
             raise ValueError("CoinPayments API credentials not found in environment variables")
+        
+        # Pooled async HTTP client, created lazily inside the running event loop
+        self.max_concurrency = int(os.getenv('COINPAYMENTS_MAX_CONCURRENCY', '10'))
+        self.retry_base_delay = float(os.getenv('COINPAYMENTS_RETRY_BASE_DELAY', '0.5'))
+        self.retry_max_delay = float(os.getenv('COINPAYMENTS_RETRY_MAX_DELAY', '8.0'))
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
             
         logger.info("CoinPayments service initialized successfully")
     
+    def _get_client(self) -> httpx.AsyncClient:
+        """Return the shared HTTP client, creating the pool on first use"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency
+                ),
+                timeout=httpx.Timeout(self.DEFAULT_TIMEOUT, connect=5.0)
+            )
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+    
+    async def close(self):
+        """Close pooled connections (called from app shutdown)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    def _backoff_delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff so concurrent retries don't synchronize"""
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * (2 ** attempt)))
+    
     def _generate_signature(self, post_data: str) -> str:
         """Generate HMAC-SHA512 signature for API authentication"""
         return hmac.new(
@@ -109,14 +150,19 @@ class CoinPaymentsService:
             'HMAC': signature
         }
         
+        client = self._get_client()
+        timeout = self.COMMAND_TIMEOUTS.get(params.get('cmd'), self.DEFAULT_TIMEOUT)
+        
         for attempt in range(retries):
             try:
-                response = requests.post(
-                    self.api_url,
-                    data=post_data,
-                    headers=headers,
-                    timeout=30
-                )
+                # Concurrency cap: slow CoinPayments calls queue here instead of piling up sockets
+                async with self._semaphore:
+                    response = await client.post(
+                        self.api_url,
+                        content=post_data,
+                        headers=headers,
+                        timeout=timeout
+                    )
                 response.raise_for_status()
                 
                 result = response.json()
@@ -135,8 +181,8 @@ class CoinPaymentsService:
                     logger.error(f"CoinPayments API request failed after {retries} attempts: {str(e)}")
                     raise Exception(f"CoinPayments API request failed: {str(e)}")
                 
-                # Wait before retry with exponential backoff
-                await asyncio.sleep(2 ** attempt)
+                # Wait before retry with jittered exponential backoff (outside the concurrency cap)
+                await asyncio.sleep(self._backoff_delay(attempt))
         
         return {}
     
@@ -0,0 +1,48 @@
+"""
+Conditional GET
+ETags for the polled wallet read endpoints. A tag is a digest of the user fields a
+response is built from, plus the current chain epoch for responses that include
+on-chain balances, so an unchanged poll is answered with 304 before any chain lookup
+or body rendering
+"""
+
+import os
+import time
+import hashlib
+from typing import Any, Optional
+
+import orjson
+from fastapi import Response
+
+from services.json_response import json_default
+
+# On-chain balances are treated as fresh for one epoch; a tag rolls over with the epoch
+CHAIN_EPOCH_SECONDS = int(os.getenv("CHAIN_BALANCE_EPOCH_SECONDS", "15"))
+
+def chain_epoch(now: float = None) -> int:
+    return int((now if now is not None else time.time()) // CHAIN_EPOCH_SECONDS)
+
+def make_etag(resource: str, document: Any, include_chain: bool = False) -> str:
+    """Weak ETag over the source document; sorted keys keep it independent of field order"""
+    digest = hashlib.blake2b(digest_size=12)
+    digest.update(resource.encode())
+    digest.update(orjson.dumps(document, default=json_default, option=orjson.OPT_SORT_KEYS))
+    if include_chain:
+        digest.update(f"|chain:{chain_epoch()}".encode())
+    return f'W/"{digest.hexdigest()}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison, so the W/ prefix is ignored on both sides"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    wanted = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == wanted for tag in if_none_match.split(","))
+
+def etag_headers(etag: str) -> dict:
+    # no-cache: browsers may keep the body but must revalidate each poll
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=etag_headers(etag))
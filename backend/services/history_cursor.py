@@ -0,0 +1,24 @@
+"""
+History Cursors
+Opaque keyset cursors for game history pages. A cursor is the (timestamp, _id) of the
+last bet on a page, base64url encoded, so the next page continues strictly after it
+"""
+
+import base64
+from datetime import datetime
+from typing import Dict, Any, Tuple
+
+from bson import ObjectId
+
+def encode_history_cursor(game: Dict[str, Any]) -> str:
+    """Opaque keyset cursor pointing just after the given bet"""
+    raw = f"{game['timestamp'].isoformat()}|{game['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Cursor -> (timestamp, _id); raises ValueError for anything encode_history_cursor didn't produce"""
+    try:
+        timestamp_str, object_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(timestamp_str), ObjectId(object_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}") from e
@@ -0,0 +1,175 @@
+"""
+MongoDB Index Registry
+Declares the indexes every hot collection needs, applies them idempotently at startup
+and reports index usage and collection scans for operators
+"""
+
+import logging
+from typing import Dict, Any, List
+
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Only index documents whose key is a real string, so legacy documents missing it don't collide
+def _string_only(field: str) -> Dict[str, Any]:
+    return {field: {"$type": "string"}}
+
+INDEX_REGISTRY: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("wallet_address", ASCENDING)], name="wallet_address_unique", unique=True),
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True,
+                   partialFilterExpression=_string_only("username")),
+    ],
+    "user_wallets": [
+        IndexModel([("wallet_address", ASCENDING)], name="wallet_address_unique", unique=True),
+    ],
+    "game_bets": [
+        IndexModel([("wallet_address", ASCENDING), ("result", ASCENDING), ("timestamp", DESCENDING)],
+                   name="wallet_result_timestamp"),
+        IndexModel([("wallet_address", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+                   name="wallet_history_keyset"),
+        IndexModel([("timestamp", ASCENDING)], name="timestamp"),
+    ],
+    "transactions": [
+        IndexModel([("wallet_address", ASCENDING), ("type", ASCENDING), ("timestamp", DESCENDING)],
+                   name="wallet_type_timestamp"),
+        IndexModel([("doge_address", ASCENDING), ("type", ASCENDING), ("timestamp", DESCENDING)],
+                   name="doge_address_type_timestamp", partialFilterExpression=_string_only("doge_address")),
+        IndexModel([("transaction_id", ASCENDING)], name="transaction_id",
+                   partialFilterExpression=_string_only("transaction_id")),
+    ],
+    "autoplay_sessions": [
+        IndexModel([("status", ASCENDING)], name="status"),
+        IndexModel([("wallet_address", ASCENDING), ("status", ASCENDING)], name="wallet_status"),
+        IndexModel([("status", ASCENDING), ("partition", ASCENDING), ("started_at", ASCENDING)],
+                   name="status_partition_started"),
+    ],
+    "autoplay_workers": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at"),
+    ],
+    "game_sessions": [
+        IndexModel([("wallet_address", ASCENDING), ("currency", ASCENDING), ("is_active", ASCENDING)],
+                   name="wallet_currency_active"),
+        IndexModel([("session_id", ASCENDING)], name="session_id", unique=True,
+                   partialFilterExpression=_string_only("session_id")),
+    ],
+    "deposit_addresses": [
+        IndexModel([("address", ASCENDING), ("currency", ASCENDING)], name="address_currency"),
+    ],
+    "ledger_entries": [
+        IndexModel([("seq", ASCENDING)], name="seq_unique", unique=True),
+        IndexModel([("reference", ASCENDING)], name="reference_unique", unique=True,
+                   partialFilterExpression=_string_only("reference")),
+        IndexModel([("legs.account", ASCENDING), ("seq", ASCENDING)], name="account_seq"),
+    ],
+    "ledger_balances": [
+        IndexModel([("wallet_address", ASCENDING)], name="wallet_address",
+                   partialFilterExpression=_string_only("wallet_address")),
+        IndexModel([("account", ASCENDING)], name="account"),
+    ],
+    "ledger_checkpoints": [
+        IndexModel([("seq", ASCENDING)], name="seq_unique", unique=True),
+    ],
+    "ledger_checkpoint_balances": [
+        IndexModel([("checkpoint_seq", ASCENDING), ("account", ASCENDING)], name="checkpoint_account_unique",
+                   unique=True),
+    ],
+    "bet_rollups": [
+        IndexModel([("wallet_address", ASCENDING), ("hour", ASCENDING), ("game_type", ASCENDING),
+                    ("currency", ASCENDING)], name="wallet_hour_game_currency_unique", unique=True),
+    ],
+    "deposits": [
+        IndexModel([("transaction_id", ASCENDING)], name="transaction_id_unique", unique=True,
+                   partialFilterExpression=_string_only("transaction_id")),
+    ],
+    "withdrawals": [
+        IndexModel([("withdrawal_id", ASCENDING)], name="withdrawal_id_unique", unique=True,
+                   partialFilterExpression=_string_only("withdrawal_id")),
+    ],
+}
+
+async def ensure_indexes(db, registry: Dict[str, List[IndexModel]] = None) -> Dict[str, Any]:
+    """
+    Create every registered index. createIndexes is a no-op for indexes that already exist,
+    so this is safe to run on every startup. Indexes are created one at a time, so one that
+    fails (typically a unique index blocked by legacy duplicates) doesn't skip its neighbours
+    """
+    registry = registry or INDEX_REGISTRY
+    results = {}
+
+    for collection_name, indexes in registry.items():
+        created, errors = [], {}
+        for index in indexes:
+            name = index.document["name"]
+            try:
+                created.extend(await db[collection_name].create_indexes([index]))
+            except OperationFailure as e:
+                # Needs manual cleanup of the offending documents
+                logger.error(f"Index {name} creation failed for {collection_name}: {e}")
+                errors[name] = str(e)
+        results[collection_name] = {"success": not errors, "indexes": created}
+        if errors:
+            results[collection_name]["error"] = "; ".join(f"{name}: {error}" for name, error in errors.items())
+
+    logger.info(f"Index bootstrap complete for {len(results)} collections")
+    return results
+
+async def index_usage_report(db, registry: Dict[str, List[IndexModel]] = None,
+                             profile_limit: int = 1000) -> Dict[str, Any]:
+    """
+    Report $indexStats for registered collections and the query shapes that the profiler
+    saw running as collection scans
+    """
+    registry = registry or INDEX_REGISTRY
+    report = {"collections": {}, "collection_scans": [], "profiler": {}}
+
+    for collection_name in registry:
+        try:
+            stats = await db[collection_name].aggregate([{"$indexStats": {}}]).to_list(None)
+            report["collections"][collection_name] = [
+                {
+                    "name": stat["name"],
+                    "key": stat["key"],
+                    "ops": stat["accesses"]["ops"],
+                    "since": stat["accesses"]["since"].isoformat()
+                }
+                for stat in stats
+            ]
+        except OperationFailure as e:
+            report["collections"][collection_name] = {"error": str(e)}
+
+    # Collection scans only show up when the profiler is enabled (db.setProfilingLevel)
+    profile_status = await db.command({"profile": -1})
+    report["profiler"] = {"level": profile_status.get("was", 0), "slowms": profile_status.get("slowms")}
+
+    if report["profiler"]["level"] > 0:
+        scans = await db.system.profile.aggregate([
+            {"$match": {"planSummary": "COLLSCAN"}},
+            {"$sort": {"ts": -1}},
+            {"$limit": profile_limit},
+            {"$group": {
+                "_id": {"ns": "$ns", "op": "$op", "filter": "$command.filter"},
+                "count": {"$sum": 1},
+                "max_millis": {"$max": "$millis"},
+                "docs_examined": {"$max": "$docsExamined"},
+                "last_seen": {"$max": "$ts"}
+            }},
+            {"$sort": {"count": -1}}
+        ]).to_list(None)
+
+        report["collection_scans"] = [
+            {
+                "namespace": scan["_id"]["ns"],
+                "op": scan["_id"]["op"],
+                "filter_fields": sorted((scan["_id"].get("filter") or {}).keys()),
+                "count": scan["count"],
+                "max_millis": scan["max_millis"],
+                "docs_examined": scan["docs_examined"],
+                "last_seen": scan["last_seen"].isoformat()
+            }
+            for scan in scans
+        ]
+
+    return report
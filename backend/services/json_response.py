@@ -0,0 +1,46 @@
+"""
+Fast JSON Responses
+orjson-backed serialization for API responses and WebSocket messages. orjson encodes
+datetime, UUID and dataclasses natively, and json_default covers the Mongo and pydantic
+types it doesn't, so routes can hand back raw documents without a jsonable_encoder pass
+"""
+
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+DUMPS_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+def json_default(obj: Any) -> Any:
+    """Fallback for types orjson doesn't encode; mirrors FastAPI's own encoders"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal):
+        # Same rule as fastapi.encoders.decimal_encoder: integral decimals stay ints
+        return int(obj) if obj.as_tuple().exponent >= 0 else float(obj)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=json_default, option=DUMPS_OPTIONS)
+
+def dumps_text(obj: Any) -> str:
+    """dumps for text frames, Redis payloads and ndjson lines"""
+    return dumps(obj).decode()
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered by orjson
+    Set as the app's default_response_class; returning one directly from a route also
+    skips FastAPI's jsonable_encoder walk over the content
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
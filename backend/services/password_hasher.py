@@ -0,0 +1,100 @@
+"""
+Password Hasher
+Runs bcrypt hashing and verification on a small dedicated thread pool instead of the
+event loop, and sheds load once the pool's queue is full so a login storm can't stall
+bet processing
+"""
+
+import os
+import math
+import time
+import asyncio
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any
+
+from passlib.context import CryptContext
+
+logger = logging.getLogger(__name__)
+
+class PasswordOverloaded(Exception):
+    """Raised when the hashing queue is full; retry_after is a suggested wait in seconds"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Password hashing overloaded, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+class PasswordHasher:
+    """
+    Bounded bcrypt executor
+    bcrypt releases the GIL while it works, so threads give real parallelism without the
+    pickling and start-up cost of a process pool
+    """
+
+    def __init__(self, max_workers: int = None, max_queue: int = None):
+        self.context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        self.max_workers = max_workers or int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.max_ms = 0.0
+        self._total_ms = 0.0
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, stored_hash: str) -> bool:
+        """Check a password against a bcrypt hash, or a legacy unsalted SHA256 hex digest"""
+        if not stored_hash:
+            return False
+        if self.context.identify(stored_hash) is None:
+            # Legacy SHA256 records are cheap to check, so they never wait for the pool
+            return hashlib.sha256(password.encode()).hexdigest() == stored_hash
+        try:
+            return await self._run(self.context.verify, password, stored_hash)
+        except ValueError:
+            # Malformed hash: treat as a wrong password rather than a server error
+            return False
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": max(0, self.in_flight - self.max_workers),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_ms": round(self._total_ms / self.completed, 2) if self.completed else 0.0,
+            "max_ms": round(self.max_ms, 2)
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, func, *args):
+        if self.in_flight >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise PasswordOverloaded(self._retry_after())
+
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.in_flight -= 1
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.completed += 1
+            self._total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def _retry_after(self) -> int:
+        """Time for the current queue to drain at the observed per-hash cost"""
+        avg_seconds = (self._total_ms / self.completed / 1000) if self.completed else 0.25
+        return max(1, math.ceil(self.in_flight / self.max_workers * avg_seconds))
+
+# Global hasher instance
+password_hasher = PasswordHasher()
@@ -0,0 +1,90 @@
+"""
+Redis Service for shared caching
+Wraps a pooled redis.asyncio client that degrades cleanly when Redis is unavailable
+"""
+
+import os
+import json
+import logging
+from typing import Dict, Any, Optional, List
+
+import redis.asyncio as aioredis
+
+logger = logging.getLogger(__name__)
+
+class RedisService:
+    """Shared asyncio Redis client backed by a single connection pool"""
+
+    def __init__(self, url: str = None, max_connections: int = None):
+        self.url = url or os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        self.max_connections = max_connections or int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+        self.pool: Optional[aioredis.ConnectionPool] = None
+        self.client: Optional[aioredis.Redis] = None
+        self.available = False
+
+    async def connect(self) -> bool:
+        """Create the connection pool and check that Redis answers (called from app startup)"""
+        try:
+            self.pool = aioredis.ConnectionPool.from_url(
+                self.url,
+                max_connections=self.max_connections,
+                decode_responses=True,
+                socket_connect_timeout=1,
+                socket_timeout=1,
+                health_check_interval=30
+            )
+            self.client = aioredis.Redis(connection_pool=self.pool)
+            await self.client.ping()
+            self.available = True
+            logger.info("✅ Redis connected successfully")
+        except Exception as e:
+            logger.warning(f"⚠️ Redis connection failed, caching disabled: {e}")
+            self.available = False
+        return self.available
+
+    async def close(self):
+        """Release pooled connections (called from app shutdown)"""
+        if self.client:
+            await self.client.aclose()
+        if self.pool:
+            await self.pool.disconnect()
+        self.available = False
+
+    async def get_json(self, key: str) -> Optional[Any]:
+        """Read a JSON value, returning None on a miss or when Redis is down"""
+        if not self.available:
+            return None
+        try:
+            value = await self.client.get(key)
+            return json.loads(value) if value else None
+        except Exception as e:
+            logger.warning(f"Redis cache error: {e}")
+            return None
+
+    async def get_many_json(self, keys: List[str]) -> Dict[str, Any]:
+        """Read several JSON values in one pipelined round-trip; misses are omitted"""
+        if not self.available or not keys:
+            return {}
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.get(key)
+                values = await pipe.execute()
+            return {key: json.loads(value) for key, value in zip(keys, values) if value}
+        except Exception as e:
+            logger.warning(f"Redis cache error: {e}")
+            return {}
+
+    async def set_json(self, key: str, ttl_seconds: int, value: Any) -> bool:
+        """Write a JSON value with an expiry; failures are logged and ignored"""
+        if not self.available:
+            return False
+        try:
+            await self.client.setex(key, ttl_seconds, json.dumps(value))
+            return True
+        except Exception as e:
+            logger.warning(f"Redis cache set error: {e}")
+            return False
+
+# Global service instance
+redis_service = RedisService()
@@ -0,0 +1,154 @@
+"""
+Request Batcher
+Runs a list of API sub-requests in-process through the ASGI app, so chatty clients pay
+one HTTP round-trip and TLS handshake for many small calls. Sub-requests run through the
+full middleware and routing stack, concurrently up to a cap and within a shared time
+budget, and results come back in request order
+
+Only safe methods are cut off when the budget runs out. A mutating sub-request that has
+started is never cancelled halfway through its writes: it keeps running and is reported
+as pending (202) instead
+"""
+
+import os
+import asyncio
+import logging
+from typing import Dict, Any, List, Optional
+
+import httpx
+import orjson
+
+logger = logging.getLogger(__name__)
+
+BATCH_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE"}
+SAFE_METHODS = {"GET", "HEAD"}
+
+# Headers a sub-request inherits from the outer batch request
+FORWARDED_HEADERS = ("authorization", "x-forwarded-for", "user-agent")
+
+class RequestBatcher:
+    """Dispatches sub-requests to the app over httpx's in-process ASGI transport"""
+
+    def __init__(self, app, path: str = "/api/batch", max_requests: int = None,
+                 max_concurrency: int = None, time_budget: float = None):
+        self.app = app
+        self.path = path
+        self.max_requests = max_requests or int(os.getenv("BATCH_MAX_REQUESTS", "25"))
+        self.max_concurrency = max_concurrency or int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+        self.time_budget = time_budget or float(os.getenv("BATCH_TIME_BUDGET", "10"))
+        self._client: Optional[httpx.AsyncClient] = None
+        self._pending: set = set()  # Mutating sub-requests still running past their batch's budget
+
+        self.batches = 0
+        self.sub_requests = 0
+        self.timeouts = 0
+        self.pending_results = 0
+
+    def validate(self, requests: List[Dict[str, Any]]) -> Optional[str]:
+        """Reason the batch is rejected as a whole, or None"""
+        if not requests:
+            return "Batch is empty"
+        if len(requests) > self.max_requests:
+            return f"Batch exceeds {self.max_requests} requests"
+        return None
+
+    async def execute(self, requests: List[Dict[str, Any]], headers: Dict[str, str]) -> List[Dict[str, Any]]:
+        """Run every sub-request; each result is {status, body} in the order given"""
+        self.batches += 1
+        self.sub_requests += len(requests)
+        forwarded = {name: headers[name] for name in FORWARDED_HEADERS if name in headers}
+        deadline = asyncio.get_running_loop().time() + self.time_budget
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(sub_request: Dict[str, Any]) -> Dict[str, Any]:
+            error = self._check(sub_request)
+            if error:
+                return {"status": 400, "body": {"detail": error}}
+            async with semaphore:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    return {"status": 504, "body": {"detail": "Batch time budget exhausted"}}
+                if sub_request["method"].upper() not in SAFE_METHODS:
+                    return await self._run_to_completion(sub_request, forwarded, remaining)
+                try:
+                    return await asyncio.wait_for(self._dispatch(sub_request, forwarded), remaining)
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    return {"status": 504, "body": {"detail": "Batch time budget exhausted"}}
+                except Exception as e:
+                    logger.warning(f"Batch sub-request {sub_request.get('path')} failed: {e}")
+                    return {"status": 500, "body": {"detail": str(e)}}
+
+        return await asyncio.gather(*(run(sub_request) for sub_request in requests))
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "max_requests": self.max_requests,
+            "max_concurrency": self.max_concurrency,
+            "time_budget": self.time_budget,
+            "batches": self.batches,
+            "sub_requests": self.sub_requests,
+            "timeouts": self.timeouts,
+            "pending_results": self.pending_results,
+            "still_running": len(self._pending)
+        }
+
+    async def close(self):
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _run_to_completion(self, sub_request: Dict[str, Any], headers: Dict[str, str],
+                                 remaining: float) -> Dict[str, Any]:
+        """Wait up to the budget for a mutating sub-request, shielded so it is never cut off mid-write"""
+        task = asyncio.create_task(self._dispatch(sub_request, headers))
+        self._pending.add(task)
+        task.add_done_callback(self._finished)
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), remaining)
+        except asyncio.TimeoutError:
+            self.pending_results += 1
+            return {"status": 202, "body": {
+                "detail": "Still running after the batch time budget; check its effect before retrying",
+                "pending": True
+            }}
+        except Exception as e:
+            # Logged by _finished
+            return {"status": 500, "body": {"detail": str(e)}}
+
+    def _finished(self, task: asyncio.Task):
+        self._pending.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Batch sub-request failed: {task.exception()}")
+
+    def _check(self, sub_request: Dict[str, Any]) -> Optional[str]:
+        path = sub_request["path"]
+        if sub_request["method"].upper() not in BATCH_METHODS:
+            return f"Method {sub_request['method']} is not allowed in a batch"
+        if not path.startswith("/api/"):
+            return "Only /api/ paths can be batched"
+        if path.split("?", 1)[0].rstrip("/") == self.path:
+            return "Batches cannot be nested"
+        return None
+
+    async def _dispatch(self, sub_request: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+        if self._client is None:
+            # raise_app_exceptions=False turns an unhandled error into a 500 result, like a real request
+            transport = httpx.ASGITransport(app=self.app, raise_app_exceptions=False)
+            self._client = httpx.AsyncClient(transport=transport, base_url="http://batch")
+
+        body = sub_request.get("body")
+        content = None
+        if body is not None:
+            content = orjson.dumps(body)
+            headers = {**headers, "content-type": "application/json"}
+        response = await self._client.request(sub_request["method"].upper(), sub_request["path"],
+                                              headers=headers, content=content)
+        if "json" in response.headers.get("content-type", ""):
+            result_body = orjson.loads(response.content) if response.content else None
+        else:
+            result_body = response.text
+        return {"status": response.status_code, "body": result_body}
@@ -0,0 +1,209 @@
+"""
+Time-Series Layout
+Opt-in MongoDB time-series layout for the append-only event streams. A time-series
+collection groups each metaField value's events into compressed buckets, so a wallet's
+transactions or bets over a time range are read from a few contiguous buckets instead of
+documents scattered by insertion order
+
+Bucketing is tuned from the measured write rate: a bucket closes at 1000 events, so the
+span is chosen to fill buckets for a busy wallet (p90 of per-wallet rates)
+without spanning so long that range reads unpack mostly unwanted events
+
+The migration renames the regular collection to <name>_legacy, creates the time-series
+collection under the original name and copies the legacy documents across newest first,
+so the recent windows the app queries are complete first. The copy is resumable and the
+legacy collection is kept until dropped by hand. Until the copy finishes, reads of the
+stream (history pages, running_total seeding) only see what the new collection holds.
+An insert landing between the rename and the create would recreate the collection as a
+regular one; cutover detects that and fails rather than copy into the wrong layout, so
+run it while the stream's writers are quiet.
+Requires MongoDB 6.3+ for tuned bucketing (older servers fall back to a granularity) and
+7.0+ for the time-filtered deletes the bet archive issues
+"""
+
+import time
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+from pymongo import DESCENDING
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from services.index_registry import INDEX_REGISTRY
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = "timeseries_migrations"
+
+BUCKET_MEASUREMENTS = 1000
+# Upper bounds of the fixed granularities' bucket spans
+GRANULARITY_SPANS = [("seconds", 3600), ("minutes", 86400), ("hours", 30 * 86400)]
+MAX_BUCKET_SPAN = 30 * 86400
+COPY_BATCH = 2000
+
+@dataclass(frozen=True)
+class TimeSeriesStream:
+    collection: str
+    meta_field: str
+    time_field: str = "timestamp"
+
+TIMESERIES_STREAMS: Dict[str, TimeSeriesStream] = {
+    "transactions": TimeSeriesStream("transactions", "wallet_address"),
+    "bets": TimeSeriesStream("game_bets", "wallet_address"),
+    "price_ticks": TimeSeriesStream("price_ticks", "currency"),
+}
+
+def recommend_bucketing(events_per_second: float) -> Dict[str, Any]:
+    """Bucket span that fills a bucket for one metaField value writing at this rate"""
+    span = MAX_BUCKET_SPAN if events_per_second <= 0 else int(BUCKET_MEASUREMENTS / events_per_second)
+    span = max(1, min(span, MAX_BUCKET_SPAN))
+    granularity = next((name for name, limit in GRANULARITY_SPANS if span <= limit), "hours")
+    return {"bucket_span_seconds": span, "granularity": granularity}
+
+async def server_version(db) -> tuple:
+    info = await db.client.server_info()
+    return tuple(info.get("versionArray", [0, 0])[:2])
+
+async def is_timeseries(db, name: str) -> bool:
+    collections = await db.list_collections(filter={"name": name}).to_list(1)
+    return bool(collections) and collections[0].get("type") == "timeseries"
+
+async def measure_write_rate(db, stream: TimeSeriesStream, days: int = 7) -> Dict[str, Any]:
+    """Events per second over the last days, overall and per metaField value (p50/p90/max)"""
+    since = datetime.utcnow() - timedelta(days=days)
+    window = days * 86400
+    counts = await db[stream.collection].aggregate([
+        {"$match": {stream.time_field: {"$gte": since}}},
+        {"$group": {"_id": f"${stream.meta_field}", "count": {"$sum": 1}}},
+        {"$sort": {"count": 1}}
+    ], allowDiskUse=True).to_list(None)
+
+    per_meta = [row["count"] / window for row in counts]
+
+    def percentile(fraction: float) -> float:
+        return per_meta[min(len(per_meta) - 1, int(len(per_meta) * fraction))] if per_meta else 0.0
+
+    return {
+        "days": days,
+        "events": sum(row["count"] for row in counts),
+        "meta_values": len(counts),
+        "overall_per_second": sum(per_meta),
+        "per_meta_p50": percentile(0.5),
+        "per_meta_p90": percentile(0.9),
+        "per_meta_max": per_meta[-1] if per_meta else 0.0
+    }
+
+async def timeseries_options(db, stream: TimeSeriesStream, rate: Dict[str, Any]) -> Dict[str, Any]:
+    bucketing = recommend_bucketing(rate["per_meta_p90"])
+    options = {"timeField": stream.time_field, "metaField": stream.meta_field}
+    if await server_version(db) >= (6, 3):
+        options["bucketMaxSpanSeconds"] = bucketing["bucket_span_seconds"]
+        options["bucketRoundingSeconds"] = bucketing["bucket_span_seconds"]
+    else:
+        options["granularity"] = bucketing["granularity"]
+    return options
+
+async def ensure_timeseries(db, stream: TimeSeriesStream, options: Dict[str, Any] = None) -> bool:
+    """Create the stream's time-series collection unless a collection of that name exists; True if created"""
+    if await db.list_collections(filter={"name": stream.collection}).to_list(1):
+        return False
+    options = options or {"timeField": stream.time_field, "metaField": stream.meta_field, "granularity": "minutes"}
+    await db.create_collection(stream.collection, timeseries=options)
+    await _apply_indexes(db, stream.collection)
+    logger.info(f"Created time-series collection {stream.collection}: {options}")
+    return True
+
+class TimeSeriesMigration:
+    """Moves one regular collection onto the time-series layout"""
+
+    def __init__(self, db, stream: TimeSeriesStream):
+        self.db = db
+        self.stream = stream
+        self.legacy = f"{stream.collection}_legacy"
+
+    async def progress(self) -> Optional[Dict[str, Any]]:
+        return await self.db[MIGRATIONS].find_one({"_id": self.stream.collection})
+
+    async def cutover(self, options: Dict[str, Any]):
+        """Swap the regular collection for an empty time-series one; inserts continue into the new layout"""
+        if await is_timeseries(self.db, self.stream.collection):
+            return
+        await self.db[MIGRATIONS].update_one(
+            {"_id": self.stream.collection},
+            {"$setOnInsert": {"options": options, "copied": 0, "skipped": 0, "started_at": datetime.utcnow()}},
+            upsert=True
+        )
+        if await self.db.list_collections(filter={"name": self.stream.collection}).to_list(1):
+            await self.db[self.stream.collection].rename(self.legacy)
+        await ensure_timeseries(self.db, self.stream, options)
+
+        if not await is_timeseries(self.db, self.stream.collection):
+            # An insert won the race between rename and create and made a regular collection
+            stray = await self.db[self.stream.collection].estimated_document_count()
+            error = (f"{self.stream.collection} was recreated as a regular collection by an insert during "
+                     f"cutover ({stray} documents). Move its documents into {self.legacy}, drop it and rerun "
+                     f"the migration while writers are paused")
+            await self.db[MIGRATIONS].update_one(
+                {"_id": self.stream.collection}, {"$set": {"failed_at": datetime.utcnow(), "error": error}}
+            )
+            raise RuntimeError(error)
+        await self.db[MIGRATIONS].update_one({"_id": self.stream.collection}, {"$unset": {"failed_at": "", "error": ""}})
+
+    async def copy(self, batch_size: int = COPY_BATCH) -> Dict[str, Any]:
+        """
+        Copy legacy documents into the time-series collection, newest _id first
+        Progress is saved after each batch. Time-series _ids aren't unique, so the first batch
+        of every run skips documents an interrupted run already inserted
+        """
+        state = await self.progress() or {}
+        query = {"_id": {"$lt": state["last_id"]}} if state.get("last_id") is not None else {}
+        cursor = self.db[self.legacy].find(query).sort("_id", DESCENDING).batch_size(batch_size)
+        started = time.perf_counter()
+        copied, skipped, first_batch = 0, 0, True
+
+        batch: List[Dict[str, Any]] = []
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                inserted, dropped = await self._copy_batch(batch, first_batch)
+                copied, skipped, first_batch = copied + inserted, skipped + dropped, False
+                batch = []
+        if batch:
+            inserted, dropped = await self._copy_batch(batch, first_batch)
+            copied, skipped = copied + inserted, skipped + dropped
+
+        await self.db[MIGRATIONS].update_one(
+            {"_id": self.stream.collection}, {"$set": {"completed_at": datetime.utcnow()}}
+        )
+        return {"copied": copied, "skipped": skipped, "seconds": time.perf_counter() - started}
+
+    async def _copy_batch(self, batch: List[Dict[str, Any]], check_existing: bool):
+        target = self.db[self.stream.collection]
+        # Time-series documents need a real date in the time field; others stay in the legacy collection
+        docs = [doc for doc in batch if isinstance(doc.get(self.stream.time_field), datetime)]
+        if check_existing:
+            present = {doc["_id"] async for doc in target.find({"_id": {"$in": [doc["_id"] for doc in docs]}}, {"_id": 1})}
+            docs = [doc for doc in docs if doc["_id"] not in present]
+        if docs:
+            try:
+                await target.insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                logger.error(f"{len(e.details.get('writeErrors', []))} documents failed to copy into "
+                             f"{self.stream.collection}: {e.details['writeErrors'][0]['errmsg']}")
+                raise
+
+        skipped = sum(1 for doc in batch if not isinstance(doc.get(self.stream.time_field), datetime))
+        await self.db[MIGRATIONS].update_one(
+            {"_id": self.stream.collection},
+            {"$set": {"last_id": batch[-1]["_id"]}, "$inc": {"copied": len(docs), "skipped": skipped}}
+        )
+        return len(docs), skipped
+
+async def _apply_indexes(db, name: str):
+    """Registry indexes one at a time: one the time-series layout rejects shouldn't block the rest"""
+    for index in INDEX_REGISTRY.get(name, []):
+        try:
+            await db[name].create_indexes([index])
+        except OperationFailure as e:
+            logger.warning(f"Skipped index {index.document['name']} on time-series {name}: {e}")
@@ -0,0 +1,361 @@
+"""
+Write-Behind Buffer
+Collects documents for one collection and inserts them with insert_many every
+flush interval or max_batch documents, so a request only pays for a local append
+instead of its own MongoDB round-trip
+
+Every document is appended to a local spool before add() returns, so nothing accepted
+is lost when the process dies: a process crash loses nothing (each append reaches the
+kernel), a host crash loses at most one flush interval (segments are fsynced when they
+rotate, or on every append with WRITE_BEHIND_FSYNC=always)
+
+    {spool_dir}/{collection}-{host}-{pid}.lock          held with flock while the process lives
+    {spool_dir}/{collection}-{host}-{pid}.{seq}.spool   BSON documents back to back
+
+A segment is deleted once its batch is in MongoDB. On start, segments whose lock nobody
+holds belong to a dead process and are replayed; _ids are assigned before spooling, so
+documents that did reach MongoDB are recognised and skipped
+
+Transient failures (network, elections, write concern) keep the batch and retry it with
+backoff. Documents MongoDB rejects for good (validation, time-series constraints) are
+moved to write_behind_quarantine, found by splitting a batch that fails as a whole, so
+one bad document can't hold up every later batch. When the spool is full, callers wait
+at most WRITE_BEHIND_MAX_WAIT_MS and then get WriteBehindOverloaded
+
+    write_behind_quarantine   {collection, document, code, error, quarantined_at}
+"""
+
+import os
+import time
+import fcntl
+import socket
+import asyncio
+import logging
+import statistics
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+import bson
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, ExecutionTimeout, OperationFailure, WriteConcernError
+
+logger = logging.getLogger(__name__)
+
+QUARANTINE = "write_behind_quarantine"
+DUPLICATE_KEY = 11000
+
+class WriteBehindOverloaded(Exception):
+    """Raised when the spool stays full past the wait limit; retry_after is a suggested wait in seconds"""
+
+    def __init__(self, collection: str, retry_after: int = 1):
+        super().__init__(f"Write-behind spool for {collection} is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+def _transient(error: OperationFailure) -> bool:
+    """Whether a failed write is worth retrying as is rather than splitting and quarantining"""
+    return isinstance(error, (ExecutionTimeout, WriteConcernError)) or error.has_error_label("RetryableWriteError")
+
+class WriteBehindBuffer:
+    """Spooled, batched inserts for one collection"""
+
+    def __init__(self, db, collection: str, spool_dir: str = None, flush_interval_ms: int = None,
+                 max_batch: int = None, max_pending: int = None, fsync_always: bool = None,
+                 max_wait_ms: int = None):
+        self.db = db
+        self.collection = collection
+        self.spool_dir = Path(spool_dir or os.getenv("WRITE_BEHIND_SPOOL_DIR", "/app/data/spool"))
+        self.flush_interval = (flush_interval_ms or int(os.getenv("WRITE_BEHIND_FLUSH_MS", "50"))) / 1000
+        self.max_batch = max_batch or int(os.getenv("WRITE_BEHIND_MAX_BATCH", "500"))
+        self.max_pending = max_pending or int(os.getenv("WRITE_BEHIND_MAX_PENDING", "20000"))
+        self.max_wait = (max_wait_ms or int(os.getenv("WRITE_BEHIND_MAX_WAIT_MS", "2000"))) / 1000
+        self.fsync_always = fsync_always if fsync_always is not None else \
+            os.getenv("WRITE_BEHIND_FSYNC", "rotate").lower() == "always"
+
+        self.name = f"{collection}-{socket.gethostname()}-{os.getpid()}"
+        self._lock_file = None
+        self._segment = None
+        self._segment_path: Optional[Path] = None
+        self._seq = 0
+        self._pending: List[Dict[str, Any]] = []
+        # Rotated segments not yet in MongoDB, inserted oldest first
+        self._retained: List[Tuple[Path, List[Dict[str, Any]]]] = []
+        self._attempted: set = set()
+        self._backoff = 0.0
+        self._flush_lock = asyncio.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._drained: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.flushes = 0
+        self.flush_failures = 0
+        self.documents_flushed = 0
+        self.documents_replayed = 0
+        self.documents_quarantined = 0
+        self.overloaded = 0
+        self.flusher_errors = 0
+        self.last_batch = 0
+        self._flush_ms = deque(maxlen=256)
+        self._batch_sizes = deque(maxlen=256)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def depth(self) -> int:
+        """Documents accepted but not yet confirmed in MongoDB"""
+        return len(self._pending) + sum(len(docs) for _, docs in self._retained)
+
+    async def start(self):
+        """Replay dead processes' spools, then open this process's spool and start flushing"""
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self._lock_file = open(self.spool_dir / f"{self.name}.lock", "a")
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+        await self._replay_orphans()
+
+        self._open_segment()
+        self._wakeup = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        self._task.add_done_callback(self._flusher_done)
+        logger.info(f"Write-behind buffer for {self.collection} spooling to {self.spool_dir}")
+
+    async def stop(self):
+        """Flush what is buffered; anything MongoDB won't take stays spooled for the next start"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+        if self._segment:
+            self._segment.close()
+            self._segment = None
+            if self._segment_path.stat().st_size == 0:
+                self._segment_path.unlink()
+        if self._lock_file:
+            if not self._retained:
+                (self.spool_dir / f"{self.name}.lock").unlink(missing_ok=True)
+            self._lock_file.close()
+            self._lock_file = None
+
+    async def wait_for_capacity(self):
+        """
+        Back-pressure: don't let an unreachable MongoDB grow the spool without bound
+        Waits up to max_wait for room, then raises WriteBehindOverloaded; call it before
+        changing anything the spooled document depends on
+        """
+        if not self.running or self.depth() < self.max_pending:
+            return
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while self.depth() >= self.max_pending:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                self.overloaded += 1
+                raise WriteBehindOverloaded(self.collection, retry_after=max(1, round(self._backoff)))
+            self._drained.clear()
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._drained.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def add(self, document: Dict[str, Any], wait: bool = True):
+        """
+        Spool a document for the next batch; inserts directly when the buffer isn't running
+        Pass wait=False when wait_for_capacity() already ran before changes that can't be undone
+        """
+        document.setdefault("_id", ObjectId())
+        if not self.running:
+            await self.db[self.collection].insert_one(document)
+            return
+
+        if wait:
+            await self.wait_for_capacity()
+        if self._segment is None:
+            # The last rotation couldn't open a new segment
+            self._open_segment()
+        self._segment.write(bson.encode(document))
+        self._segment.flush()
+        if self.fsync_always:
+            os.fsync(self._segment.fileno())
+        self._pending.append(document)
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+
+    async def flush(self):
+        """Rotate the active segment and insert everything spooled so far"""
+        async with self._flush_lock:
+            if self._pending and self._segment:
+                os.fsync(self._segment.fileno())
+                self._segment.close()
+                self._retained.append((self._segment_path, self._pending))
+                self._pending = []
+                self._segment = None
+                self._open_segment()
+
+            while self._retained:
+                path, docs = self._retained[0]
+                started = time.perf_counter()
+                try:
+                    # A failed attempt may have inserted part of the batch
+                    await self._write_batch(docs, retry=path in self._attempted)
+                except Exception as e:
+                    # The segment stays on disk and in the queue; the next flush retries it
+                    self._attempted.add(path)
+                    self._backoff = min(max(self._backoff * 2, 0.5), 10.0)
+                    self.flush_failures += 1
+                    logger.error(f"Write-behind flush of {len(docs)} {self.collection} documents failed: {e}")
+                    break
+
+                self._backoff = 0.0
+                self._retained.pop(0)
+                self._attempted.discard(path)
+                path.unlink(missing_ok=True)
+                self.flushes += 1
+                self.documents_flushed += len(docs)
+                self.last_batch = len(docs)
+                self._batch_sizes.append(len(docs))
+                self._flush_ms.append((time.perf_counter() - started) * 1000)
+
+            if self._drained and self.depth() < self.max_pending:
+                self._drained.set()
+
+    def status(self) -> Dict[str, Any]:
+        flush_ms = sorted(self._flush_ms)
+        spool_bytes = sum(path.stat().st_size for path, _ in self._retained if path.exists())
+        if self._segment:
+            spool_bytes += self._segment.tell()
+        return {
+            "running": self.running,
+            "spool_depth": self.depth(),
+            "spool_bytes": spool_bytes,
+            "retained_segments": len(self._retained),
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+            "documents_flushed": self.documents_flushed,
+            "documents_replayed": self.documents_replayed,
+            "documents_quarantined": self.documents_quarantined,
+            "overloaded": self.overloaded,
+            "flusher_errors": self.flusher_errors,
+            "last_batch": self.last_batch,
+            "avg_batch": round(statistics.mean(self._batch_sizes), 1) if self._batch_sizes else 0,
+            "flush_ms_p50": round(statistics.median(flush_ms), 2) if flush_ms else 0.0,
+            "flush_ms_p95": round(flush_ms[int(len(flush_ms) * 0.95) - 1], 2) if flush_ms else 0.0,
+            "flush_ms_max": round(flush_ms[-1], 2) if flush_ms else 0.0
+        }
+
+    async def _run(self):
+        while True:
+            if self._backoff:
+                # MongoDB is refusing batches; keep spooling and retry less often
+                await asyncio.sleep(self._backoff)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                # Rotating the segment failed (disk full, fsync error); keep the flusher alive
+                self.flusher_errors += 1
+                self._backoff = min(max(self._backoff * 2, 0.5), 10.0)
+                logger.error(f"Write-behind flusher for {self.collection} failed: {e}")
+
+    def _flusher_done(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            # running is now False, so add() inserts directly and status shows the buffer down
+            logger.error(f"Write-behind flusher for {self.collection} stopped: {task.exception()}")
+
+    async def _write_batch(self, docs: List[Dict[str, Any]], retry: bool = False):
+        """
+        Insert a batch, quarantining documents MongoDB rejects for good; raises on transient
+        failures so the caller keeps the batch. With retry, documents already present are skipped
+        """
+        collection = self.db[self.collection]
+        if retry:
+            present = {doc["_id"] async for doc in collection.find({"_id": {"$in": [doc["_id"] for doc in docs]}}, {"_id": 1})}
+            docs = [doc for doc in docs if doc["_id"] not in present]
+        if not docs:
+            return
+
+        try:
+            await collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            if e.details.get("writeConcernErrors"):
+                raise
+            # Unordered: everything but these was inserted. Duplicates were already in MongoDB
+            rejected = [(docs[error["index"]], error["code"], error["errmsg"])
+                        for error in e.details.get("writeErrors", []) if error["code"] != DUPLICATE_KEY]
+            if rejected:
+                await self._quarantine(rejected)
+        except OperationFailure as e:
+            if _transient(e):
+                raise
+            if len(docs) == 1:
+                await self._quarantine([(docs[0], e.code, str(e))])
+                return
+            # The batch failed as a whole; halve it until the offending documents are isolated
+            middle = len(docs) // 2
+            await self._write_batch(docs[:middle], retry=True)
+            await self._write_batch(docs[middle:], retry=True)
+
+    async def _quarantine(self, rejected: List[Tuple[Dict[str, Any], Any, str]]):
+        """Park documents MongoDB won't accept, wrapped so the quarantine itself can't reject them"""
+        now = datetime.utcnow()
+        await self.db[QUARANTINE].insert_many([
+            {"collection": self.collection, "document": doc, "code": code, "error": error, "quarantined_at": now}
+            for doc, code, error in rejected
+        ])
+        self.documents_quarantined += len(rejected)
+        logger.error(f"Quarantined {len(rejected)} {self.collection} documents MongoDB rejected: {rejected[0][2]}")
+
+    async def _replay_orphans(self):
+        for lock_path in self.spool_dir.glob(f"{self.collection}-*.lock"):
+            if lock_path.stem == self.name:
+                # Same host and pid as a dead predecessor (pids repeat in containers); we hold its lock
+                await self._replay_segments(lock_path.stem)
+                continue
+            with open(lock_path, "a") as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # Owner is alive
+                await self._replay_segments(lock_path.stem)
+                lock_path.unlink(missing_ok=True)
+
+    async def _replay_segments(self, name: str):
+        def seq(path: Path) -> int:
+            return int(path.name[len(name) + 1:-len(".spool")])
+
+        segments = sorted(self.spool_dir.glob(f"{name}.*.spool"), key=seq)
+        for segment in segments:
+            docs = self._read_segment(segment)
+            if docs:
+                await self._write_batch(docs, retry=True)
+            segment.unlink()
+            self.documents_replayed += len(docs)
+        if segments:
+            logger.info(f"Replayed {len(segments)} spool segments left by {name}")
+
+    def _read_segment(self, path: Path) -> List[Dict[str, Any]]:
+        data = path.read_bytes()
+        docs, offset = [], 0
+        while offset + 4 <= len(data):
+            length = int.from_bytes(data[offset:offset + 4], "little")
+            if length < 5 or offset + length > len(data):
+                break
+            docs.append(bson.decode(data[offset:offset + length]))
+            offset += length
+        if offset < len(data):
+            # The process died mid-append; that document was never acknowledged
+            logger.warning(f"Ignoring {len(data) - offset} trailing bytes of a partial document in {path.name}")
+        return docs
+
+    def _open_segment(self):
+        self._seq += 1
+        self._segment_path = self.spool_dir / f"{self.name}.{self._seq}.spool"
+        self._segment = open(self._segment_path, "ab")
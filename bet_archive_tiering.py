@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Bet archive tiering - moves game_bets older than the hot window into day-partitioned
+Parquet files and shows what the archive holds.
+
+    python bet_archive_tiering.py run [--hot-days N] [--max-days N]
+    python bet_archive_tiering.py status
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+from pathlib import Path
+
+# Add backend directory to path
+backend_dir = Path(__file__).parent / "backend"
+sys.path.append(str(backend_dir))
+
+# Load environment variables
+load_dotenv(backend_dir / '.env')
+
+from archive.bet_archive import bet_archive
+from archive.tiering import BetTiering, HOT_DAYS
+from services.index_registry import ensure_indexes
+
+async def main(args):
+    """Run the chosen tiering command"""
+
+    # Connect to MongoDB
+    mongo_url = os.environ['MONGO_URL']
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[os.environ['DB_NAME']]
+
+    print(f"🧊 BET ARCHIVE {args.command.upper()}")
+    print("=" * 70)
+    started = time.perf_counter()
+
+    if args.command == "run":
+        await ensure_indexes(db)
+        tiering = BetTiering(db, hot_days=args.hot_days)
+        print(f"Archiving bets before {tiering.cutoff().date()} into {bet_archive.root}")
+        report = await tiering.run(max_days=args.max_days)
+        print(f"✅ {report['days']} days archived ({report['archived']} bets), "
+              f"{report['deleted']} bets removed from MongoDB")
+        print(f"   Hot tier starts at {report['horizon'] or '-'}")
+
+    elif args.command == "status":
+        horizon = bet_archive.horizon()
+        hot = await db.game_bets.estimated_document_count()
+        files = sorted(bet_archive.root.glob("date=*/part-0.parquet"))
+        size = sum(path.stat().st_size for path in files)
+        print(f"   Horizon:       {horizon.isoformat() if horizon else 'nothing archived yet'}")
+        print(f"   Day files:     {len(files)} ({size / 1024 / 1024:,.1f} MB)")
+        if files:
+            print(f"   Oldest/newest: {files[0].parent.name[5:]} / {files[-1].parent.name[5:]}")
+        print(f"   Hot bets:      {hot:,}")
+
+    print(f"\n⏱️ Done in {time.perf_counter() - started:.2f}s")
+    client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="game_bets hot/cold tiering")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    run_parser = subcommands.add_parser("run", help="Archive days older than the hot window")
+    run_parser.add_argument("--hot-days", type=int, default=HOT_DAYS, help="Days of bets kept in MongoDB")
+    run_parser.add_argument("--max-days", type=int, default=None, help="Stop after archiving this many days")
+    subcommands.add_parser("status", help="Show the archive horizon and size")
+    asyncio.run(main(parser.parse_args()))
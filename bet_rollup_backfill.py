@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Bet rollup backfill - rebuilds the hourly (wallet, game_type, currency) rollups for every hour
+before live rollup maintenance began, from game_bets and the bet archive, and queries them.
+
+    python bet_rollup_backfill.py backfill                  # safe to rerun while bets settle
+    python bet_rollup_backfill.py totals <wallet> [--since 2026-01-01] [--until 2026-02-01] [--by game_type]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+from datetime import datetime
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+from pathlib import Path
+
+# Add backend directory to path
+backend_dir = Path(__file__).parent / "backend"
+sys.path.append(str(backend_dir))
+
+# Load environment variables
+load_dotenv(backend_dir / '.env')
+
+from games.rollups import BetRollups
+from services.index_registry import ensure_indexes
+from services.amounts import to_float
+
+async def main(args):
+    """Run the chosen rollup command"""
+
+    # Connect to MongoDB
+    mongo_url = os.environ['MONGO_URL']
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[os.environ['DB_NAME']]
+
+    rollups = BetRollups(db)
+
+    print(f"📈 BET ROLLUPS {args.command.upper()}")
+    print("=" * 70)
+    started = time.perf_counter()
+
+    if args.command == "backfill":
+        # $merge needs the unique rollup index in place
+        await ensure_indexes(db)
+        result = await rollups.backfill()
+        print(f"✅ {result['rollups']:,} hourly rollups before {result['live_since']:%Y-%m-%d %H:%M} UTC "
+              f"({result['archived_rollups']:,} from the archive) in {result['seconds']:.1f}s")
+
+    elif args.command == "totals":
+        if not await rollups.ready():
+            print("⚠️ Backfill has not run yet - totals only cover hours since live rollups began")
+        group = [field.strip() for field in args.by.split(",")]
+        rows = await rollups.totals(args.wallet, args.since, args.until, by=group)
+        for row in sorted(rows, key=lambda row: tuple(str(row[field]) for field in group)):
+            label = " ".join(str(row[field]) for field in group)
+            currency = row.get("currency")
+            amounts = (f"wagered {to_float(row['wagered_minor'], currency):,.2f}  "
+                       f"payout {to_float(row['payout_minor'], currency):,.2f}  "
+                       f"saved {to_float(row['lost_minor'], currency):,.2f}") if currency else ""
+            print(f"   {label:<40} {row['bets']:>8,} bets  {row['wins']:>7,} W  {row['losses']:>7,} L  {amounts}")
+        if not rows:
+            print("   No bets in range")
+
+    print(f"\n⏱️ Done in {time.perf_counter() - started:.2f}s")
+    client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hourly bet rollups")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("backfill", help="Rebuild rollups for every hour before live maintenance began")
+    totals_parser = subcommands.add_parser("totals", help="Sum a wallet's rollups over a time range")
+    totals_parser.add_argument("wallet")
+    totals_parser.add_argument("--since", type=datetime.fromisoformat, default=None)
+    totals_parser.add_argument("--until", type=datetime.fromisoformat, default=None)
+    totals_parser.add_argument("--by", default="currency", help="Comma-separated: game_type, currency, hour")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bet throughput while CoinPayments is slow
+Compares a simulated bet loop with no CoinPayments traffic, with slow calls through the
+pooled async client, and with the old blocking requests.post behaviour (emulated)
+"""
+
+import os
+import sys
+import time
+import asyncio
+from pathlib import Path
+
+import httpx
+
+# Add backend directory to path
+backend_dir = Path(__file__).parent / "backend"
+sys.path.append(str(backend_dir))
+
+# Dummy credentials - requests never leave the process
+os.environ.setdefault("COINPAYMENTS_PUBLIC_KEY", "benchmark_public")
+os.environ.setdefault("COINPAYMENTS_PRIVATE_KEY", "benchmark_private")
+
+from services.coinpayments_service import CoinPaymentsService
+
+SLOW_API_SECONDS = 2.0
+PHASE_SECONDS = 5.0
+CONCURRENT_CALLS = 50
+
+async def slow_coinpayments_handler(request: httpx.Request) -> httpx.Response:
+    """Fake CoinPayments endpoint that takes SLOW_API_SECONDS to answer"""
+    await asyncio.sleep(SLOW_API_SECONDS)
+    return httpx.Response(200, json={"error": "ok", "result": {"address": "DBenchmarkAddress"}})
+
+async def bet_loop(duration: float) -> int:
+    """Simulated bet handler: a tiny await per bet, counts how many complete"""
+    bets = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(0.001)
+        bets += 1
+    return bets
+
+async def run_phase(name: str, background) -> None:
+    tasks = [asyncio.create_task(background()) for _ in range(CONCURRENT_CALLS)] if background else []
+    bets = await bet_loop(PHASE_SECONDS)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    print(f"{name:<40} {bets / PHASE_SECONDS:>10.0f} bets/s")
+
+async def main():
+    service = CoinPaymentsService()
+    service._client = httpx.AsyncClient(transport=httpx.MockTransport(slow_coinpayments_handler))
+    service._get_client()
+
+    async def pooled_call():
+        while True:
+            await service.generate_deposit_address("benchmark_user", "DOGE")
+
+    async def blocking_call():
+        # What the old synchronous requests.post did to the event loop
+        while True:
+            time.sleep(SLOW_API_SECONDS / CONCURRENT_CALLS)
+            await asyncio.sleep(0)
+
+    print(f"📊 CoinPayments latency {SLOW_API_SECONDS}s, {CONCURRENT_CALLS} concurrent calls, {PHASE_SECONDS}s per phase")
+    print("=" * 60)
+    await run_phase("No CoinPayments traffic", None)
+    await run_phase("Slow CoinPayments (pooled async client)", pooled_call)
+    await run_phase("Slow CoinPayments (blocking, old)", blocking_call)
+
+    await service.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Index usage report - applies the index registry and shows $indexStats plus collection scans
+seen by the profiler. Pass --enable-profiler to turn on slow-op profiling first.
+"""
+
+import os
+import sys
+import asyncio
+import argparse
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+from pathlib import Path
+
+# Add backend directory to path
+backend_dir = Path(__file__).parent / "backend"
+sys.path.append(str(backend_dir))
+
+# Load environment variables
+load_dotenv(backend_dir / '.env')
+
+from services.index_registry import ensure_indexes, index_usage_report
+
+async def main(args):
+    """Print index usage for every registered collection"""
+
+    # Connect to MongoDB
+    mongo_url = os.environ['MONGO_URL']
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[os.environ['DB_NAME']]
+
+    if args.ensure:
+        print("🔧 Applying index registry...")
+        results = await ensure_indexes(db)
+        for collection, result in results.items():
+            status = "✅" if result["success"] else f"❌ {result['error']}"
+            print(f"   {collection}: {status}")
+
+    if args.enable_profiler:
+        await db.command({"profile": 1, "slowms": args.slowms})
+        print(f"🔍 Profiler enabled (slowms={args.slowms}) - rerun later to see collection scans")
+
+    report = await index_usage_report(db)
+
+    print("\n📊 INDEX USAGE ($indexStats)")
+    print("=" * 80)
+    for collection, stats in report["collections"].items():
+        print(f"\n{collection}")
+        if isinstance(stats, dict):
+            print(f"   ❌ {stats['error']}")
+            continue
+        for stat in sorted(stats, key=lambda s: s["ops"]):
+            flag = "⚠️ unused" if stat["ops"] == 0 and stat["name"] != "_id_" else ""
+            print(f"   {stat['name']:<36} ops={stat['ops']:<10} since {stat['since']} {flag}")
+
+    print("\n🐢 COLLECTION SCANS (profiler)")
+    print("=" * 80)
+    if report["profiler"]["level"] == 0:
+        print("   Profiler is off - run with --enable-profiler to collect collection scans")
+    elif not report["collection_scans"]:
+        print("   ✅ No collection scans recorded")
+    for scan in report["collection_scans"]:
+        print(f"   {scan['namespace']} {scan['op']} on {scan['filter_fields']}: "
+              f"{scan['count']}x, max {scan['max_millis']}ms, {scan['docs_examined']} docs examined")
+
+    client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ensure", action="store_true", help="apply the index registry before reporting")
+    parser.add_argument("--enable-profiler", action="store_true", help="enable the slow-op profiler")
+    parser.add_argument("--slowms", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Ledger replay tool - opening balances, checkpoints, verification and point-in-time balances
+for the double-entry ledger.
+
+    python ledger_replay.py open                      # carry users' balances into the ledger (idempotent)
+    python ledger_replay.py checkpoint                # checkpoint every sealed entry
+    python ledger_replay.py verify                    # replay the journal and diff materialized balances
+    python ledger_replay.py rebuild                   # rewrite materialized balances (stop postings first)
+    python ledger_replay.py balance <wallet> [--at-seq N]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+from pathlib import Path
+
+# Add backend directory to path
+backend_dir = Path(__file__).parent / "backend"
+sys.path.append(str(backend_dir))
+
+# Load environment variables
+load_dotenv(backend_dir / '.env')
+
+from ledger.journal import Ledger
+from ledger.checkpoints import LedgerCheckpoints
+from ledger.postings import BALANCE_BUCKETS, opening_legs, wallet_account
+from services.index_registry import ensure_indexes
+from services.amounts import balances_to_float
+
+OPENING_BATCH = 500
+
+async def open_balances(db, ledger: Ledger):
+    """Post one opening entry per user; the reference makes reruns skip users already opened"""
+    projection = {"wallet_address": 1, **{field: 1 for field in BALANCE_BUCKETS.values()}}
+    postings, opened, skipped = [], 0, 0
+
+    async def flush():
+        nonlocal opened, skipped
+        posted = await ledger.post_many(postings)
+        opened += len(posted)
+        skipped += len(postings) - len(posted)
+        postings.clear()
+
+    async for user in db.users.find({}, projection):
+        legs = opening_legs(user["wallet_address"], user)
+        if not legs:
+            continue
+        postings.append({
+            "kind": "opening_balance",
+            "wallet_address": user["wallet_address"],
+            "reference": f"opening:{user['wallet_address']}",
+            "legs": legs
+        })
+        if len(postings) >= OPENING_BATCH:
+            await flush()
+    if postings:
+        await flush()
+
+    print(f"✅ Opened {opened} wallets ({skipped} already in the ledger)")
+
+async def main(args):
+    """Run the chosen ledger command"""
+
+    # Connect to MongoDB
+    mongo_url = os.environ['MONGO_URL']
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[os.environ['DB_NAME']]
+
+    ledger = Ledger(db, client)
+    checkpoints = LedgerCheckpoints(db)
+    await ensure_indexes(db)
+
+    print(f"📒 LEDGER {args.command.upper()}")
+    print("=" * 70)
+    started = time.perf_counter()
+
+    if args.command == "open":
+        await open_balances(db, ledger)
+
+    elif args.command == "checkpoint":
+        checkpoint = await checkpoints.create()
+        if checkpoint is None:
+            print("ℹ️ Journal is empty - nothing to checkpoint")
+        else:
+            print(f"✅ Checkpoint at seq {checkpoint['seq']}: {checkpoint['accounts']} accounts, "
+                  f"{checkpoint['entries_replayed']} entries replayed since seq {checkpoint['base_seq']}")
+
+    elif args.command == "verify":
+        drift = await checkpoints.verify()
+        if not drift:
+            print("✅ Materialized balances match the journal")
+        for row in sorted(drift, key=lambda row: (row["account"], row["currency"])):
+            print(f"   ❌ {row['account']:<60} {row['currency']:<5} "
+                  f"journal={row['journal']} materialized={row['materialized']} (minor units)")
+
+    elif args.command == "rebuild":
+        accounts = await checkpoints.rebuild()
+        print(f"✅ Rebuilt {accounts} account balances from the journal")
+
+    elif args.command == "balance":
+        for bucket in BALANCE_BUCKETS:
+            account = wallet_account(args.wallet, bucket)
+            if args.at_seq is None:
+                amounts = await ledger.balance(account)
+            else:
+                amounts = await checkpoints.balance_at(account, args.at_seq)
+            print(f"   {bucket:<10} {balances_to_float(amounts) if amounts else '-'}")
+        if args.at_seq is not None:
+            print(f"\n   as of ledger seq {args.at_seq}")
+
+    print(f"\n⏱️ Done in {time.perf_counter() - started:.2f}s")
+    client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Double-entry ledger maintenance")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("open", help="Carry current user balances into the ledger")
+    subcommands.add_parser("checkpoint", help="Checkpoint balances up to the last sealed entry")
+    subcommands.add_parser("verify", help="Diff materialized balances against a journal replay")
+    subcommands.add_parser("rebuild", help="Rewrite materialized balances from the journal")
+    balance_parser = subcommands.add_parser("balance", help="Show a wallet's ledger balances")
+    balance_parser.add_argument("wallet")
+    balance_parser.add_argument("--at-seq", type=int, default=None, help="Balance as of this ledger sequence number")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bet latency during a login storm
+Runs a simulated bet loop while bursts of bcrypt logins arrive, first verifying on the
+event loop (the old behaviour) and then through the bounded password hasher, and
+reports bet latency percentiles plus how many logins were served or shed
+"""
+
+import sys
+import asyncio
+import statistics
+from pathlib import Path
+
+# Add backend directory to path
+backend_dir = Path(__file__).parent / "backend"
+sys.path.append(str(backend_dir))
+
+from services.password_hasher import PasswordHasher, PasswordOverloaded
+
+PHASE_SECONDS = 5.0
+LOGINS_PER_SECOND = 40
+BET_INTERVAL = 0.005
+
+async def bet_loop(duration: float) -> list:
+    """Simulated bet handler: records how late each 5ms tick actually runs"""
+    latencies = []
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+    while loop.time() < deadline:
+        started = loop.time()
+        await asyncio.sleep(BET_INTERVAL)
+        latencies.append((loop.time() - started - BET_INTERVAL) * 1000)
+    return latencies
+
+async def login_storm(duration: float, verify) -> dict:
+    """Fire LOGINS_PER_SECOND concurrent logins for the duration"""
+    results = {"served": 0, "shed": 0}
+
+    async def one_login():
+        try:
+            await verify()
+            results["served"] += 1
+        except PasswordOverloaded:
+            results["shed"] += 1
+
+    tasks = []
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+    while loop.time() < deadline:
+        tasks.extend(asyncio.create_task(one_login()) for _ in range(LOGINS_PER_SECOND // 10))
+        await asyncio.sleep(0.1)
+    await asyncio.gather(*tasks)
+    return results
+
+def summarize(name: str, latencies: list, logins: dict = None):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"\n{name}")
+    print(f"   Bet ticks: {len(latencies)}  p50 lag: {p50:.1f}ms  p99 lag: {p99:.1f}ms  max: {latencies[-1]:.1f}ms")
+    if logins is not None:
+        print(f"   Logins served: {logins['served']}  shed with 429: {logins['shed']}")
+
+async def main():
+    """Compare bet latency with no logins, inline bcrypt and the bounded hasher"""
+    hasher = PasswordHasher()
+    stored_hash = hasher.context.hash("benchmark-password")
+
+    print("🎰 LOGIN STORM BENCHMARK")
+    print("=" * 60)
+    print(f"   {LOGINS_PER_SECOND} logins/s for {PHASE_SECONDS}s per phase, "
+          f"{hasher.max_workers} hashing threads, queue {hasher.max_queue}")
+
+    summarize("📊 Baseline (no logins)", await bet_loop(PHASE_SECONDS))
+
+    async def inline_verify():
+        hasher.context.verify("benchmark-password", stored_hash)
+
+    latencies, logins = await asyncio.gather(bet_loop(PHASE_SECONDS), login_storm(PHASE_SECONDS, inline_verify))
+    summarize("🐢 bcrypt on the event loop (old)", latencies, logins)
+
+    async def pooled_verify():
+        await hasher.verify("benchmark-password", stored_hash)
+
+    latencies, logins = await asyncio.gather(bet_loop(PHASE_SECONDS), login_storm(PHASE_SECONDS, pooled_verify))
+    summarize("⚡ Bounded password hasher (new)", latencies, logins)
+    print(f"\n   Hasher metrics: {hasher.metrics()}")
+
+    hasher.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
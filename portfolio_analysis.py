@@ -17,6 +17,10 @@ sys.path.append(str(backend_dir))
 # Load environment variables
 load_dotenv(backend_dir / '.env')
 
+from archive.bet_archive import bet_archive
+from games.rollups import BetRollups
+from services.amounts import to_float
+
 async def main():
     """Analyze user's complete portfolio and conversion history"""
     
@@ -170,17 +174,36 @@ async def main():
         print("🎮 GAMING & SAVINGS ACTIVITY:")
         print("-" * 40)
         
-        # Get recent game activity
-        game_count = await db.game_bets.count_documents({"wallet_address": user_wallet})
-        total_winnings = await db.game_bets.aggregate([
-            {"$match": {"wallet_address": user_wallet, "result": "win"}},
-            {"$group": {"_id": "$currency", "total": {"$sum": "$payout"}}}
-        ]).to_list(10)
-        
-        total_losses = await db.game_bets.aggregate([
-            {"$match": {"wallet_address": user_wallet, "result": "loss"}},
-            {"$group": {"_id": "$currency", "total": {"$sum": "$bet_amount"}}}
-        ]).to_list(10)
+        # Get game activity from the hourly rollups, or from the bets themselves until they are backfilled
+        rollups = BetRollups(db)
+        if await rollups.ready():
+            rows = await rollups.totals(user_wallet)
+            game_count = sum(row["bets"] for row in rows)
+            total_winnings = [{"_id": row["currency"], "total": to_float(row["payout_minor"], row["currency"])}
+                              for row in rows if row["wins"]]
+            total_losses = [{"_id": row["currency"], "total": to_float(row["lost_minor"], row["currency"])}
+                            for row in rows if row["losses"]]
+        else:
+            # Recent bets from MongoDB, older ones from the Parquet archive
+            game_count = await db.game_bets.count_documents(bet_archive.hot_query({"wallet_address": user_wallet}))
+            total_winnings = await db.game_bets.aggregate([
+                {"$match": bet_archive.hot_query({"wallet_address": user_wallet, "result": "win"})},
+                {"$group": {"_id": "$currency", "total": {"$sum": "$payout"}}}
+            ]).to_list(10)
+            
+            total_losses = await db.game_bets.aggregate([
+                {"$match": bet_archive.hot_query({"wallet_address": user_wallet, "result": "loss"})},
+                {"$group": {"_id": "$currency", "total": {"$sum": "$bet_amount"}}}
+            ]).to_list(10)
+            
+            archived = await bet_archive.summary(user_wallet)
+            for totals, field in ((total_winnings, "won"), (total_losses, "lost")):
+                by_currency = {row["_id"]: row for row in totals}
+                for currency, cold in archived["by_currency"].items():
+                    if cold[field]:
+                        by_currency.setdefault(currency, {"_id": currency, "total": 0})["total"] += cold[field]
+                totals[:] = by_currency.values()
+            game_count += sum(cold["games"] for cold in archived["by_currency"].values())
         
         print(f"Total games played: {game_count}")
         
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark: response serialization for hot endpoints
+Renders realistic /api/wallet/{addr} and /api/games/history payloads the old way
+(jsonable_encoder then the stdlib JSONResponse) and through FastJSONResponse, and
+reports per-response render time
+"""
+
+import sys
+import time
+import random
+import statistics
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add backend directory to path
+backend_dir = Path(__file__).parent / "backend"
+sys.path.append(str(backend_dir))
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from services.json_response import FastJSONResponse
+
+ROUNDS = 200
+HISTORY_ROWS = 500
+
+def wallet_payload() -> dict:
+    balances = {"CRT": 1520.25, "DOGE": 88.5, "TRX": 310.0, "SOL": 0.42, "USDC": 12.75}
+    return {
+        "success": True,
+        "wallet": {
+            "user_id": "3f1c2a9e-5b7d-4e8f-9a0b-1c2d3e4f5a6b",
+            "wallet_address": "DwDtUqNo7QnYzq7pqvbbhJUqUBf6TqCZcZXNqy2oA8g8",
+            "deposit_balance": balances,
+            "winnings_balance": dict(balances),
+            "gaming_balance": dict(balances),
+            "liquidity_pool": dict(balances),
+            "savings_balance": dict(balances),
+            "created_at": datetime.utcnow().isoformat(),
+            "balance_source": "hybrid_blockchain_database",
+            "last_balance_update": datetime.utcnow().isoformat(),
+            "balance_notes": {currency: "Converted currency (database tracked)" for currency in balances}
+        }
+    }
+
+def history_payload() -> dict:
+    now = datetime.utcnow()
+    games = []
+    for i in range(HISTORY_ROWS):
+        won = random.random() < 0.45
+        bet_amount = round(random.uniform(1, 100), 2)
+        games.append({
+            "_id": ObjectId(),
+            "game_id": f"game_{i:08x}",
+            "game_type": random.choice(["Slot Machine", "Dice", "Roulette", "Plinko"]),
+            "bet_amount": bet_amount,
+            "currency": random.choice(["CRT", "DOGE", "TRX", "USDC"]),
+            "network": "solana",
+            "result": "win" if won else "loss",
+            "payout": bet_amount * 2 if won else 0.0,
+            "status": "completed",
+            "timestamp": now - timedelta(seconds=i * 7)
+        })
+    return {"success": True, "games": games, "total_games": len(games),
+            "next_cursor": "MjAyNC0wMS0wMVQwMDowMDowMHw2NWEw", "has_more": True}
+
+def old_render(content: dict, convert_ids: bool = False) -> bytes:
+    if convert_ids:
+        # The history route used to stringify ObjectIds by hand before returning
+        for game in content["games"]:
+            game["_id"] = str(game["_id"])
+    return JSONResponse(jsonable_encoder(content)).body
+
+def new_render(content: dict) -> bytes:
+    return FastJSONResponse(content).body
+
+def measure(render, make_payload) -> list:
+    timings = []
+    for _ in range(ROUNDS):
+        content = make_payload()
+        started = time.perf_counter()
+        render(content)
+        timings.append((time.perf_counter() - started) * 1000)
+    return sorted(timings)
+
+def report(name: str, old: list, new: list, size: int):
+    old_p50, new_p50 = statistics.median(old), statistics.median(new)
+    print(f"\n{name} ({size / 1024:.1f}KB)")
+    print(f"   jsonable_encoder + json:  p50 {old_p50:.3f}ms  p99 {old[int(len(old) * 0.99) - 1]:.3f}ms")
+    print(f"   FastJSONResponse:         p50 {new_p50:.3f}ms  p99 {new[int(len(new) * 0.99) - 1]:.3f}ms")
+    print(f"   Speedup: {old_p50 / new_p50:.1f}x")
+
+def main():
+    """Compare old and new rendering for the wallet and history endpoints"""
+    print("🧾 SERIALIZATION BENCHMARK")
+    print("=" * 60)
+    print(f"   {ROUNDS} renders per case, history pages of {HISTORY_ROWS} bets")
+
+    report("💰 /api/wallet/{addr}",
+           measure(old_render, wallet_payload), measure(new_render, wallet_payload),
+           len(new_render(wallet_payload())))
+
+    report("🎲 /api/games/history/{addr}",
+           measure(lambda content: old_render(content, convert_ids=True), history_payload),
+           measure(new_render, history_payload),
+           len(new_render(history_payload())))
+
+if __name__ == "__main__":
+    main()
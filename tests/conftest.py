@@ -0,0 +1,14 @@
+"""
+Unit tests import the backend modules the way server.py does, with backend/ on sys.path.
+Placeholder CoinPayments credentials let services.amounts import the currency table
+without a backend/.env; no test talks to CoinPayments
+"""
+
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+os.environ.setdefault("COINPAYMENTS_PUBLIC_KEY", "test-public-key")
+os.environ.setdefault("COINPAYMENTS_PRIVATE_KEY", "test-private-key")
@@ -0,0 +1,33 @@
+from decimal import Decimal
+
+import pytest
+
+from services.amounts import to_minor, to_float, to_decimal, precision, DEFAULT_PRECISION
+
+def test_to_minor_uses_the_currency_precision():
+    assert to_minor(1, "SOL") == 1_000_000_000
+    assert to_minor("0.5", "sol") == 500_000_000
+    assert precision("NOPE") == DEFAULT_PRECISION
+    assert to_minor(1, "NOPE") == 10 ** DEFAULT_PRECISION
+
+def test_to_minor_converts_floats_as_written():
+    # 0.1 + 0.2 as a binary float is 0.30000000000000004
+    assert to_minor(0.1, "SOL") + to_minor(0.2, "SOL") == to_minor("0.3", "SOL")
+    assert to_minor(0.1, "SOL") == 100_000_000
+
+def test_to_minor_rounds_half_even():
+    assert to_minor("0.0000000005", "SOL") == 0
+    assert to_minor("0.0000000015", "SOL") == 2
+    assert to_minor("0.0000000025", "SOL") == 2
+    assert to_minor("-0.0000000015", "SOL") == -2
+
+def test_to_minor_rejects_amounts_outside_int64():
+    with pytest.raises(OverflowError):
+        to_minor(10 ** 11, "SOL")
+
+def test_to_float_round_trips():
+    for amount in ("0.1", "123.456789012", "-5", "0"):
+        units = to_minor(amount, "SOL")
+        assert to_decimal(units, "SOL") == Decimal(amount).quantize(Decimal("1e-9"))
+        assert to_minor(to_float(units, "SOL"), "SOL") == units
+    assert to_float(1, "SOL") == 1e-9
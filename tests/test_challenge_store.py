@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+from auth import challenge_store
+from auth.challenge_store import InMemoryChallengeStore
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(challenge_store.time, "monotonic", lambda: now[0])
+    return now
+
+def test_challenge_is_single_use(clock):
+    store = InMemoryChallengeStore(ttl_seconds=60)
+    asyncio.run(store.put("hash", {"wallet": "abc"}))
+    assert asyncio.run(store.take("hash")) == {"wallet": "abc"}
+    assert asyncio.run(store.take("hash")) is None
+
+def test_challenge_expires_after_ttl(clock):
+    store = InMemoryChallengeStore(ttl_seconds=60)
+    asyncio.run(store.put("hash", {"wallet": "abc"}))
+    clock[0] += 59.9
+    assert len(store) == 1
+    clock[0] += 0.1
+    assert asyncio.run(store.take("hash")) is None
+    assert len(store) == 0
+
+def test_put_sweeps_only_expired_challenges(clock):
+    store = InMemoryChallengeStore(ttl_seconds=60)
+    asyncio.run(store.put("old", {}))
+    clock[0] += 30
+    asyncio.run(store.put("newer", {}))
+    clock[0] += 30
+    asyncio.run(store.put("newest", {}))
+    assert len(store) == 2
+    assert asyncio.run(store.take("newer")) == {}
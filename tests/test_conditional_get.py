@@ -0,0 +1,23 @@
+from services.conditional_get import etag_matches, make_etag
+
+ETAG = 'W/"abc123"'
+
+def test_missing_header_never_matches():
+    assert not etag_matches(None, ETAG)
+    assert not etag_matches("", ETAG)
+
+def test_wildcard_matches():
+    assert etag_matches(" * ", ETAG)
+
+def test_weak_comparison_ignores_the_prefix():
+    assert etag_matches('W/"abc123"', ETAG)
+    assert etag_matches('"abc123"', ETAG)
+    assert etag_matches('W/"abc123"', '"abc123"')
+
+def test_any_tag_in_the_list_matches():
+    assert etag_matches('"other", W/"abc123"', ETAG)
+    assert not etag_matches('"other", W/"abc1234"', ETAG)
+
+def test_make_etag_ignores_field_order():
+    assert make_etag("wallet", {"a": 1, "b": 2}) == make_etag("wallet", {"b": 2, "a": 1})
+    assert make_etag("wallet", {"a": 1}) != make_etag("balances", {"a": 1})
@@ -0,0 +1,26 @@
+import base64
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from services.history_cursor import encode_history_cursor, decode_history_cursor
+
+def test_round_trip():
+    game = {"_id": ObjectId(), "timestamp": datetime(2024, 3, 1, 12, 30, 15, 123456)}
+    assert decode_history_cursor(encode_history_cursor(game)) == (game["timestamp"], game["_id"])
+
+def test_cursor_is_url_safe():
+    game = {"_id": ObjectId(), "timestamp": datetime(2024, 3, 1)}
+    cursor = encode_history_cursor(game)
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_=")
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    base64.urlsafe_b64encode(b"no separator").decode(),
+    base64.urlsafe_b64encode(b"2024-03-01T00:00:00|not-an-object-id").decode(),
+    base64.urlsafe_b64encode(f"yesterday|{ObjectId()}".encode()).decode(),
+])
+def test_invalid_cursors_raise_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_history_cursor(cursor)
@@ -0,0 +1,59 @@
+import pytest
+
+from ledger.postings import (
+    HOUSE, CONVERSION, UnbalancedPosting, bet_legs, check_balanced, conversion_legs,
+    leg, liquidity_reward, net_by_account, wallet_account
+)
+
+WALLET = "So1anaWa11et"
+
+def test_winning_bet_pays_out_from_the_house():
+    legs = bet_legs(WALLET, "SOL", 1000, True, 2500)
+    check_balanced(legs)
+    net = net_by_account(legs)
+    assert net[wallet_account(WALLET, "deposit")]["SOL"] == -1000
+    assert net[wallet_account(WALLET, "winnings")]["SOL"] == 2500
+    assert net[HOUSE]["SOL"] == -1500
+
+def test_winning_bet_without_payout_has_no_winnings_leg():
+    legs = bet_legs(WALLET, "SOL", 1000, True, 0)
+    check_balanced(legs)
+    assert len(legs) == 2
+
+def test_losing_bet_moves_stake_to_savings_with_liquidity_reward():
+    legs = bet_legs(WALLET, "SOL", 1000, False, 0)
+    check_balanced(legs)
+    net = net_by_account(legs)
+    assert net[wallet_account(WALLET, "savings")]["SOL"] == 1000
+    assert net[wallet_account(WALLET, "liquidity")]["SOL"] == liquidity_reward(1000) == 100
+    assert net[HOUSE]["SOL"] == -100
+
+def test_losing_bet_too_small_for_a_reward_stays_balanced():
+    legs = bet_legs(WALLET, "SOL", 4, False, 0)
+    check_balanced(legs)
+    assert wallet_account(WALLET, "liquidity") not in net_by_account(legs)
+
+def test_conversion_balances_per_currency():
+    legs = conversion_legs(WALLET, "CRT", 5000, "DOGE", 123, 7)
+    check_balanced(legs)
+    net = net_by_account(legs)
+    deposit = wallet_account(WALLET, "deposit")
+    assert net[deposit] == {"CRT": -5000, "DOGE": 123}
+    assert net[CONVERSION] == {"CRT": 5000, "DOGE": -123}
+    assert net[wallet_account(WALLET, "liquidity")]["DOGE"] == 7
+
+def test_conversion_without_liquidity():
+    legs = conversion_legs(WALLET, "CRT", 5000, "DOGE", 123, 0)
+    check_balanced(legs)
+    assert len(legs) == 4
+
+@pytest.mark.parametrize("legs", [
+    [leg(HOUSE, "SOL", 5)],
+    [leg(HOUSE, "SOL", 5), leg(CONVERSION, "SOL", -4)],
+    [leg(HOUSE, "SOL", 5), leg(CONVERSION, "DOGE", -5)],
+    [leg(HOUSE, "SOL", 0.5), leg(CONVERSION, "SOL", -0.5)],
+    [leg(HOUSE, "SOL", 0), leg(CONVERSION, "SOL", 0)],
+])
+def test_check_balanced_rejects(legs):
+    with pytest.raises(UnbalancedPosting):
+        check_balanced(legs)
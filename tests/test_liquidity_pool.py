@@ -0,0 +1,95 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from savings import liquidity_pool
+from savings.liquidity_pool import ShardedLiquidityPool, SHARDS
+
+class FakeShards:
+    """liquidity_pool_shards with just the guarded $inc and find the pool issues"""
+
+    def __init__(self, balances):
+        self.docs = {shard: {"_id": shard, "balances": dict(amounts)} for shard, amounts in balances.items()}
+        self.updates = []
+
+    async def update_one(self, query, update, upsert=False):
+        self.updates.append((query, update))
+        doc = self.docs.get(query["_id"])
+        for field, condition in query.items():
+            if field.startswith("balances.") and (doc is None or doc["balances"].get(field[9:], 0) < condition["$gte"]):
+                return SimpleNamespace(modified_count=0, upserted_id=None)
+        if doc is None:
+            doc = self.docs[query["_id"]] = {"_id": query["_id"], "balances": {}}
+        for field, units in update["$inc"].items():
+            currency = field[9:]
+            doc["balances"][currency] = doc["balances"].get(currency, 0) + units
+        return SimpleNamespace(modified_count=1, upserted_id=None)
+
+    def find(self, query, projection=None):
+        (field, condition), = query.items()
+        currency = field[9:]
+        docs = [{"_id": doc["_id"], "balances": {currency: doc["balances"][currency]}}
+                for doc in self.docs.values() if doc["balances"].get(currency, 0) > condition["$gt"]]
+        cursor = MagicMock()
+
+        async def to_list(length):
+            return docs
+
+        cursor.to_list = to_list
+        return cursor
+
+    def balance(self, shard, currency="DOGE"):
+        return self.docs[shard]["balances"].get(currency, 0)
+
+def make_pool(balances):
+    shards = FakeShards(balances)
+    db = MagicMock()
+    db.__getitem__.side_effect = lambda name: shards if name == SHARDS else MagicMock()
+    pool = ShardedLiquidityPool(db, shards=len(balances), total_ttl=0)
+    return pool, shards
+
+@pytest.fixture(autouse=True)
+def first_shard(monkeypatch):
+    # The random first pick always lands on shard 0
+    monkeypatch.setattr(liquidity_pool.random, "randrange", lambda n: 0)
+
+def test_debit_from_the_random_shard():
+    pool, shards = make_pool({0: {"DOGE": 500}, 1: {"DOGE": 500}})
+    assert asyncio.run(pool.debit("DOGE", 300))
+    assert shards.balance(0) == 200 and shards.balance(1) == 500
+    assert pool.status()["fallbacks"] == 0
+
+def test_debit_falls_back_to_a_shard_that_can_cover_it():
+    pool, shards = make_pool({0: {"DOGE": 100}, 1: {"DOGE": 200}, 2: {"DOGE": 900}})
+    assert asyncio.run(pool.debit("DOGE", 800))
+    assert [shards.balance(shard) for shard in range(3)] == [100, 200, 100]
+    assert pool.status()["fallbacks"] == 1 and pool.status()["split_debits"] == 0
+
+def test_debit_gathers_from_several_shards_when_none_is_big_enough():
+    pool, shards = make_pool({0: {"DOGE": 100}, 1: {"DOGE": 300}, 2: {"DOGE": 400}})
+    assert asyncio.run(pool.debit("DOGE", 650))
+    # Largest first: all of shard 2, then the rest from shard 1
+    assert [shards.balance(shard) for shard in range(3)] == [100, 50, 0]
+    assert pool.status()["split_debits"] == 1
+
+def test_short_pool_refunds_what_was_taken():
+    pool, shards = make_pool({0: {"DOGE": 100}, 1: {"DOGE": 300}, 2: {"DOGE": 400}})
+    assert not asyncio.run(pool.debit("DOGE", 1000))
+    assert [shards.balance(shard) for shard in range(3)] == [100, 300, 400]
+    assert pool.status()["rejected"] == 1 and pool.status()["debits"] == 0
+
+def test_refund_covers_a_shard_drained_concurrently():
+    pool, shards = make_pool({0: {"DOGE": 100}, 1: {"DOGE": 300}, 2: {"DOGE": 400}})
+    original = shards.find
+
+    def find_then_drain(query, projection=None):
+        cursor = original(query, projection)
+        # Another worker empties shard 1 after the balances were read
+        shards.docs[1]["balances"]["DOGE"] = 0
+        return cursor
+
+    shards.find = find_then_drain
+    assert not asyncio.run(pool.debit("DOGE", 700))
+    assert [shards.balance(shard) for shard in range(3)] == [100, 0, 400]
@@ -0,0 +1,17 @@
+import pytest
+
+from services.timeseries_layout import recommend_bucketing, MAX_BUCKET_SPAN
+
+@pytest.mark.parametrize("rate, span, granularity", [
+    (1.0, 1000, "seconds"),            # 1000 events fill a bucket in 1000s
+    (1000 / 3600, 3600, "seconds"),
+    (0.01, 100_000, "hours"),
+    (1000 / 86400, 86400, "minutes"),
+    (5000.0, 1, "seconds"),            # Never below one second
+])
+def test_span_fills_a_bucket_at_the_rate(rate, span, granularity):
+    assert recommend_bucketing(rate) == {"bucket_span_seconds": span, "granularity": granularity}
+
+@pytest.mark.parametrize("rate", [0, -1, 1e-9])
+def test_idle_or_unknown_rates_use_the_longest_span(rate):
+    assert recommend_bucketing(rate) == {"bucket_span_seconds": MAX_BUCKET_SPAN, "granularity": "hours"}
@@ -0,0 +1,95 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock
+
+from auth.token_cache import VerifiedTokenCache, RevocationList, token_digest
+
+WALLET_INFO = {"wallet_address": "abc", "network": "solana"}
+
+class FakePipeline:
+    def __init__(self, members):
+        self.members = members
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def zremrangebyscore(self, *args):
+        self.commands.append(("zremrangebyscore",) + args)
+
+    def zrange(self, *args):
+        self.commands.append(("zrange",) + args)
+
+    async def execute(self):
+        return [0, list(self.members)]
+
+class FakeRedis:
+    def __init__(self, members=()):
+        self.members = set(members)
+        self.zadd = AsyncMock(side_effect=lambda key, mapping: self.members.update(mapping))
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self.members)
+
+def test_cache_serves_until_exp():
+    cache = VerifiedTokenCache(max_size=10)
+    digest = token_digest("token")
+    cache.put(digest, time.time() + 60, WALLET_INFO)
+    assert cache.get(digest) == WALLET_INFO
+    cache.put(digest, time.time() - 1, WALLET_INFO)
+    assert cache.get(digest) is None
+    assert cache.stats()["size"] == 0
+
+def test_cache_evicts_least_recently_used():
+    cache = VerifiedTokenCache(max_size=2)
+    exp = time.time() + 60
+    cache.put("a", exp, WALLET_INFO)
+    cache.put("b", exp, WALLET_INFO)
+    cache.get("a")
+    cache.put("c", exp, WALLET_INFO)
+    assert cache.get("b") is None
+    assert cache.get("a") == WALLET_INFO
+
+def test_revoked_token_is_dropped_from_cache_and_listed():
+    cache, revocations = VerifiedTokenCache(max_size=10), RevocationList(sync_interval=60)
+    digest = token_digest("token")
+    cache.put(digest, time.time() + 60, WALLET_INFO)
+
+    # Same order as wallet_auth.revoke_token
+    cache.discard(digest)
+    asyncio.run(revocations.revoke(digest, time.time() + 60))
+
+    assert digest in revocations
+    assert cache.get(digest) is None
+
+def test_local_revocations_lapse_with_the_token():
+    revocations = RevocationList(sync_interval=60)
+    asyncio.run(revocations.revoke("expired", time.time() - 1))
+    asyncio.run(revocations.revoke("live", time.time() + 60))
+    assert "live" in revocations
+    assert "expired" not in revocations
+
+def test_revocations_are_shared_through_redis():
+    redis = FakeRedis(members={"from-another-worker"})
+    revocations = RevocationList(sync_interval=60)
+    revocations.redis = redis
+
+    asyncio.run(revocations.revoke("ours", time.time() + 60))
+    redis.zadd.assert_awaited_once()
+    assert "ours" in revocations
+
+    asyncio.run(revocations.sync())
+    assert "from-another-worker" in revocations
+    assert "ours" in revocations
+
+def test_sync_keeps_own_revocations_missing_from_redis():
+    redis = FakeRedis()
+    revocations = RevocationList(sync_interval=60)
+    revocations.redis = redis
+    asyncio.run(revocations.revoke("ours", time.time() + 60))
+    redis.members.clear()  # Read raced the ZADD
+    asyncio.run(revocations.sync())
+    assert "ours" in revocations
@@ -0,0 +1,102 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import bson
+import pytest
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from services.write_behind import WriteBehindBuffer, QUARANTINE, DUPLICATE_KEY
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield doc
+
+def make_db():
+    collections = {}
+
+    def collection(name):
+        if name not in collections:
+            mock = MagicMock()
+            mock.insert_many = AsyncMock()
+            mock.find = MagicMock(return_value=FakeCursor([]))
+            collections[name] = mock
+        return collections[name]
+
+    db = MagicMock()
+    db.__getitem__.side_effect = collection
+    return db
+
+@pytest.fixture
+def buffer(tmp_path):
+    return WriteBehindBuffer(make_db(), "game_bets", spool_dir=str(tmp_path))
+
+def quarantined(buffer):
+    calls = buffer.db[QUARANTINE].insert_many.await_args_list
+    return [entry for call in calls for entry in call.args[0]]
+
+def test_read_segment_returns_documents_in_order(buffer, tmp_path):
+    docs = [{"_id": ObjectId(), "n": n} for n in range(3)]
+    path = tmp_path / "segment.spool"
+    path.write_bytes(b"".join(bson.encode(doc) for doc in docs))
+    assert buffer._read_segment(path) == docs
+
+def test_read_segment_ignores_a_partial_trailing_document(buffer, tmp_path):
+    docs = [{"_id": ObjectId(), "n": n} for n in range(2)]
+    partial = bson.encode({"_id": ObjectId(), "n": 2})[:-3]
+    path = tmp_path / "segment.spool"
+    path.write_bytes(b"".join(bson.encode(doc) for doc in docs) + partial)
+    assert buffer._read_segment(path) == docs
+
+    path.write_bytes(b"\x01\x00")
+    assert buffer._read_segment(path) == []
+
+def test_rejected_documents_are_quarantined_and_duplicates_skipped(buffer):
+    docs = [{"_id": ObjectId(), "n": n} for n in range(3)]
+    buffer.db["game_bets"].insert_many.side_effect = BulkWriteError({"writeErrors": [
+        {"index": 0, "code": DUPLICATE_KEY, "errmsg": "duplicate key"},
+        {"index": 2, "code": 121, "errmsg": "Document failed validation"},
+    ]})
+    asyncio.run(buffer._write_batch(docs))
+
+    entries = quarantined(buffer)
+    assert [entry["document"] for entry in entries] == [docs[2]]
+    assert entries[0]["collection"] == "game_bets" and entries[0]["code"] == 121
+    assert buffer.documents_quarantined == 1
+
+def test_batch_failing_as_a_whole_is_split_down_to_the_bad_document(buffer):
+    docs = [{"_id": ObjectId(), "n": n} for n in range(4)]
+    bad = docs[2]
+
+    async def insert_many(batch, ordered):
+        if any(doc is bad for doc in batch):
+            raise OperationFailure("time-series constraint", code=2)
+
+    buffer.db["game_bets"].insert_many.side_effect = insert_many
+    asyncio.run(buffer._write_batch(docs))
+
+    assert [entry["document"] for entry in quarantined(buffer)] == [bad]
+    inserted = [doc for call in buffer.db["game_bets"].insert_many.await_args_list
+                for doc in call.args[0] if not any(d is bad for d in call.args[0])]
+    assert sorted(doc["n"] for doc in inserted) == [0, 1, 3]
+
+def test_transient_failures_are_raised_not_quarantined(buffer):
+    docs = [{"_id": ObjectId()}]
+    buffer.db["game_bets"].insert_many.side_effect = OperationFailure(
+        "not primary", code=10107, details={"errorLabels": ["RetryableWriteError"]})
+    with pytest.raises(OperationFailure):
+        asyncio.run(buffer._write_batch(docs))
+    assert quarantined(buffer) == []
+
+def test_retry_skips_documents_already_in_mongodb(buffer):
+    docs = [{"_id": ObjectId(), "n": n} for n in range(2)]
+    buffer.db["game_bets"].find.return_value = FakeCursor([{"_id": docs[0]["_id"]}])
+    asyncio.run(buffer._write_batch(docs, retry=True))
+    assert buffer.db["game_bets"].insert_many.await_args.args[0] == [docs[1]]
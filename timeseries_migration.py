@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Time-series migration - moves an append-only event stream (transactions, bets, price_ticks)
+onto a MongoDB time-series collection keyed by wallet, and benchmarks storage and query
+latency before and after.
+
+    python timeseries_migration.py plan <stream>        # write rate and recommended bucketing
+    python timeseries_migration.py benchmark <stream>   # run before and again after migrating
+    python timeseries_migration.py migrate <stream>     # cutover, then bulk copy (resumable)
+    python timeseries_migration.py status
+
+Run migrate while the stream's writers are paused: an insert between the rename and the
+create fails the cutover. Until the copy finishes, the app reads only the new collection,
+so history pages and the legacy running_total seed see just the documents copied so far.
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from datetime import datetime, timedelta
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+from pathlib import Path
+
+# Add backend directory to path
+backend_dir = Path(__file__).parent / "backend"
+sys.path.append(str(backend_dir))
+
+# Load environment variables
+load_dotenv(backend_dir / '.env')
+
+from services.timeseries_layout import (
+    MIGRATIONS, TIMESERIES_STREAMS, TimeSeriesMigration,
+    is_timeseries, measure_write_rate, recommend_bucketing, timeseries_options
+)
+
+SAMPLE_WALLETS = 20
+
+async def storage_stats(db, name: str) -> dict:
+    stats = (await db[name].aggregate([{"$collStats": {"storageStats": {}}}]).to_list(1))[0]["storageStats"]
+    return {
+        "count": stats.get("count", 0),
+        "data_bytes": stats.get("size", 0),
+        "storage_bytes": stats.get("storageSize", 0),
+        "index_bytes": stats.get("totalIndexSize", 0)
+    }
+
+async def query_latency(db, stream, iterations: int) -> dict:
+    """p50/p95 milliseconds for the app's query shapes against the most active meta values"""
+    collection = db[stream.collection]
+    since = datetime.utcnow() - timedelta(days=30)
+    top = await collection.aggregate([
+        {"$match": {stream.time_field: {"$gte": since}}},
+        {"$group": {"_id": f"${stream.meta_field}", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}},
+        {"$limit": SAMPLE_WALLETS}
+    ], allowDiskUse=True).to_list(None)
+    values = [row["_id"] for row in top]
+    if not values:
+        return {}
+
+    queries = {
+        "latest_50": lambda value: collection.find({stream.meta_field: value})
+            .sort(stream.time_field, -1).limit(50).to_list(50),
+        "range_30d": lambda value: collection.find(
+            {stream.meta_field: value, stream.time_field: {"$gte": since}}).to_list(None),
+        "count_30d": lambda value: collection.aggregate([
+            {"$match": {stream.meta_field: value, stream.time_field: {"$gte": since}}},
+            {"$count": "events"}
+        ]).to_list(1)
+    }
+
+    results = {}
+    for name, run in queries.items():
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            await run(random.choice(values))
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        results[name] = {"p50_ms": statistics.median(timings), "p95_ms": timings[int(len(timings) * 0.95) - 1]}
+    return results
+
+def print_benchmark(label: str, benchmark: dict):
+    storage = benchmark["storage"]
+    print(f"\n{label} ({benchmark['layout']}, {benchmark['measured_at']:%Y-%m-%d %H:%M})")
+    print(f"   Documents: {storage['count']:,}   data {storage['data_bytes'] / 1024 / 1024:,.1f} MB   "
+          f"on disk {storage['storage_bytes'] / 1024 / 1024:,.1f} MB   "
+          f"indexes {storage['index_bytes'] / 1024 / 1024:,.1f} MB")
+    for name, timing in benchmark["latency"].items():
+        print(f"   {name:<10} p50 {timing['p50_ms']:8.2f}ms   p95 {timing['p95_ms']:8.2f}ms")
+
+async def main(args):
+    """Run the chosen migration command"""
+
+    # Connect to MongoDB
+    mongo_url = os.environ['MONGO_URL']
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[os.environ['DB_NAME']]
+
+    print(f"🕒 TIME-SERIES {args.command.upper()}")
+    print("=" * 70)
+    started = time.perf_counter()
+    stream = TIMESERIES_STREAMS.get(getattr(args, "stream", None))
+
+    if args.command == "plan":
+        rate = await measure_write_rate(db, stream, days=args.days)
+        bucketing = recommend_bucketing(rate["per_meta_p90"])
+        print(f"   {stream.collection}: {rate['events']:,} events from {rate['meta_values']:,} "
+              f"{stream.meta_field} values over {rate['days']} days")
+        print(f"   Overall {rate['overall_per_second']:.4f}/s; per {stream.meta_field} "
+              f"p50 {rate['per_meta_p50']:.6f}/s  p90 {rate['per_meta_p90']:.6f}/s  max {rate['per_meta_max']:.6f}/s")
+        print(f"   Recommended bucket span {bucketing['bucket_span_seconds']:,}s "
+              f"(granularity '{bucketing['granularity']}' before MongoDB 6.3)")
+        print(f"   Creation options: {await timeseries_options(db, stream, rate)}")
+
+    elif args.command == "benchmark":
+        layout = "timeseries" if await is_timeseries(db, stream.collection) else "regular"
+        benchmark = {
+            "layout": layout,
+            "measured_at": datetime.utcnow(),
+            "storage": await storage_stats(db, stream.collection),
+            "latency": await query_latency(db, stream, args.iterations)
+        }
+        await db[MIGRATIONS].update_one(
+            {"_id": stream.collection}, {"$set": {f"benchmarks.{layout}": benchmark}}, upsert=True
+        )
+        state = await db[MIGRATIONS].find_one({"_id": stream.collection})
+        before, after = state["benchmarks"].get("regular"), state["benchmarks"].get("timeseries")
+        if before:
+            print_benchmark("Before", before)
+        if after:
+            print_benchmark("After", after)
+        if before and after:
+            ratio = before["storage"]["storage_bytes"] / max(after["storage"]["storage_bytes"], 1)
+            print(f"\n   Storage: {ratio:.1f}x smaller on disk")
+            for name, timing in after["latency"].items():
+                if name in before["latency"]:
+                    print(f"   {name:<10} p50 {before['latency'][name]['p50_ms'] / max(timing['p50_ms'], 0.001):.1f}x faster")
+        elif layout == "regular":
+            print("\nℹ️ Run this again after migrating to compare")
+
+    elif args.command == "migrate":
+        migration = TimeSeriesMigration(db, stream)
+        state = await migration.progress()
+        if state and state.get("options"):
+            options = state["options"]
+        else:
+            options = await timeseries_options(db, stream, await measure_write_rate(db, stream))
+        if state and state.get("completed_at"):
+            print(f"✅ {stream.collection} already migrated ({state['copied']:,} documents copied)")
+        else:
+            try:
+                await migration.cutover(options)
+            except RuntimeError as e:
+                print(f"❌ Cutover failed: {e}")
+                client.close()
+                return
+            print(f"   {stream.collection} is now time-series {options}; copying from {migration.legacy}")
+            print(f"⚠️ Until the copy finishes, history pages and running_total seeding only see "
+                  f"what has been copied into {stream.collection}")
+            result = await migration.copy(args.batch_size)
+            print(f"✅ Copied {result['copied']:,} documents in {result['seconds']:.1f}s "
+                  f"({result['skipped']:,} without a date in '{stream.time_field}' left in {migration.legacy})")
+            print(f"   Drop {migration.legacy} once the new layout has been verified")
+
+    elif args.command == "status":
+        for name, candidate in TIMESERIES_STREAMS.items():
+            layout = "timeseries" if await is_timeseries(db, candidate.collection) else "regular"
+            state = await db[MIGRATIONS].find_one({"_id": candidate.collection}) or {}
+            progress = ""
+            if state.get("failed_at"):
+                progress = f"   ❌ {state['error']}"
+            elif state.get("started_at"):
+                progress = (f"   copied {state.get('copied', 0):,}, "
+                            f"{'complete' if state.get('completed_at') else 'in progress'}")
+            print(f"   {name:<13} {candidate.collection:<14} {layout:<11}{progress}")
+
+    print(f"\n⏱️ Done in {time.perf_counter() - started:.2f}s")
+    client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Opt-in time-series layout for event streams")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    streams = sorted(TIMESERIES_STREAMS)
+    plan_parser = subcommands.add_parser("plan", help="Measure the write rate and recommend bucketing")
+    plan_parser.add_argument("stream", choices=streams)
+    plan_parser.add_argument("--days", type=int, default=7, help="Window to measure the write rate over")
+    benchmark_parser = subcommands.add_parser("benchmark", help="Record storage and query latency for the current layout")
+    benchmark_parser.add_argument("stream", choices=streams)
+    benchmark_parser.add_argument("--iterations", type=int, default=200)
+    migrate_parser = subcommands.add_parser("migrate", help="Switch a stream to time-series and copy its history")
+    migrate_parser.add_argument("stream", choices=streams)
+    migrate_parser.add_argument("--batch-size", type=int, default=2000)
+    subcommands.add_parser("status", help="Show each stream's layout and migration progress")
+    asyncio.run(main(parser.parse_args()))
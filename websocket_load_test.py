@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+WebSocket load test - opens many concurrent /api/ws/wallet sockets against a running
+backend, keeps them alive by answering heartbeats and reports connect latency, initial
+message latency and how many sockets survive the hold period.
+
+Raise the open-file limit on both ends first (ulimit -n 200000). One client IP runs out
+of ephemeral ports around 60k sockets to a single server port, so run several copies
+from different hosts to go past that.
+"""
+
+import sys
+import time
+import json
+import asyncio
+import argparse
+import statistics
+
+import websockets
+
+class Stats:
+    def __init__(self):
+        self.connect_ms = []
+        self.first_message_ms = []
+        self.open = 0
+        self.failed = 0
+        self.closed_early = 0
+        self.messages = 0
+        self.pings = 0
+
+async def hold_socket(args, index: int, stats: Stats, stop: asyncio.Event):
+    """Open one socket, wait for the initial wallet message, then idle answering pings"""
+    url = f"{args.url.rstrip('/')}/api/ws/wallet/{args.wallet_prefix}{index % args.wallets}"
+    started = time.perf_counter()
+    connected = False
+    try:
+        async with websockets.connect(url, open_timeout=30, ping_interval=None, max_queue=16) as ws:
+            connected = True
+            stats.connect_ms.append((time.perf_counter() - started) * 1000)
+            stats.open += 1
+
+            await asyncio.wait_for(ws.recv(), 30)
+            stats.first_message_ms.append((time.perf_counter() - started) * 1000)
+
+            while not stop.is_set():
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), 1)
+                except asyncio.TimeoutError:
+                    continue
+                stats.messages += 1
+                if json.loads(raw).get("type") == "ping":
+                    stats.pings += 1
+                    await ws.send(json.dumps({"type": "pong"}))
+    except Exception:
+        if connected:
+            stats.closed_early += 1
+        else:
+            stats.failed += 1
+    finally:
+        if connected:
+            stats.open -= 1
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+async def main(args):
+    """Ramp up sockets, hold them, print a summary"""
+    stats = Stats()
+    stop = asyncio.Event()
+    tasks = []
+
+    print(f"🔌 Opening {args.connections} sockets to {args.url} at {args.rate}/s...")
+    ramp_started = time.perf_counter()
+    for index in range(args.connections):
+        tasks.append(asyncio.create_task(hold_socket(args, index, stats, stop)))
+        if (index + 1) % args.rate == 0:
+            await asyncio.sleep(1)
+            print(f"   {index + 1} started, {stats.open} open, {stats.failed} failed")
+    ramp_seconds = time.perf_counter() - ramp_started
+
+    print(f"⏳ Holding for {args.hold}s...")
+    for _ in range(args.hold):
+        await asyncio.sleep(1)
+    peak_open = stats.open
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    print("\n📊 WEBSOCKET LOAD TEST")
+    print("=" * 60)
+    print(f"   Sockets requested:     {args.connections}")
+    print(f"   Open at end of hold:   {peak_open}")
+    print(f"   Failed to connect:     {stats.failed}")
+    print(f"   Closed by server:      {stats.closed_early}")
+    print(f"   Ramp duration:         {ramp_seconds:.1f}s")
+    print(f"   Connect p50/p99:       {percentile(stats.connect_ms, 50):.1f} / {percentile(stats.connect_ms, 99):.1f} ms")
+    print(f"   First message p50/p99: {percentile(stats.first_message_ms, 50):.1f} / {percentile(stats.first_message_ms, 99):.1f} ms")
+    print(f"   Messages received:     {stats.messages} ({stats.pings} heartbeats)")
+    if stats.connect_ms:
+        print(f"   Mean connect:          {statistics.mean(stats.connect_ms):.1f} ms")
+
+    ok = peak_open >= args.connections * 0.99
+    print(f"\n{'✅' if ok else '❌'} {peak_open}/{args.connections} sockets held")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="ws://localhost:8001")
+    parser.add_argument("--connections", type=int, default=50000)
+    parser.add_argument("--rate", type=int, default=2000, help="new sockets per second")
+    parser.add_argument("--hold", type=int, default=60, help="seconds to hold all sockets open")
+    parser.add_argument("--wallets", type=int, default=10000, help="distinct wallet addresses to spread sockets over")
+    parser.add_argument("--wallet-prefix", default="loadtest_wallet_")
+    sys.exit(asyncio.run(main(parser.parse_args())))